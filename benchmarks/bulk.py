@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+###
+# Bulk indexing benchmark of Intelligent Words Completion.
+#--
+# Measures time-to-ready of a restored session: time until words of all tabs
+# are indexed. Tokenization in main loop is compared to worker pools of
+# growing size tokenizing shards of text snapshots in parallel.
+#--
+#   python3 benchmarks/bulk.py [--tabs N] [--lines N] [--workers 1,2,4,8]
+###
+import argparse, array, concurrent.futures, multiprocessing, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import MemoryBuffer, split_shards, tokenize_shard
+from keystrokes import Vocabulary, make_code
+
+
+def index_serial(buffers):
+    for buffer in buffers:
+        buffer.index_pending()
+
+def index_bulk(executor, buffers):
+    """
+    Tokenize shards of all buffers by the pool, merge them in order of lines.
+    """
+    jobs = []
+    for buffer in buffers:
+        futures = [executor.submit(tokenize_shard, shard) for shard in split_shards(buffer.get_all_text())]
+        jobs.append((buffer, futures))
+    for buffer, futures in jobs:
+        first_line = 0
+        for future in futures:
+            lines, counts, ends = future.result()
+            buffer.index.load_lines(first_line, lines, counts, array.array('b', [0]) + ends[:-1], ends)
+            first_line += len(lines)
+
+def start_pool(workers):
+    """
+    Start pool of spawned interpreters and wait until all of them run.
+    """
+    executor = concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    list(executor.map(tokenize_shard, [""] * workers * 4))
+    return executor
+
+def get_words(buffers):
+    return [sorted((w, b.index.count(w)) for w in b.index.prefix_words("")) for b in buffers]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time-to-ready of indexing a restored session.")
+    parser.add_argument("--tabs", type=int, default=200, help="count of tabs in restored session")
+    parser.add_argument("--lines", type=int, default=2000, help="lines of every document")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated sizes of worker pools")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = Vocabulary(rng, 3000)
+    texts = [make_code(rng, vocabulary, args.lines) for i in range(args.tabs)]
+    size = sum(len(text) for text in texts)
+    sys.stdout.write("%d tabs, %.1f MB, %d cores\n" % (args.tabs, size / 1e6, os.cpu_count()))
+
+    buffers = [MemoryBuffer(text) for text in texts]
+    start = time.perf_counter()
+    index_serial(buffers)
+    serial = time.perf_counter() - start
+    expected = get_words(buffers)
+    sys.stdout.write("  %-12s %10.1f ms %8.1f MB/s\n" % ("main loop", serial * 1000, size / 1e6 / serial))
+
+    for workers in [int(n) for n in args.workers.split(",")]:
+        start = time.perf_counter()
+        executor = start_pool(workers)
+        pool_start = time.perf_counter() - start
+        buffers = [MemoryBuffer(text) for text in texts]
+        start = time.perf_counter()
+        index_bulk(executor, buffers)
+        ready = time.perf_counter() - start
+        executor.shutdown()
+        status = "ok" if get_words(buffers) == expected else "MISMATCH"
+        sys.stdout.write("  %-12s %10.1f ms %8.1f MB/s %8.1fx  pool start %.1f ms  %s\n" % (
+            "%d workers" % workers, ready * 1000, size / 1e6 / ready, serial / ready, pool_start * 1000, status))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+###
+# Completion effectiveness benchmark of Intelligent Words Completion.
+#--
+# Types the beginnings of words found near the cursor in synthetic documents
+# and cycles with CTRL+SPACE until the intended word comes, the word is undone
+# by BACKSPACE when it doesn't come in --max-presses. Next words mode types
+# a word and a space instead and cycles to the word following it. Reports
+# completion metrics of the plugin (presses and rank of accepted words,
+# rejection rate and keystrokes saved) by ranking mode, so changes of ranking
+# can be compared.
+#--
+#   python3 benchmarks/effectiveness.py [--words N] [--json]
+###
+import argparse, os, random, re, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import (
+    CompletionEngine, CompletionOptions, MemoryBuffer, METRICS, get_prefix,
+    KEYCODE_BACKSPACE, KEYCODE_CONTROL, KEYCODE_SPACE, KEYVAL_BACKSPACE,
+)
+from keystrokes import Vocabulary, make_code, press, release, type_text
+
+MODES = [("ranked", False, False), ("nearest", True, False), ("next words", False, True)]
+
+
+def run(engine, buffer, entries):
+    for kind, key in entries:
+        if kind == "press":
+            if not engine.key_press(buffer, key):
+                buffer.key_press_default(key)
+        else:
+            engine.key_release(buffer, key)
+
+def get_word_at_cursor(buffer):
+    """
+    Get word around cursor, cycled word is after cursor until CTRL is released.
+    """
+    line, offset = buffer.get_cursor()
+    text = buffer.get_line_text(line)
+    return get_prefix(text[:offset]) + re.match(r'\w*', text[offset:]).group()
+
+def complete_word(engine, buffer, word, prefix, max_presses):
+    """
+    Type prefix of the word on a new line and cycle until the word comes, undo it otherwise.
+    """
+    run(engine, buffer, type_text("\n" + prefix))
+    for i in range(max_presses):
+        run(engine, buffer, [press(" ", 32, KEYCODE_SPACE, True)])
+        if get_word_at_cursor(buffer) == word:
+            break
+    run(engine, buffer, [release(KEYCODE_CONTROL)])
+    if get_word_at_cursor(buffer) != word:
+        run(engine, buffer, [press("\b", KEYVAL_BACKSPACE, KEYCODE_BACKSPACE)])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure effectiveness of words completion.")
+    parser.add_argument("--words", type=int, default=500, help="count of completed words")
+    parser.add_argument("--lines", type=int, default=5000, help="lines of every document")
+    parser.add_argument("--tabs", type=int, default=4, help="count of documents")
+    parser.add_argument("--max-presses", type=int, default=10, help="CTRL+SPACE presses before giving up")
+    parser.add_argument("--json", action="store_true", help="print all metrics as JSON")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.stdout.write("%-10s %8s %10s %10s %12s %12s\n" % ("mode", "words", "accepted", "rejected", "rank 1 %", "saved/word"))
+    for name, nearest, next_words in MODES:
+        rng = random.Random(args.seed)
+        vocabulary = Vocabulary(rng, 3000)
+        buffers = [MemoryBuffer(make_code(rng, vocabulary, args.lines)) for i in range(args.tabs)]
+        for buffer in buffers:
+            buffer.index_pending()
+        options = CompletionOptions()
+        options.nearestWordsFirst = nearest
+        engine = CompletionEngine(options, lambda current: [b.index for b in buffers if b is not current])
+        buffer = buffers[0]
+        METRICS.reset()
+        for i in range(args.words):
+            # ...the intended word is one of words of a line near the cursor.
+            line = rng.randrange(buffer.get_line_count())
+            words = [word for word in re.findall(r'\w+', buffer.get_line_text(line)) if len(word) > 3]
+            if not words or next_words and len(words) < 2:
+                continue
+            near = min(buffer.get_line_count() - 1, line + rng.randint(0, 20))
+            buffer.place_cursor((near, buffer.get_line_length(near)))
+            if next_words:
+                # ...the intended word follows the typed one.
+                i = rng.randrange(len(words) - 1)
+                complete_word(engine, buffer, words[i + 1], words[i] + " ", args.max_presses)
+                continue
+            word = rng.choice(words)
+            complete_word(engine, buffer, word, word[:rng.randint(1, 3)], args.max_presses)
+        stats = METRICS.get_stats()
+        rank_1 = stats["accepted_rank"].get("1", 0) * 100.0 / max(1, stats["cycles"])
+        sys.stdout.write("%-10s %8d %10d %10d %12.1f %12.2f\n" % (
+            name, stats["cycles"], stats["accepted"], stats["rejected"], rank_1,
+            stats["keystrokes_saved_per_word"]))
+        if args.json:
+            sys.stdout.write(METRICS.get_report() + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+###
+# Keystrokes replay benchmark of Intelligent Words Completion.
+#--
+# Replays keystroke traces over synthetic large documents and many-tabs
+# workspaces held in memory and reports latency percentiles of the plugin
+# per keystroke. Traces recorded by the plugin (run Gedit with environment
+# variable INTELLIGENT_WORDS_COMPLETION_TRACE set to a file path) can be
+# replayed by --trace.
+#--
+#   python3 benchmarks/keystrokes.py [--scenario NAME] [--trace FILE]
+###
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import (
+    CompletionEngine, CompletionOptions, Keystroke, MemoryBuffer, TRACER, parse_trace_entry, get_prefix,
+    KEYCODE_BACKSPACE, KEYCODE_CONTROL, KEYCODE_SPACE, KEYVAL_BACKSPACE, KEYVAL_RETURN,
+)
+
+KEYCODE_RETURN = 36
+PERCENTILES = (50, 90, 99)
+
+
+#--
+# Synthetic documents.
+#--
+class Vocabulary(object):
+    """
+    Identifiers with Zipf-like frequencies, both snake_case and camelCase.
+    """
+
+    SYLLABLES = ["get", "set", "file", "name", "buf", "line", "word", "tag", "index", "view",
+                 "doc", "text", "char", "list", "item", "size", "node", "path", "key", "value",
+                 "open", "close", "read", "write", "count", "cache", "query", "parse", "token", "event"]
+
+    def __init__(self, rng, size):
+        words = set()
+        while len(words) < size:
+            parts = rng.sample(self.SYLLABLES, rng.randint(1, 4))
+            if rng.random() < 0.5:
+                words.add("_".join(parts))
+            else:
+                words.add(parts[0] + "".join(p.capitalize() for p in parts[1:]))
+        self.words = sorted(words)
+        rng.shuffle(self.words)
+        self._weights = [1.0 / (i + 1) for i in range(len(self.words))]
+        self._rng = rng
+
+    def pick(self, count=1):
+        return self._rng.choices(self.words, self._weights, k=count)
+
+
+def make_code(rng, vocabulary, lines):
+    """
+    Get Python-like source code.
+    """
+    result = []
+    indent = ""
+    for i in range(lines):
+        kind = rng.random()
+        a, b, c = vocabulary.pick(3)
+        if kind < 0.1:
+            indent = ""
+            result.append("def %s(%s, %s):" % (a, b, c))
+            indent = "    "
+        elif kind < 0.2:
+            result.append("%s# %s %s %s" % (indent, a, b, c))
+        elif kind < 0.3:
+            result.append('%s%s = "%s %s"' % (indent, a, b, c))
+        elif kind < 0.4:
+            result.append("%sif %s[%s]:" % (indent, a, b))
+        else:
+            result.append("%s%s = %s.%s(%s)" % (indent, a, b, c, a))
+    return "\n".join(result)
+
+def make_xml(rng, vocabulary, lines):
+    """
+    Get nested XML document.
+    """
+    result = []
+    stack = []
+    for i in range(lines):
+        if stack and (rng.random() < 0.45 or len(stack) > 20):
+            result.append("  " * (len(stack) - 1) + "</%s>" % stack.pop())
+        elif rng.random() < 0.1:
+            result.append("  " * len(stack) + "<%s/>" % vocabulary.pick()[0])
+        else:
+            tag = vocabulary.pick()[0]
+            result.append("  " * len(stack) + '<%s id="%s">' % (tag, vocabulary.pick()[0]))
+            stack.append(tag)
+    return "\n".join(result)
+
+def make_minified(rng, vocabulary, size):
+    """
+    Get minified JSON on a single line.
+    """
+    result = []
+    length = 0
+    while length < size:
+        a, b = vocabulary.pick(2)
+        item = '{"%s":["%s",%d,{"%s":null}]},' % (a, b, rng.randint(0, 9999), a)
+        result.append(item)
+        length += len(item)
+    return "[" + "".join(result) + "{}]"
+
+
+#--
+# Keystroke traces.
+#--
+def press(string, keyval=None, keycode=0, control=False):
+    return ("press", Keystroke(ord(string) if keyval is None else keyval, keycode, string, control))
+
+def release(keycode):
+    return ("release", Keystroke(0, keycode))
+
+def type_text(text):
+    entries = []
+    for char in text:
+        if char == "\n":
+            entries.append(press("\r", KEYVAL_RETURN, KEYCODE_RETURN))
+        else:
+            entries.append(press(char))
+    return entries
+
+def complete(rng):
+    entries = [press(" ", 32, KEYCODE_SPACE, True) for i in range(rng.randint(1, 4))]
+    entries.append(release(KEYCODE_CONTROL))
+    return entries
+
+def make_code_trace(rng, vocabulary, count):
+    """
+    Get trace of typing code statements with words completion, brackets and quotes.
+    """
+    entries = []
+    while len(entries) < count:
+        a, b, c = vocabulary.pick(3)
+        entries.extend(type_text("\n" + a[:rng.randint(1, 3)]))
+        entries.extend(complete(rng))
+        entries.extend(type_text(" = " + b[:rng.randint(2, 4)]))
+        entries.extend(complete(rng))
+        entries.extend(type_text("(" + c[:3]))
+        entries.extend(complete(rng))
+        if rng.random() < 0.3:
+            entries.extend(type_text(", 'x"))
+        entries.extend(type_text(")"))
+        if rng.random() < 0.3:
+            # ...next word is predicted without prefix.
+            entries.extend(type_text(" "))
+            entries.extend(complete(rng))
+        if rng.random() < 0.3:
+            entries.append(press("\b", KEYVAL_BACKSPACE, KEYCODE_BACKSPACE))
+    return entries[:count]
+
+def make_xml_trace(rng, vocabulary, count):
+    """
+    Get trace of typing XML tags closed by auto-completion.
+    """
+    entries = []
+    while len(entries) < count:
+        tag = vocabulary.pick()[0]
+        entries.extend(type_text("\n<%s>text" % tag))
+        entries.extend(type_text("</"))
+    return entries[:count]
+
+def load_trace(path):
+    with open(path) as f:
+        return [parse_trace_entry(line) for line in f if line.strip()]
+
+
+#--
+# Scenarios.
+#--
+def scenario_large(rng, vocabulary, scale):
+    buffers = [MemoryBuffer(make_code(rng, vocabulary, int(50000 * scale)))]
+    return buffers, make_code_trace
+
+def scenario_huge(rng, vocabulary, scale):
+    # ...over 20 MB, words are indexed in large file mode.
+    buffers = [MemoryBuffer(make_code(rng, vocabulary, int(600000 * scale)))]
+    return buffers, make_code_trace
+
+def scenario_tabs(rng, vocabulary, scale):
+    buffers = [MemoryBuffer(make_code(rng, vocabulary, int(2500 * scale))) for i in range(40)]
+    return buffers, make_code_trace
+
+def scenario_minified(rng, vocabulary, scale):
+    buffers = [MemoryBuffer(make_minified(rng, vocabulary, int(300000 * scale)))]
+    return buffers, make_code_trace
+
+def scenario_xml(rng, vocabulary, scale):
+    buffers = [MemoryBuffer(make_xml(rng, vocabulary, int(100000 * scale)))]
+    return buffers, make_xml_trace
+
+SCENARIOS = {
+    "large": scenario_large,
+    "huge": scenario_huge,
+    "tabs": scenario_tabs,
+    "minified": scenario_minified,
+    "xml": scenario_xml,
+}
+
+
+#--
+# Replay.
+#--
+def get_category(kind, key, buffer):
+    if kind == "release":
+        return "release"
+    if key.control and key.keycode == KEYCODE_SPACE:
+        line, offset = buffer.get_cursor()
+        if not get_prefix(buffer.get_line_text(line)[:offset]):
+            return "next words"
+        return "ctrl+space"
+    if key.keyval == KEYVAL_RETURN:
+        return "return"
+    if key.keyval == KEYVAL_BACKSPACE:
+        return "backspace"
+    if key.string and key.string in "\"'()[]{}":
+        return "bracket"
+    if key.string == "/":
+        return "xml"
+    return "typing"
+
+def replay(buffers, trace, options):
+    """
+    Replay trace in the first buffer, get latencies in seconds by category.
+    """
+    buffer = buffers[0]
+    engine = CompletionEngine(options, lambda current: [b.index for b in buffers if b is not current])
+    # ...type into the middle of the document.
+    line = buffer.get_line_count() // 2
+    buffer.place_cursor((line, buffer.get_line_length(line) // 2))
+    latencies = {}
+    for kind, key in trace:
+        category = get_category(kind, key, buffer)
+        # ...default action is timed too, words index follows the edits it does.
+        start = time.perf_counter()
+        if kind == "press":
+            if not engine.key_press(buffer, key):
+                buffer.key_press_default(key)
+        else:
+            engine.key_release(buffer, key)
+        latencies.setdefault(category, []).append(time.perf_counter() - start)
+    return latencies
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def report(name, ready, latencies, out):
+    out.write("%s: ready in %.1f ms\n" % (name, ready * 1000))
+    out.write("  %-12s %8s" % ("keystrokes", "count") + "".join("%10s" % ("p%d us" % p) for p in PERCENTILES) + "%10s\n" % "max us")
+    everything = []
+    for category in sorted(latencies):
+        everything.extend(latencies[category])
+    for category, values in sorted(latencies.items()) + [("all", everything)]:
+        values = sorted(values)
+        out.write("  %-12s %8d" % (category, len(values)))
+        out.write("".join("%10.1f" % (percentile(values, p) * 1e6) for p in PERCENTILES))
+        out.write("%10.1f\n" % (values[-1] * 1e6))
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay keystrokes and report latency percentiles.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS) + ["all"], default="all")
+    parser.add_argument("--trace", help="replay recorded trace instead of synthetic one")
+    parser.add_argument("--keystrokes", type=int, default=1000, help="length of synthetic trace")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale of synthetic documents")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--phases", action="store_true", help="report latencies of handler phases too")
+    parser.add_argument("--nearest", action="store_true", help="complete words nearest to cursor first")
+    args = parser.parse_args()
+    TRACER.enabled = args.phases
+    options = CompletionOptions()
+    options.nearestWordsFirst = args.nearest
+
+    names = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    for name in names:
+        rng = random.Random(args.seed)
+        vocabulary = Vocabulary(rng, 3000)
+        buffers, make_trace = SCENARIOS[name](rng, vocabulary, args.scale)
+        start = time.perf_counter()
+        for buffer in buffers:
+            buffer.index_pending()
+        ready = time.perf_counter() - start
+        trace = load_trace(args.trace) if args.trace else make_trace(rng, vocabulary, args.keystrokes)
+        TRACER.reset()
+        edit_count = buffers[0].edit_count
+        report(name, ready, replay(buffers, trace, options), sys.stdout)
+        sys.stdout.write("  %d buffer edits, %d user actions by the plugin\n" % (
+            buffers[0].edit_count - edit_count, buffers[0].user_actions))
+        if args.phases:
+            sys.stdout.write("".join("  " + line + "\n" for line in TRACER.get_report().splitlines()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+###
+# Open/close benchmark of Intelligent Words Completion.
+#--
+# Opens and closes thousands of documents next to a few tabs kept open. Every
+# document gets its own words, some of them are completed and XML tags are
+# closed in it, then it is released like a closed tab. Memory traced after
+# warm-up cycles is compared to memory at the end, exits with status 1 when it
+# grows more than the budget or when words of closed documents stay in the
+# shared vocabulary.
+#--
+#   python3 benchmarks/lifecycle.py [--cycles N] [--budget KB]
+###
+import argparse, gc, os, random, sys, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import CompletionEngine, CompletionOptions, MemoryBuffer, METRICS, TRACER, VOCABULARY
+from keystrokes import Vocabulary, make_code, make_code_trace, make_xml_trace
+
+KB = 1024.0
+
+
+def open_close(rng, engine, tabs, texts, traces):
+    """
+    Open document with words of its own, type into it and release it.
+    """
+    own = ["doc%08x_%d" % (rng.getrandbits(32), i) for i in range(20)]
+    buffer = MemoryBuffer(rng.choice(texts) + "\n" + " ".join(own))
+    buffer.index_pending()
+    tabs.append(buffer)
+    buffer.place_cursor((buffer.get_line_count() // 2, 0))
+    for kind, key in rng.choice(traces):
+        if kind == "press":
+            if not engine.key_press(buffer, key):
+                buffer.key_press_default(key)
+        else:
+            engine.key_release(buffer, key)
+    tabs.remove(buffer)
+    buffer.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check memory stays flat across open/close cycles.")
+    parser.add_argument("--cycles", type=int, default=2000, help="documents opened and closed")
+    parser.add_argument("--warmup", type=int, default=200, help="cycles before memory is traced")
+    parser.add_argument("--tabs", type=int, default=3, help="tabs kept open")
+    parser.add_argument("--lines", type=int, default=200, help="lines of every document")
+    parser.add_argument("--budget", type=float, default=256.0, help="kilobytes memory may grow by")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = Vocabulary(rng, 3000)
+    # ...documents and traces are picked from samples, words of their own make every document new.
+    texts = [make_code(rng, vocabulary, args.lines) for i in range(20)]
+    traces = [make_code_trace(rng, vocabulary, 40) + make_xml_trace(rng, vocabulary, 20) for i in range(20)]
+    tabs = [MemoryBuffer(make_code(rng, vocabulary, args.lines)) for i in range(args.tabs)]
+    for buffer in tabs:
+        buffer.index_pending()
+    engine = CompletionEngine(CompletionOptions(), lambda current: [b.index for b in tabs if b is not current])
+    TRACER.enabled = True
+
+    tracemalloc.start()
+    for i in range(args.warmup):
+        open_close(rng, engine, tabs, texts, traces)
+    gc.collect()
+    words, estimate = VOCABULARY.get_stats()
+    start = tracemalloc.get_traced_memory()[0]
+    for i in range(args.cycles):
+        open_close(rng, engine, tabs, texts, traces)
+    gc.collect()
+    end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    end_words, end_estimate = VOCABULARY.get_stats()
+
+    growth = (end - start) / KB
+    sys.stdout.write("%d cycles: traced %.1f KB -> %.1f KB (%+.1f KB), vocabulary %d -> %d words, %d completions\n" % (
+        args.cycles, start / KB, end / KB, growth, words, end_words, METRICS.cycles))
+    if growth > args.budget or end_words > words * 1.1:
+        sys.stdout.write("memory grows over budget of %.0f KB\n" % args.budget)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
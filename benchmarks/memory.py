@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+###
+# Memory benchmark of Intelligent Words Completion.
+#--
+# Measures memory of words index of a log-heavy session: logs are full of
+# rare words like hexadecimal ids, they are interned once for all tabs and
+# rare old ones are evicted when words index takes more than the limit.
+# Memory is compared to the words lists the original plugin built by every
+# completion.
+#--
+#   python3 benchmarks/memory.py [--tabs N] [--lines N] [--limit MB]
+###
+import argparse, os, random, re, sys, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import MemoryBuffer, VOCABULARY
+from keystrokes import Vocabulary, make_code
+
+MB = float(1 << 20)
+
+
+def make_log(rng, vocabulary, lines):
+    """
+    Get log with timestamps, hexadecimal ids and messages.
+    """
+    result = []
+    for i in range(lines):
+        a, b, c = vocabulary.pick(3)
+        result.append("2024-01-%02d 12:%02d:%02d INFO %s request_%08x %s=%s took %dms" % (
+            rng.randint(1, 28), rng.randint(0, 59), rng.randint(0, 59), a, rng.getrandbits(32), b, c, rng.randint(0, 999)))
+    return "\n".join(result)
+
+def get_all_words(buffers):
+    """
+    Words lists of the original plugin built by every completion.
+    """
+    all_words = []
+    for buffer in buffers:
+        for line in buffer.get_all_text().split("\n"):
+            for word in re.findall(r'\w+', line):
+                if len(word) > 1:
+                    all_words.append(word)
+    unique_words = list(set(all_words))
+    return all_words, unique_words
+
+def measure(function):
+    tracemalloc.start()
+    result = function()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory of words index of a log-heavy session.")
+    parser.add_argument("--tabs", type=int, default=20, help="count of tabs, half of them are logs")
+    parser.add_argument("--lines", type=int, default=10000, help="lines of every document")
+    parser.add_argument("--limit", type=int, default=32, help="megabytes of words index at most")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = Vocabulary(rng, 3000)
+    texts = [(make_log if i % 2 else make_code)(rng, vocabulary, args.lines) for i in range(args.tabs)]
+    sys.stdout.write("%d tabs, %.1f MB\n" % (args.tabs, sum(len(text) for text in texts) / 1e6))
+    sys.stdout.write("  %-16s %10s %10s %10s %10s\n" % ("", "words", "estimate", "traced", "peak"))
+
+    buffers = [MemoryBuffer(text) for text in texts]
+    words, size, peak = measure(lambda: get_all_words(buffers))
+    sys.stdout.write("  %-16s %10d %10s %7.1f MB %7.1f MB\n" % ("original lists", len(words[1]), "", size / MB, peak / MB))
+    del words
+
+    for name, limit in (("index", 0), ("index %d MB" % args.limit, args.limit)):
+        VOCABULARY.limit = limit << 20
+        buffers = [MemoryBuffer(text) for text in texts]
+        result, size, peak = measure(lambda: [buffer.index_pending() for buffer in buffers])
+        count, estimate = VOCABULARY.get_stats()
+        sys.stdout.write("  %-16s %10d %7.1f MB %7.1f MB %7.1f MB\n" % (name, count, estimate / MB, size / MB, peak / MB))
+        for buffer in buffers:
+            buffer.index.clear()
+
+if __name__ == "__main__":
+    main()
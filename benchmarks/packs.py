@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+###
+# Dictionary packs benchmark of Intelligent Words Completion.
+#--
+# Measures dictionary packs of the plugin and a synthetic large one: time to
+# write a pack, time and memory of opening it by the first query and latency
+# of scoring words by prefix, compared to words of the word list read into
+# a sorted list and a dictionary of counts.
+#--
+#   python3 benchmarks/packs.py [--words N] [--queries N]
+###
+import argparse, os, random, shutil, sys, tempfile, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import (
+    DictionaryPack, get_prefix_range, read_word_list, score_other_words, write_dictionary_pack)
+from keystrokes import Vocabulary
+
+PACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4", "intelligent_words_completion_packs")
+MB = float(1 << 20)
+
+
+class ListWords(object):
+    """
+    Words of a word list read into memory.
+    """
+
+    def __init__(self, path):
+        self._counts = read_word_list(path)
+        self._sorted = sorted(self._counts)
+
+    def prefix_words(self, prefix):
+        return get_prefix_range(self._sorted, prefix)
+
+    def count(self, word):
+        return self._counts.get(word, 0)
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, size
+
+def get_prefixes(rng, words, count):
+    return [word[:rng.randint(1, 3)] for word in rng.sample(words, min(count, len(words)))]
+
+def query_time(source, prefixes):
+    start = time.perf_counter()
+    for prefix in prefixes:
+        score_other_words(prefix, [source])
+    return (time.perf_counter() - start) / len(prefixes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure dictionary packs.")
+    parser.add_argument("--words", type=int, default=200000, help="words of synthetic pack")
+    parser.add_argument("--queries", type=int, default=1000, help="prefix queries of every pack")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp()
+    try:
+        lists = [os.path.join(PACKS_DIR, name) for name in sorted(os.listdir(PACKS_DIR))]
+        lists.append(os.path.join(directory, "synthetic.txt"))
+        with open(lists[-1], "w") as f:
+            f.write("\n".join(Vocabulary(rng, args.words).words))
+        sys.stdout.write("%-10s %8s %10s %10s %10s %10s %10s %10s %10s\n" % (
+            "pack", "words", "write ms", "open ms", "open MB", "list ms", "list MB", "pack us", "list us"))
+        for source in lists:
+            name = os.path.basename(source)[:-4]
+            path = os.path.join(directory, name + ".pack")
+            start = time.perf_counter()
+            write_dictionary_pack(path, read_word_list(source))
+            written = time.perf_counter() - start
+            # ...the pack is mapped by its first query.
+            pack, opened, pack_size = measure(lambda: DictionaryPack(path))
+            result, opened_query, query_size = measure(lambda: pack.prefix_words("zzz"))
+            words, loaded, list_size = measure(lambda: ListWords(source))
+            prefixes = get_prefixes(rng, words._sorted, args.queries)
+            sys.stdout.write("%-10s %8d %10.1f %10.2f %10.2f %10.1f %10.1f %10.1f %10.1f\n" % (
+                name, len(words._sorted), written * 1000, (opened + opened_query) * 1000,
+                (pack_size + query_size) / MB, loaded * 1000, list_size / MB,
+                query_time(pack, prefixes) * 1e6, query_time(words, prefixes) * 1e6))
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+###
+# Startup benchmark of Intelligent Words Completion.
+#--
+# Measures import of the plugin's text logic and activation in a window with
+# a restored session of many tabs. The plugin sets up only the active tab on
+# activation, other tabs are set up once shown, so activation is compared to
+# setting up all tabs at once. Exits with status 1 when import and activation
+# take more than the budget.
+#--
+#   python3 benchmarks/startup.py [--tabs N] [--lines N] [--budget MS]
+###
+import argparse, os, random, subprocess, sys, time
+
+GEDIT4 = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4")
+sys.path.insert(0, GEDIT4)
+from intelligent_words_completion_core import CompletionEngine, CompletionOptions, MemoryBuffer
+from keystrokes import Vocabulary, make_code
+
+IMPORT_CODE = """
+import sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+import intelligent_words_completion_core
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import(runs):
+    """
+    Get median seconds of importing the core module by a fresh interpreter.
+    """
+    times = []
+    for i in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_CODE % GEDIT4])
+        times.append(float(output))
+    return sorted(times)[len(times) // 2]
+
+def measure(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and activation time against a budget.")
+    parser.add_argument("--tabs", type=int, default=120, help="count of tabs in restored session")
+    parser.add_argument("--lines", type=int, default=2000, help="lines of every document")
+    parser.add_argument("--budget", type=float, default=50.0, help="milliseconds for import and activation")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters measuring import")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = Vocabulary(rng, 3000)
+    texts = [make_code(rng, vocabulary, args.lines) for i in range(args.tabs)]
+
+    import_time = measure_import(args.runs)
+    # ...lazy activation sets up the engine and the active tab only,
+    activate_time, buffers = measure(lambda: (CompletionEngine(CompletionOptions(), lambda b: []), [MemoryBuffer(texts[0])]))
+    ready_time, result = measure(buffers[1][0].index_pending)
+    # ...eager activation set up all tabs and tokenized them in idle time.
+    eager_time, buffers = measure(lambda: [MemoryBuffer(text) for text in texts])
+    eager_ready_time, result = measure(lambda: [buffer.index_pending() for buffer in buffers])
+
+    rows = [
+        ("import", import_time),
+        ("activate", activate_time),
+        ("active ready", ready_time),
+        ("eager activate", eager_time),
+        ("eager ready", eager_ready_time),
+    ]
+    sys.stdout.write("%d tabs of %d lines\n" % (args.tabs, args.lines))
+    for name, seconds in rows:
+        sys.stdout.write("  %-16s %10.1f ms\n" % (name, seconds * 1000))
+    total = (import_time + activate_time) * 1000
+    sys.stdout.write("  %-16s %10.1f ms of %.1f ms budget\n" % ("startup", total, args.budget))
+    return 0 if total <= args.budget else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+###
+# Tokenizers throughput benchmark of Intelligent Words Completion.
+#--
+# Measures MB/s of language tokenizers over synthetic source code compared
+# to the per-line pipeline they replaced and to the original one.
+#--
+#   python3 benchmarks/tokenizers.py [--lines N]
+###
+import argparse, os, random, re, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import get_tokenizer
+from keystrokes import Vocabulary, make_code, make_xml
+
+LINE_SEPARATOR = re.compile('\r\n|[\r\n\u2029]')
+WORD = re.compile(r'\w+')
+
+
+def make_c(rng, vocabulary, lines):
+    """
+    Get C-like source code with line and block comments.
+    """
+    result = []
+    for i in range(lines):
+        kind = rng.random()
+        a, b, c = vocabulary.pick(3)
+        if kind < 0.1:
+            result.append("/* %s %s\n * %s */" % (a, b, c))
+        elif kind < 0.2:
+            result.append("    // %s %s %s" % (a, b, c))
+        elif kind < 0.3:
+            result.append('    %s = "%s %s";' % (a, b, c))
+        else:
+            result.append("    %s = %s->%s(%s);" % (a, b, c, a))
+    return "\n".join(result)
+
+def tokenize_original(text):
+    """
+    Tokenization of the plugin before words index, per line with regular expressions.
+    """
+    lines = []
+    for line in text.split("\n"):
+        words = []
+        line = line.strip()
+        if line[:1] != '#':
+            line = re.sub(r'\s{2,}', " ", line)
+            for m in re.finditer(r'\w*', line):
+                word = line[m.start():m.end()].strip()
+                if len(word) > 1:
+                    words.append(word)
+        lines.append(tuple(words))
+    return lines
+
+def tokenize_per_line(text):
+    """
+    Tokenization replaced by language tokenizers, lines commented by '#' are skipped.
+    """
+    lines = []
+    for line in LINE_SEPARATOR.split(text):
+        line = line.strip()
+        if line[:1] == '#':
+            lines.append(())
+        else:
+            lines.append(tuple([w for w in WORD.findall(line) if len(w) > 1]))
+    return lines
+
+def measure(function, text, repeat=3):
+    """
+    Get throughput of the best of repeated runs, so other load of the machine counts less.
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(text.encode("utf-8")) / 1e6 / best
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput of tokenizers in MB/s.")
+    parser.add_argument("--lines", type=int, default=100000, help="lines of every sample")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = Vocabulary(rng, 3000)
+    samples = [
+        ("python3", make_code(rng, vocabulary, args.lines)),
+        ("c", make_c(rng, vocabulary, args.lines)),
+        ("xml", make_xml(rng, vocabulary, args.lines)),
+    ]
+    sys.stdout.write("%-10s %12s %12s %12s\n" % ("language", "original", "per line", "tokenizer"))
+    for language, text in samples:
+        tokenizer = get_tokenizer(language)
+        sys.stdout.write("%-10s %7.1f MB/s %7.1f MB/s %7.1f MB/s\n" % (
+            language, measure(tokenize_original, text), measure(tokenize_per_line, text),
+            measure(tokenizer.tokenize_text, text)))
+
+if __name__ == "__main__":
+    main()
@@ -13,50 +13,105 @@
 #--
 # Words completion via [CTRL]+[SPACE] shortcut by Chrosta (rosta.zdenek@gmail.com).
 ###
-import re, traceback, collections
-from datetime import datetime as dt
-from gi.repository import Gtk, Gio, Gedit, GObject, PeasGtk, Gdk
+import time
+_IMPORT_START = time.perf_counter()
+import traceback, collections, itertools, array, os, sys, hashlib, threading, shutil
+from gi.repository import Gtk, Gio, Gedit, GObject, PeasGtk, Gdk, GLib, GtkSource
+from intelligent_words_completion_core import (
+    CompletionEngine, CompletionOptions, Keystroke, TextBuffer, TRACER, METRICS, VOCABULARY, DictionaryPacks,
+    format_trace_entry, get_project_root, walk_project_files, tokenize_file, load_vocabulary_cache,
+    save_vocabulary_cache, get_prefix_range, split_lines, split_shards, tokenize_shard,
+    get_initials_keys, get_abbreviation_range, next_generation, get_prefix, get_previous_word,
+)
+_IMPORT_TIME = time.perf_counter() - _IMPORT_START
+
+# Seconds any idle callback may spend by tokenization and its lines per chunk.
+_IDLE_TIME_BUDGET = 0.005
+_IDLE_MIN_CHUNK = 1
+_IDLE_MAX_CHUNK = 4096
+# Documents with more pending lines than this are tokenized by worker processes.
+_BULK_MIN_LINES = 20000
+# Seconds between crawls of the same project.
+_PROJECT_REFRESH_INTERVAL = 60.0
+# Word lists of dictionary packs placed next to the plugin.
+_PACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intelligent_words_completion_packs")
+# Keystrokes are recorded to this file for replay by benchmarks when set.
+_TRACE_PATH = os.environ.get("INTELLIGENT_WORDS_COMPLETION_TRACE")
+# Seconds activation of the plugin in a window may take, exceeding it is reported.
+_ACTIVATE_TIME_BUDGET = 0.005
+
+class IntelligentWordsCompletionAppActivatable(GObject.Object, Gedit.AppActivatable):
+    app = GObject.property(type=Gedit.App)
+
+    def __init__(self):
+        GObject.Object.__init__(self)
+
+    def do_activate(self):
+        """
+        Start words indexes shared by all windows.
+        """
+        IndexService.get_instance()
+
+    def do_deactivate(self):
+        """
+        Stop words indexes shared by all windows.
+        """
+        IndexService.shutdown()
+
 
 class IntelligentWordsCompletionPlugin(GObject.Object, Gedit.WindowActivatable, PeasGtk.Configurable):
     window = GObject.property(type=Gedit.Window)
 
     def __init__(self):
         GObject.Object.__init__(self)
-        self._index = 0
-        self._words = []
-        self._prefix = ""
-        self._postfix = ""
-        self._backspace = 0
+        self._service = None
+        self._engine = None
+        self._provider = None
+        self._trace = None
 
     def do_create_configure_widget(self):
         return IntelligentTextCompletionOptions.get_instance().create_configure_dialog()
 
     def do_activate(self):
         """
-        Activate plugin.
+        Activate plugin, views are connected once their tab gets active.
         """
+        start = time.perf_counter()
         window = self.window
-        callback = self._on_window_tab_added
-        id_1 = window.connect("tab-added", callback)
+        options = IntelligentTextCompletionOptions.get_instance()
+        self._service = IndexService.get_instance()
+        self._engine = CompletionEngine(options, self._service.get_other_indexes)
+        self._provider = WordsCompletionProvider(self._engine, self._service)
+        TRACER.enabled = options.traceLatency
+        VOCABULARY.limit = options.indexMemoryLimit << 20
+        if _TRACE_PATH:
+            self._trace = open(_TRACE_PATH, "a")
+        callback = self._on_window_active_tab_changed
+        id_1 = window.connect("active-tab-changed", callback)
         callback = self._on_window_tab_removed
         id_2 = window.connect("tab-removed", callback)
         window.intelligent_text_completion_id = (id_1, id_2)
-        views = window.get_views()
-        for view in views:
+        view = window.get_active_view()
+        if view is not None:
             self._connect_view(view, window)
+        report_startup(time.perf_counter() - start)
 
     def do_deactivate(self):
         """
         Deactivate plugin.
         """
         window = self.window
-        widgets = [window]
-        widgets.extend(window.get_views())
-        widgets.extend(window.get_documents())
-        for widget in widgets:
-            for handler_id in getattr(widget, 'intelligent_text_completion_id', []):
-                widget.disconnect(handler_id)
-            widget.intelligent_text_completion_id = None
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+        for doc in window.get_documents():
+            self._service.release_buffer(doc)
+        for view in window.get_views():
+            self._disconnect_view(view)
+        self._provider.cancel()
+        for handler_id in getattr(window, 'intelligent_text_completion_id', None) or ():
+            window.disconnect(handler_id)
+        window.intelligent_text_completion_id = None
 
     def _connect_view(self, view, window):
         """
@@ -64,437 +119,120 @@ class IntelligentWordsCompletionPlugin(GObject.Object, Gedit.WindowActivatable,
         """
         callback_p = self._on_view_key_press_event
         id_p = view.connect("key-press-event", callback_p, window)
-        view.intelligent_text_completion_id = id_p
         #--
         callback_r = self._on_view_key_release_event
         id_r = view.connect("key-release-event", callback_r, window)
-        view.intelligent_text_completion_id = id_r
-        
-    def _on_window_tab_added(self, window, tab):
+        view.intelligent_text_completion_id = (id_p, id_r)
+        #--
+        view.get_completion().add_provider(self._provider)
+        view.intelligent_text_completion_provider = self._provider
+        #--
+        self._service.get_buffer(view.get_buffer())
+
+    def _disconnect_view(self, view):
+        """
+        Disconnect from view's signals and remove completion provider from it.
+        """
+        for handler_id in getattr(view, 'intelligent_text_completion_id', None) or ():
+            view.disconnect(handler_id)
+        view.intelligent_text_completion_id = None
+        if getattr(view, 'intelligent_text_completion_provider', None) is not None:
+            view.get_completion().remove_provider(self._provider)
+            view.intelligent_text_completion_provider = None
+
+    def _on_window_active_tab_changed(self, window, tab):
         """
-        Connect to signals of the document and view in tab.
+        Connect to signals of the document and view in tab when it is shown first.
         """
         view = tab.get_view()
         handler_id = getattr(view, 'intelligent_text_completion_id', None)
         if handler_id is None:
             self._connect_view(view, window)
+        doc = tab.get_document()
+        show_large_file_status(doc, self._service.get_buffer(doc).large)
 
     def _on_window_tab_removed(self, window, tab):
-        pass
+        """
+        Disconnect from the view in closed tab and forget words index of its document.
+        """
+        self._disconnect_view(tab.get_view())
+        self._service.release_buffer(tab.get_document(), self._provider)
 
-    def _check_prefix(self, prefix):
-        flag = True
-        if len(prefix) > 0:
-            prefix = prefix.split("_") 
-            for part in prefix:
-                if len(part) > 0:
-                    if flag:
-                        flag = part.isalnum()
-        return flag
-        
     def _on_view_key_press_event(self, view, event, window):
+        start = TRACER.start()
         doc = window.get_active_document()
-        #--
-        # Backspace for quick deletion when word was completed!
-        #--
-        if event.get_keycode().keycode == 22: # BACKSPACE
-            print("-->" + str(event.get_keycode().keycode))
-            if self._backspace > 0:
-                cursor = doc.get_iter_at_mark(doc.get_insert())
-                offset = cursor.get_line_offset()
-                copy = cursor.copy()
-                copy.set_line_offset(offset - (self._backspace - 1))
-                doc.delete_interactive(cursor, copy, True)
-                self._backspace = 0
-        else:
-            self._backspace = 0
-        #--
-        # Starting word completion after CTRL+SPACE pressed!
-        #--
-        if event.state == Gdk.ModifierType.CONTROL_MASK:
-            print("-->" + str(event.get_keycode().keycode))
-            if event.get_keycode().keycode == 65: # CTRL+SPACE
-                if len(self._words) == 0:
-                    self._index = 0
-                    cursor = doc.get_iter_at_mark(doc.get_insert())
-                    offset = cursor.get_line_offset()
-                    copy = cursor.copy()
-                    prefix = ""
-                    index = 0
-                    while self._check_prefix(prefix) and (offset - index) > 0:
-                        index += 1
-                        copy.set_line_offset(offset - index)
-                        prefix = doc.get_text(copy, cursor, False)
-                    if prefix[0:1].isalnum() or prefix[0:1] == "_": self._prefix = prefix
-                    else: self._prefix = prefix[1:]
-                    #--
-                    # Reload text content from all buffers and parsing all words to unique list.
-                    #--
-                    all_words = []
-                    docs = window.get_documents()
-                    for d in docs:
-                        start = d.get_start_iter()
-                        end = d.get_end_iter()
-                        text = d.get_text(start, end, False)
-                        lines = text.split("\n")
-                        for line in lines:
-                            line = line.strip()
-                            if line[:1] != '#':
-                                line = re.sub('\s{2,}', " ", line)
-                                for word in [[m.start(), m.end()] for m in re.finditer('\w*', line)]:
-                                    word = line[word[0]:word[1]]
-                                    word = word.strip()
-                                    if len(word) > 1:
-                                        all_words.append(word)
-                    all_words.sort()
-                    unique_words = []
-                    for w in all_words:
-                        if w not in unique_words:
-                            unique_words.append(w)
-                    #--
-                    # Preparation of list suitable words.
-                    #--
-                    words_suggestions = {}
-                    for w in unique_words:
-                        if w[0:len(self._prefix)] == self._prefix:
-                            try: x = words_suggestions[len(w)]
-                            except KeyError: words_suggestions[len(w)] = []
-                            words_suggestions[len(w)].append(w)
-                    ordered_words_suggestions = collections.OrderedDict(sorted(words_suggestions.items()))
-                    ordered_words_suggestions = [[k, v] for k, v in ordered_words_suggestions.items()]
-                    prepared_words_suggestions = []
-                    for k, v in ordered_words_suggestions:
-                        for w in v:
-                            prepared_words_suggestions.append(w)
-                    #--
-                    # Remove current complete word from suggestions.
-                    #--
-                    fixed_words_suggestions = []
-                    for w in prepared_words_suggestions:
-                        if w == self._prefix: continue
-                        fixed_words_suggestions.append(w)
-                    fixed_words_suggestions.append("")
-                    self._words = fixed_words_suggestions
-                    ### print("--[list]-->" + str(self._words))
-                #--
-                # So if words are available for completion...
-                #--
-                postfix = ""
-                if len(self._words) > 0:
-                    #--
-                    # ...the indeterminate postfix is removed...
-                    #--
-                    cursor = doc.get_iter_at_mark(doc.get_insert())
-                    while cursor.get_line_offset() != doc.get_end_iter().get_offset():
-                        if (cursor.get_line_offset() + 1) < (cursor.get_chars_in_line() + 1):
-                            copy = cursor.copy()
-                            copy.set_line_offset(cursor.get_line_offset() + 1)
-                            char = doc.get_text(cursor, copy, False)
-                            if char.isalnum() or char == "_": doc.delete_interactive(cursor, copy, True)
-                            else: break
-                        else: break
-                    #--
-                    # ...and cycle through the appropriate words.
-                    #--
-                    try:
-                        word = self._words[self._index]
-                    except IndexError:
-                        self._index = 0
-                        word = self._words[self._index]
-                    self._index += 1
-                    #--
-                    ### print("--[word]-->" + word)
-                    postfix = word[len(self._prefix):]
-                    self._postfix = postfix
-                    #==
-                    doc.insert(cursor, postfix, len(self._postfix))
-                    cursor = doc.get_iter_at_mark(doc.get_insert())
-                    cursor.set_line_offset((cursor.get_line_offset() - len(self._postfix)))
-                    self._backspace = len(self._postfix)
-                    doc.place_cursor(cursor)
-                    #==
+        keycode = event.get_keycode().keycode
+        key = Keystroke(event.keyval, keycode, event.string, event.state == Gdk.ModifierType.CONTROL_MASK)
+        self._record_keystroke("press", key)
         try:
-            return self._handle_event(view, event, window)
+            return self._engine.key_press(self._service.get_buffer(doc), key)
         except:
             err = "Exception\n"
             err += traceback.format_exc()
             doc.set_text(err)
-            
+        finally:
+            TRACER.stop("key press", start)
+
     def _on_view_key_release_event(self, view, event, window):
+        start = TRACER.start()
         doc = window.get_active_document()
-        #--
-        # Complete cycling between words after issuing CTRL.
-        #-- 
-        if event.get_keycode().keycode == 37:
-            if len(self._postfix):
-                cursor = doc.get_iter_at_mark(doc.get_insert())
-                cursor.set_line_offset((cursor.get_line_offset() + len(self._postfix)))
-                doc.place_cursor(cursor)
-            #==
-            self._postfix = ""
-            self._words = []
-            #==
-    
-    #--
-    # Plugin core functions.
-    #--
-    def _handle_event(self, view, event, window):
-        """
-        Key press event.
-        """
-        #--
-        # Get vars...
-        #--
-        # ...constants,
-        ignore_whitespace = '\t '
-        # ...get document,
-        doc = window.get_active_document()
-        # ...get cursor,
-        cursor = doc.get_iter_at_mark(doc.get_insert())
-        # ...get typed string,
-        typed_string = event.string
-        # ...get previous char,
-        prev_char = None
-        if not cursor.get_line_offset() == 0:
-            prev_char_pos = cursor.copy()
-            prev_char_pos.set_line_offset(cursor.get_line_offset() - 1)
-            prev_char = doc.get_text(prev_char_pos, cursor, False)
-        # ...get next char,
-        next_char = None
-        if not cursor.ends_line():
-            next_char_pos = cursor.copy()
-            next_char_pos.set_line_offset(cursor.get_line_offset() + 1)
-            next_char = doc.get_text(cursor, next_char_pos, False)
-        # ...get line before cursor,
-        line_start = cursor.copy()
-        line_start.set_line_offset(0)
-        preceding_line = doc.get_text(line_start, cursor, False)
-        # ...get line after cursor,
-        line_end = cursor.copy()
-        if not cursor.ends_line():
-            line_end.forward_to_line_end()
-        line_after = doc.get_text(cursor, line_end, False)
-        # ...get whitespace in front of line,
-        whitespace_pos = 0
-        whitespace = ""
-        while len(preceding_line) > whitespace_pos and preceding_line[whitespace_pos] in ignore_whitespace:
-            whitespace += preceding_line[whitespace_pos]
-            whitespace_pos += 1
-        # ...get options.
-        options = IntelligentTextCompletionOptions.get_instance()
-        
-        #--
-        # Do not complete text after pasting text.
-        #--
-        if len(typed_string) > 1:
-            return False
-        typed_char = typed_string
-        
-        #--
-        # Globals.
-        #--
-        open_close = {
-            '"': '"',
-            "'": "'",
-            '(': ')',
-            '{': '}',
-            '[': ']',
-        }
-        
-        #--
-        # Selected text...
-        #--
-        bounds = doc.get_selection_bounds()
-        if len(bounds) > 0:
-            # ...auto-close brackets and quotes,
-            if options.closeBracketsAndQuotes:
-                for open, close in open_close.items():
-                    if typed_char == open:
-                        # ...get bounds data,
-                        off1 = bounds[0].get_offset()
-                        off2 = bounds[1].get_offset()
-                        # ...add open char,
-                        doc.place_cursor(bounds[0])
-                        doc.insert_at_cursor(open)
-                        # ...refresh cursor and move it,
-                        cursor = doc.get_iter_at_mark(doc.get_insert())
-                        cursor.set_offset(cursor.get_offset() + (off2 - off1))
-                        doc.place_cursor(cursor)
-                        # ...add close char.
-                        doc.insert_at_cursor(close)
-                        return True
-            return False
+        key = Keystroke(event.keyval, event.get_keycode().keycode, event.string)
+        self._record_keystroke("release", key)
+        self._engine.key_release(self._service.get_buffer(doc), key)
+        TRACER.stop("key release", start)
 
-        #--
-        # Auto-close brackets and quotes.
-        #--
-        if options.closeBracketsAndQuotes and prev_char != '\\':
-            """
-            Detect python comments.
-            """
-            if typed_char == '"' and re.search('^[^"]*""$', preceding_line) and cursor.ends_line():
-                return self._insert_at_cursor(typed_char + ' ', ' """')
-
-            for check_char, add_char in open_close.items():
-                #--
-                # If character user is adding is the same as the one that
-                # is auto-generated, remove the auto generated char...
-                #--
-                if typed_char == add_char:
-                    if not cursor.ends_line():
-                        if next_char == add_char:
-                            if check_char != add_char:
-                                # ...don't remove ) when it's probably not auto-generated.
-                                preceding_check_chars = len(re.findall('\%s' % check_char, preceding_line))
-                                preceding_add_chars = len(re.findall('\%s' % add_char, preceding_line))
-                                following_check_chars = len(re.findall('\%s' % check_char, line_after))
-                                following_add_chars = len(re.findall('\%s' % add_char, line_after))
-                                if preceding_check_chars - preceding_add_chars > following_add_chars:
-                                    continue
-                                #--
-                                # Don't remove ) when the line becomes complex.
-                                #--
-                                if following_check_chars > 0:
-                                    continue
-                            doc.delete(cursor, next_char_pos)
-                            return False
-                #--
-                # Typed_char equals char we're looking for...
-                #--
-                if typed_char == check_char:
-                    # ...check for unlogical adding,
-                    if check_char == add_char:
-                        # ...uneven number of check_char's in front,
-                        if len(re.findall(check_char, preceding_line)) % 2 == 1:
-                            continue
-                        # ...uneven number of check_char's in back.
-                        if len(re.findall(check_char, line_after)) % 2 == 1:
-                            continue
-                    # ...don't add add_char if it is used around text,
-                    non_text_left =  ' \t\n\r,=+*:;.?!$&@%~<(){}[]-"\''
-                    non_text_right = ' \t\n\r,=+*:;.?&@%~>)}]'
-                    if not next_char and not check_char == "'":
-                        #--
-                        # If we're just typing with nothing on the right,
-                        # adding is OK as long as it isn't a "'"...
-                        #--
-                        pass
-                    elif (not prev_char or prev_char in non_text_left) and (not next_char or next_char in non_text_right):
-                        # ...this char is surrounded by nothing or non-text, therefore, we can add autotext.
-                        pass
-                    elif check_char != add_char and (not next_char or next_char in non_text_right):
-                        # ...this opening char has non-text on the right, therefore, we can add autotext.
-                        pass
-                    else:
-                        continue
-                    # ...insert add_char.
-                    return self._insert_at_cursor(typed_char, add_char)
-                #--
-                # Check backspace...
-                #--
-                if event.keyval == 65288: # ...backspace.
-                    if prev_char == check_char and next_char == add_char:
-                        doc.delete(cursor, next_char_pos)
+    def _record_keystroke(self, kind, key):
+        if self._trace is not None:
+            self._trace.write(format_trace_entry(kind, key) + "\n")
 
-        #--
-        # Auto-complete XML tags...
-        #--
-        if options.completeXML:
-            if prev_char == "<" and typed_char == "/":
-                start = doc.get_start_iter()
-                preceding_document = doc.get_text(start, cursor, False)
-                # ...analyse previous XML code,
-                closing_tag = get_closing_xml_tag(preceding_document)
-                if closing_tag:
-                    # ...insert code,
-                    return self._insert_at_cursor(typed_char + closing_tag + ">")
-                else:
-                    # ...do nothing.
-                    return False
 
-        #--
-        # Detect lists...
-        #--
-        if options.detectLists:
-            if event.keyval == 65293: # RETURN
-                # ...constants,
-                list_bullets = ['* ', '- ', '$ ', '> ', '+ ', '~ ']
-                # ...cycle through all bullets,
-                for bullet in list_bullets:
-                    if len(preceding_line) >= whitespace_pos + len(bullet):
-                        if preceding_line[whitespace_pos:whitespace_pos + len(bullet)] == bullet:
-                            # ...endlist function by double enter.
-                            if preceding_line == whitespace + bullet and bullet != '* ':
-                                start = cursor.copy()
-                                start.set_line_offset(len(whitespace))
-                                doc.delete(start, cursor)
-                                return True
-                            return self._insert_at_cursor(typed_char + whitespace + bullet)
+#--
+# Regular functions.
+#--
+def report_startup(activate_time):
+    """
+    Record import and activation time into latency report, warn when activation is over budget.
+    """
+    global _IMPORT_TIME
+    if _IMPORT_TIME is not None:
+        TRACER.record("import", _IMPORT_TIME)
+        _IMPORT_TIME = None
+    TRACER.record("activate", activate_time)
+    if activate_time > _ACTIVATE_TIME_BUDGET:
+        sys.stderr.write("intelligent_words_completion: activation took %.1f ms, budget is %.1f ms\n" % (
+            activate_time * 1000, _ACTIVATE_TIME_BUDGET * 1000))
 
-        #--
-        # Detect java-like comment...
-        #--
-        if event.keyval == 65293: # RETURN
-            # ...constants,
-            comments = {
-                '/**' : (' * ', ' */'),
-                '/*'  : (' * ', ' */'),
-            }
-            # ...cycle through all types of comment.
-            for comment_start, (comment_middle, comment_end) in comments.items():
-                if preceding_line[whitespace_pos:] == comment_start:
-                    add_middle = typed_char + whitespace + comment_middle
-                    add_end = typed_char + whitespace + comment_end
-                    return self._insert_at_cursor(add_middle, add_end)
+def get_python_executable():
+    """
+    Get Python interpreter of the same version as the one embedded in Gedit.
+    """
+    name = "python%d.%d" % sys.version_info[:2]
+    for path in (os.path.join(sys.base_exec_prefix, "bin", name), shutil.which(name)):
+        if path and os.access(path, os.X_OK):
+            return path
+    return None
 
-        #--
-        # Auto-indent after function/list...
-        #--
-        if options.autoindentAfterFunctionOrList:
-            if event.keyval == 65293: # RETURN
-                indent_triggers = {
-                    '(': ')',
-                    '{': '}',
-                    '[': ']',
-                    ':': '',
-                }
-                for indent_trigger, ending_char in indent_triggers.items():
-                    if prev_char == indent_trigger:
-                        if line_after:
-                            # ...text between begin and ending brackets should come in the middle row.
-                            if ending_char != '' and ending_char in line_after:
-                                ending_pos = line_after.find(ending_char)
-                            else:
-                                ending_pos = len(line_after)
-                            end = cursor.copy()
-                            end.set_line_offset(end.get_line_offset() + ending_pos)
-                            ending_text = doc.get_text(cursor, end, False).strip()
-                            doc.delete(cursor, end)
-
-                            add_middle = typed_char + whitespace + get_tab_string(view)
-                            add_end = ending_text + typed_char + whitespace
-                        else:
-                            add_middle = typed_char + whitespace + get_tab_string(view)
-                            add_end = ""
-                        return self._insert_at_cursor(add_middle, add_end)
-
-
-    def _insert_at_cursor(self, middle, end = ""):
-        window = self.window
-        doc = window.get_active_document()
-        doc.insert_at_cursor(middle + end)
-        #--
-        # Refresh cursor and move it to the middle.
-        #--
-        cursor = doc.get_iter_at_mark(doc.get_insert())
-        cursor.set_offset(cursor.get_offset() - len(end))
-        doc.place_cursor(cursor)
-        return True
+def show_large_file_status(doc, large):
+    """
+    Show in statusbar of the document's window that the active document is in large file mode.
+    """
+    tab = Gedit.Tab.get_from_document(doc)
+    window = tab.get_toplevel() if tab is not None else None
+    if not isinstance(window, Gedit.Window) or window.get_active_document() != doc:
+        return
+    statusbar = window.get_statusbar()
+    context_id = statusbar.get_context_id("intelligent_words_completion")
+    statusbar.remove_all(context_id)
+    if large:
+        statusbar.push(context_id, "Large file: words are completed from lines around cursor and samples of the file")
 
+def get_proposals(words):
+    return [GtkSource.CompletionItem(label=word, text=word) for word in words]
+
+def get_language_id(doc):
+    language = doc.get_language()
+    return language.get_id() if language is not None else None
 
-#--
-# Regular functions.
-#--
 def get_tab_string(view):
     tab_width = view.get_tab_width()
     tab_spaces = view.get_insert_spaces_instead_of_tabs()
@@ -506,55 +244,663 @@ def get_tab_string(view):
         tab_code = "\t"
     return tab_code
 
-def get_closing_xml_tag(document):
-    tags = re.findall(r'<.*?>', document)
-    tags.reverse()
-    closed = []
-    for tag in tags:
-        # Ignore special tags like [<!-- --> and <!doctype ...>].
-        if re.match(r'<!.*?>', tag):
-            continue
-        # Ignore special tags like [<?, <?=, <?php].
-        if re.match(r'<\?.*?>', tag):
-            continue
-        # Neutral tag.
-        if re.match(r'<.*?/>', tag):
-            continue
-        # Closing tag.
-        m = re.match(r'</ *([^ ]*).*?>', tag)
-        if m:
-            closed.append(m.group(1))
-            continue
-        # Opening tag.
-        m = re.match(r'< *([^/][^ ]*).*?>', tag)
-        if m:
-            openedtag = m.group(1)
-            while True:
-                if len(closed) == 0:
-                    return openedtag
-                close_tag = closed.pop()
-                if close_tag.lower() == openedtag.lower():
-                    break
-            continue
-    return None
+def get_lines_text(doc, first, last):
+    start = doc.get_iter_at_line(first)
+    end = doc.get_iter_at_line(last)
+    if not end.ends_line():
+        end.forward_to_line_end()
+    return split_lines(doc.get_text(start, end, False))
+
+#--
+# INDEX SERVICE.
+#--
+class IndexService(object):
+    """
+    Words indexes of documents in all windows and of their projects, every document
+    is tokenized once however many windows complete from it.
+    """
+
+    # Static singleton reference:
+    singleton = None
+
+    def __init__(self):
+        self._buffers = {}
+        self._scheduler = IndexScheduler()
+        self._bulk_indexer = BulkIndexer(self._scheduler)
+        self._projects = {}
+        self._packs = None
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Get singleton instance.
+        """
+        if cls.singleton is None:
+            cls.singleton = cls()
+        return cls.singleton
+
+    @classmethod
+    def shutdown(cls):
+        """
+        Release all documents and drop singleton instance.
+        """
+        if cls.singleton is not None:
+            for doc in list(cls.singleton._buffers):
+                cls.singleton.release_buffer(doc)
+            cls.singleton._scheduler.cancel()
+            cls.singleton._bulk_indexer.shutdown()
+            cls.singleton = None
+
+    def get_buffer(self, doc):
+        """
+        Get text buffer of the document, its words index follows editing signals of the document.
+        """
+        buffer = self._buffers.get(doc)
+        if buffer is None:
+            buffer = GeditBuffer(doc, self._scheduler, self._bulk_indexer)
+            self._buffers[doc] = buffer
+        return buffer
+
+    def release_buffer(self, doc, provider=None):
+        """
+        Stop following the document and forget its words index, also words of completion popup
+        of the provider are not added anymore when they are of the document.
+        """
+        buffer = self._buffers.pop(doc, None)
+        if buffer is not None:
+            if provider is not None:
+                provider.cancel(buffer)
+            buffer.release()
+
+    def schedule_eviction(self):
+        """
+        Evict rare words of all indexes in idle time, when words take more memory than the limit.
+        """
+        self._scheduler.schedule_eviction()
+
+    def get_other_indexes(self, buffer):
+        """
+        Get words indexes of other documents in all windows, of the project and of dictionary pack
+        of the language, packs are opened by the first completion in their language.
+        """
+        app = Gedit.App.get_default()
+        options = IntelligentTextCompletionOptions.get_instance()
+        indexes = [self.get_buffer(d).index for d in app.get_documents() if d != buffer.doc]
+        if options.projectScope:
+            project = self._get_project_vocabulary(buffer.doc)
+            if project is not None:
+                indexes.append(project)
+        if options.dictionaryPacks:
+            if self._packs is None:
+                cache_dir = os.path.join(GLib.get_user_cache_dir(), "gedit", "intelligent_words_completion", "packs")
+                self._packs = DictionaryPacks(_PACKS_DIR, cache_dir)
+            pack = self._packs.get_pack(buffer.language)
+            if pack is not None:
+                indexes.append(pack)
+        return indexes
+
+    def _get_project_vocabulary(self, doc):
+        """
+        Get words of files in project of the document, refreshed in background.
+        """
+        location = doc.get_file().get_location()
+        if location is None or location.get_path() is None:
+            return None
+        root = get_project_root(os.path.dirname(location.get_path()))
+        project = self._projects.get(root)
+        if project is None:
+            cache_dir = os.path.join(GLib.get_user_cache_dir(), "gedit", "intelligent_words_completion")
+            cache_name = hashlib.sha1(root.encode("utf-8", "surrogateescape")).hexdigest() + ".cache"
+            project = ProjectVocabulary(root, os.path.join(cache_dir, cache_name))
+            self._projects[root] = project
+        project.refresh()
+        return project
+
+
+class IndexScheduler(object):
+    """
+    Tokenize pending lines of words indexes in GLib idle callbacks,
+    no callback spends more than the time budget.
+    """
+
+    def __init__(self, budget=_IDLE_TIME_BUDGET):
+        self._budget = budget
+        self._queue = collections.OrderedDict()
+        self._chunk = _IDLE_MIN_CHUNK
+        self._chunk_time = 0.0
+        self._source_id = None
+
+    def schedule(self, index, read_lines, urgent=False):
+        """
+        Queue index for tokenization of its pending lines, urgent index is served first.
+        """
+        self._queue[index] = read_lines
+        if urgent:
+            self._queue.move_to_end(index, last=False)
+        if self._source_id is None:
+            self._source_id = GLib.idle_add(self._on_idle, priority=GLib.PRIORITY_LOW)
+
+    def schedule_eviction(self):
+        """
+        Queue vocabulary for eviction of rare words when words take more memory than the limit,
+        eviction is served first and done by steps like tokenization.
+        """
+        if VOCABULARY not in self._queue and VOCABULARY.is_over_limit():
+            self.schedule(VOCABULARY, None, urgent=True)
+
+    def cancel(self, index=None):
+        """
+        Stop tokenization of the index or of all indexes.
+        """
+        if index is not None:
+            self._queue.pop(index, None)
+        else:
+            self._queue.clear()
+        if not self._queue and self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    def _on_idle(self):
+        deadline = time.perf_counter() + self._budget
+        done = 0
+        while self._queue:
+            chunk = self._chunk
+            # ...don't start a chunk which would not fit into the rest of budget,
+            # but every callback tokenizes at least a chunk of minimal size.
+            if time.perf_counter() + self._chunk_time > deadline:
+                if done:
+                    return True
+                chunk = _IDLE_MIN_CHUNK
+            index, read_lines = next(iter(self._queue.items()))
+            start = time.perf_counter()
+            if not index.index_next_lines(read_lines, chunk):
+                del self._queue[index]
+            # ...words added by tokenized lines may take more than the limit.
+            self.schedule_eviction()
+            elapsed = time.perf_counter() - start
+            done += 1
+            if TRACER.enabled:
+                TRACER.record("idle tokenize", elapsed)
+            # ...adapt chunk size so it takes about a quarter of budget,
+            # time of the next chunk is estimated by time of a line.
+            if elapsed > self._budget / 4:
+                self._chunk = max(_IDLE_MIN_CHUNK, chunk // 2)
+            elif elapsed < self._budget / 16:
+                self._chunk = min(_IDLE_MAX_CHUNK, chunk * 2)
+            else:
+                self._chunk = chunk
+            self._chunk_time = elapsed / chunk * self._chunk
+        self._source_id = None
+        return False
+
+
+class BulkJob(object):
+    """
+    Shards of text snapshot of a buffer tokenized by worker processes. Tokenized shards are
+    merged into words index by the idle scheduler, like pending lines are tokenized.
+    """
+
+    def __init__(self, buffer, shards):
+        self.buffer = buffer
+        self.edit_count = buffer.edit_count
+        self.futures = []
+        self.results = [None] * len(shards)
+        self.merged = 0
+        self.offset = 0
+        self.first_line = 0
+        self.stale = False
+
+    def is_active(self):
+        return not self.stale and self.merged < len(self.results)
+
+    def stop(self):
+        self.stale = True
+        for future in self.futures:
+            future.cancel()
+
+    def index_next_lines(self, read_lines, max_lines):
+        """
+        Merge at most `max_lines` lines of tokenized shards into words index, in order of lines.
+        Return False when next shard is not tokenized yet or the job is done.
+        """
+        if self.stale:
+            return False
+        if self.buffer.edit_count != self.edit_count:
+            # ...snapshot differs from the text, lines are tokenized in idle callbacks instead.
+            self.stop()
+            self.buffer.schedule_indexing(bulk=False)
+            return False
+        start = TRACER.start()
+        while max_lines > 0 and self.merged < len(self.results) and self.results[self.merged] is not None:
+            lines, counts, ends = self.results[self.merged]
+            # ...every shard is tokenized from the initial lexer state.
+            starts = array.array('b', [0]) + ends[:-1]
+            part = lines[self.offset:self.offset + max_lines]
+            if len(part) < len(lines):
+                counts = collections.Counter(itertools.chain.from_iterable(part))
+            self.buffer.index.load_lines(self.first_line, part, counts,
+                starts[self.offset:self.offset + max_lines], ends[self.offset:self.offset + max_lines])
+            self.first_line += len(part)
+            self.offset += len(part)
+            max_lines -= len(part)
+            if self.offset == len(lines):
+                self.results[self.merged] = None
+                self.merged += 1
+                self.offset = 0
+        TRACER.stop("bulk merge", start)
+        if self.merged == len(self.results) and self.buffer.index.is_pending():
+            # ...lines after shards started in other lexer state than they were tokenized in.
+            self.buffer.schedule_indexing(bulk=False)
+        return self.merged < len(self.results) and self.results[self.merged] is not None
+
+
+class BulkIndexer(object):
+    """
+    Tokenize snapshots of large buffers by a pool of worker processes, shards of text are
+    tokenized in parallel and merged into words index by `scheduler` in main loop, in order of lines.
+    Buffer edited before all shards are merged falls back to idle tokenization.
+    """
+
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self._executor = None
+        self._workers = 0
+        self._failed = False
+        self._jobs = {}
+
+    def submit(self, buffer):
+        """
+        Tokenize pending lines of buffer by worker processes, return False when they are not available.
+        """
+        job = self._jobs.get(buffer)
+        if job is not None and job.is_active():
+            return True
+        # ...single core gets no pool, workers would only compete with main loop.
+        if self._failed or (os.cpu_count() or 1) < 2:
+            return False
+        shards = split_shards(buffer.get_all_text())
+        executor = self._get_executor(len(shards))
+        if executor is None:
+            return False
+        job = BulkJob(buffer, shards)
+        try:
+            for i, shard in enumerate(shards):
+                future = executor.submit(tokenize_shard, shard, buffer.language)
+                future.add_done_callback(lambda future, i=i: GLib.idle_add(self._on_shard_done, job, i, future))
+                job.futures.append(future)
+        except Exception:
+            traceback.print_exc()
+            self._failed = True
+            for future in job.futures:
+                future.cancel()
+            return False
+        self._jobs[buffer] = job
+        return True
+
+    def cancel(self, buffer):
+        job = self._jobs.pop(buffer, None)
+        if job is not None:
+            job.stop()
+            self._scheduler.cancel(job)
+
+    def shutdown(self):
+        for buffer in list(self._jobs):
+            self.cancel(buffer)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._workers = 0
+
+    def _get_executor(self, shards):
+        """
+        Start pool of Python interpreters, Gedit itself can't be forked nor spawned. Pool has a worker
+        for every shard up to count of cores, it grows for more shards when no job is active.
+        """
+        workers = min(os.cpu_count(), shards)
+        if self._executor is not None and self._workers < workers and not any(
+                job.is_active() for job in self._jobs.values()):
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._executor is None and not self._failed:
+            python = get_python_executable()
+            if python is None:
+                self._failed = True
+                return None
+            try:
+                # ...imported by the first large document, not by startup of the plugin.
+                import multiprocessing, concurrent.futures
+                context = multiprocessing.get_context("spawn")
+                context.set_executable(python)
+                self._executor = concurrent.futures.ProcessPoolExecutor(workers, mp_context=context)
+                self._workers = workers
+            except Exception:
+                traceback.print_exc()
+                self._failed = True
+        return self._executor
+
+    def _on_shard_done(self, job, i, future):
+        """
+        Schedule merging of tokenized shards into words index, runs in main loop.
+        """
+        if future.cancelled() or self._jobs.get(job.buffer) is not job or not job.is_active():
+            return False
+        try:
+            job.results[i] = future.result()
+        except Exception:
+            traceback.print_exc()
+            self._failed = True
+            # ...lines are tokenized in idle callbacks instead.
+            self.cancel(job.buffer)
+            job.buffer.schedule_indexing(bulk=False)
+            return False
+        if i == job.merged:
+            self._scheduler.schedule(job, None)
+        return False
+
+
+class ProjectVocabulary(object):
+    """
+    Words of files in project directory, tokenized in a worker thread.
+    Words of every file are cached on disk by path and modification time,
+    so only changed files are tokenized again, even after restart.
+    """
+
+    def __init__(self, root, cache_path):
+        self.root = root
+        self._cache_path = cache_path
+        self._counts = {}
+        self._sorted = []
+        self._initials = []
+        self.generation = next_generation()
+        self._crawled = None
+        self._thread = None
+
+    def refresh(self):
+        """
+        Crawl project files in background unless crawled lately.
+        """
+        if self._thread is not None:
+            return
+        if self._crawled is not None and time.monotonic() - self._crawled < _PROJECT_REFRESH_INTERVAL:
+            return
+        self._crawled = time.monotonic()
+        self._thread = threading.Thread(target=self._crawl, name="intelligent-words-project", daemon=True)
+        self._thread.start()
+
+    def _crawl(self):
+        counts = None
+        words = None
+        initials = None
+        try:
+            cached = load_vocabulary_cache(self._cache_path)
+            files = {}
+            changed = False
+            for path, mtime in walk_project_files(self.root):
+                entry = cached.get(path)
+                if entry is None or entry[0] != mtime:
+                    # ...binary and unreadable files are cached without words, so they are not read again
+                    # until they are modified.
+                    entry = (mtime, tokenize_file(path) or {})
+                    changed = True
+                files[path] = entry
+            # ...cache is written only when files were tokenized again or removed.
+            if changed or len(files) != len(cached):
+                save_vocabulary_cache(self._cache_path, files)
+            counts = {}
+            for mtime, file_counts in files.values():
+                for word, n in file_counts.items():
+                    counts[word] = counts.get(word, 0) + n
+            words = sorted(counts)
+            initials = get_initials_keys(words)
+        except Exception:
+            traceback.print_exc()
+        GLib.idle_add(self._on_crawled, counts, words, initials)
+
+    def _on_crawled(self, counts, words, initials):
+        """
+        Swap in words of crawled files, runs in main loop.
+        """
+        self._thread = None
+        if counts is not None:
+            self._counts = counts
+            self._sorted = words
+            self._initials = initials
+            self.generation = next_generation()
+        return False
+
+    def prefix_words(self, prefix):
+        return get_prefix_range(self._sorted, prefix)
+
+    def abbreviation_words(self, abbreviation):
+        return get_abbreviation_range(self._initials, abbreviation)
+
+    def count(self, word):
+        return self._counts.get(word, 0)
 
 
 #--
-# OPTIONS DIALOG.
+# COMPLETION POPUP.
+#--
+class WordsCompletionProvider(GObject.Object, GtkSource.CompletionProvider):
+    """
+    Words of completion popup shown by CTRL+SPACE when it is enabled instead of cycling.
+    The first page of best words is added at once, next pages are added in idle callbacks.
+    """
+
+    def __init__(self, engine, service):
+        GObject.Object.__init__(self)
+        self._engine = engine
+        self._service = service
+        self._source_id = None
+        self._buffer = None
+
+    def do_get_name(self):
+        return "Intelligent Words"
+
+    def do_get_priority(self):
+        return 1
+
+    def do_get_activation(self):
+        return GtkSource.CompletionActivation.USER_REQUESTED
+
+    def do_match(self, context):
+        return IntelligentTextCompletionOptions.get_instance().completionPopup
+
+    def do_populate(self, context):
+        """
+        Add the first page of words and schedule the next ones.
+        """
+        self.cancel()
+        location = context.get_iter()
+        # ...GtkSourceView 4 returns validity of the iter too.
+        if isinstance(location, tuple):
+            valid, location = location
+            if not valid:
+                context.add_proposals(self, [], True)
+                return
+        buffer = self._service.get_buffer(location.get_buffer())
+        line = location.get_line()
+        preceding_line = buffer.get_text((line, 0), (line, location.get_line_offset()))
+        prefix = get_prefix(preceding_line)
+        start = TRACER.start()
+        pages = self._engine.get_word_pages(buffer, prefix, line, previous_word=get_previous_word(preceding_line))
+        context.add_proposals(self, get_proposals(next(pages)), False)
+        TRACER.stop("popup", start)
+        context.connect("cancelled", self._on_context_cancelled)
+        self._source_id = GLib.idle_add(self._on_idle, context, pages)
+        self._buffer = buffer
+
+    def cancel(self, buffer=None):
+        """
+        Stop adding words of previous population, with `buffer` only when they are of the buffer.
+        """
+        if buffer is not None and buffer is not self._buffer:
+            return
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+        self._buffer = None
+
+    def _on_context_cancelled(self, context):
+        self.cancel()
+
+    def _on_idle(self, context, pages):
+        """
+        Add pages of words ranked within time budget, ranking goes on in the next callback.
+        """
+        deadline = time.perf_counter() + _IDLE_TIME_BUDGET
+        # ...pages are None between steps of ranking.
+        for page in pages:
+            if page:
+                context.add_proposals(self, get_proposals(page), False)
+            if time.perf_counter() > deadline:
+                return True
+        self._source_id = None
+        self._buffer = None
+        context.add_proposals(self, [], True)
+        return False
+
+
+#--
+# GEDIT DOCUMENTS.
 #--
-class IntelligentTextCompletionOptions(object):
+class GeditBuffer(TextBuffer):
+    """
+    Text buffer interface over Gedit document, following its editing signals.
+    """
+
+    def __init__(self, doc, scheduler, bulk_indexer):
+        TextBuffer.__init__(self, get_language_id(doc), IntelligentTextCompletionOptions.get_instance())
+        self.doc = doc
+        self._scheduler = scheduler
+        self._bulk_indexer = bulk_indexer
+        id_1 = doc.connect("insert-text", self._on_doc_edit_started)
+        id_2 = doc.connect_after("insert-text", self._on_doc_edit_finished)
+        id_3 = doc.connect("delete-range", self._on_doc_edit_started)
+        id_4 = doc.connect_after("delete-range", self._on_doc_edit_finished)
+        id_5 = doc.connect("notify::language", self._on_doc_language_changed)
+        doc.intelligent_text_completion_id = (id_1, id_2, id_3, id_4, id_5)
+        self.start_indexing()
+
+    def _on_doc_edit_started(self, doc, location, *args):
+        self.edit_started(location.get_line())
+
+    def _on_doc_edit_finished(self, doc, location, *args):
+        # ...location is revalidated to the end of inserted text or to the deleted range.
+        self.edit_finished(location.get_line())
+
+    def _on_doc_language_changed(self, doc, *args):
+        language = get_language_id(doc)
+        if language != self.language:
+            self.set_language(language)
+
+    def schedule_indexing(self, urgent=False, bulk=True):
+        # ...large file tokenizes only lines around cursor and samples, all of them in main loop.
+        if bulk and not self.large and self.index.count_pending() >= _BULK_MIN_LINES and self._bulk_indexer.submit(self):
+            return
+        self._scheduler.schedule(self.index, self.get_indexed_lines, urgent)
+
+    def schedule_eviction(self):
+        self._scheduler.schedule_eviction()
+
+    def release(self):
+        self._scheduler.cancel(self.index)
+        self._bulk_indexer.cancel(self)
+        for handler_id in self.doc.intelligent_text_completion_id or ():
+            self.doc.disconnect(handler_id)
+        self.doc.intelligent_text_completion_id = None
+        TextBuffer.release(self)
+
+    def set_large(self, large):
+        if large:
+            self._bulk_indexer.cancel(self)
+        TextBuffer.set_large(self, large)
+        show_large_file_status(self.doc, large)
+
+    def get_all_text(self):
+        return self.doc.get_text(self.doc.get_start_iter(), self.doc.get_end_iter(), False)
+
+    def get_line_count(self):
+        return self.doc.get_line_count()
 
-    # Settings:
-    closeBracketsAndQuotes = True
-    completeXML = True
-    detectLists = True
-    autoindentAfterFunctionOrList = True
+    def get_char_count(self):
+        return self.doc.get_char_count()
+
+    def get_line_length(self, line):
+        end = self.doc.get_iter_at_line(line)
+        if not end.ends_line():
+            end.forward_to_line_end()
+        return end.get_line_offset()
+
+    def get_line_text(self, line):
+        return self.get_lines_text(line, line)[0]
+
+    def get_lines_text(self, first, last):
+        return get_lines_text(self.doc, first, last)
+
+    def get_cursor(self):
+        cursor = self.doc.get_iter_at_mark(self.doc.get_insert())
+        return (cursor.get_line(), cursor.get_line_offset())
+
+    def place_cursor(self, position):
+        self.doc.place_cursor(self._get_iter(position))
+
+    def get_selection_bounds(self):
+        bounds = self.doc.get_selection_bounds()
+        return tuple((bound.get_line(), bound.get_line_offset()) for bound in bounds)
+
+    def get_text(self, start, end):
+        return self.doc.get_text(self._get_iter(start), self._get_iter(end), False)
+
+    def insert(self, position, text):
+        self.doc.insert(self._get_iter(position), text)
+
+    def insert_at_cursor(self, text):
+        self.doc.insert_at_cursor(text)
+
+    def delete(self, start, end, interactive=False):
+        if interactive:
+            self.doc.delete_interactive(self._get_iter(start), self._get_iter(end), True)
+        else:
+            self.doc.delete(self._get_iter(start), self._get_iter(end))
+
+    def begin_user_action(self):
+        self.doc.begin_user_action()
+
+    def end_user_action(self):
+        self.doc.end_user_action()
+
+    def get_tab_string(self):
+        return get_tab_string(Gedit.Tab.get_from_document(self.doc).get_view())
+
+    def _get_iter(self, position):
+        return self.doc.get_iter_at_line_offset(position[0], position[1])
+
+
+#--
+# OPTIONS DIALOG.
+#--
+class IntelligentTextCompletionOptions(CompletionOptions):
 
     # Buttons for settings:
     _closeBracketsAndQuotesButton = None
     _completeXMLButton = None
     _detectListsButton = None
     _autoindentAfterFunctionOrListButton = None
+    _projectScopeButton = None
+    _completeAbbreviationsButton = None
+    _completionPopupButton = None
+    _nearestWordsFirstButton = None
+    _dictionaryPacksButton = None
+    _predictNextWordsButton = None
+    _traceLatencyButton = None
+    _latencyLabel = None
+    _metricsLabel = None
+    _indexMemoryLimitButton = None
+    _memoryLabel = None
+    _largeFileModeButton = None
+    _largeFileSizeButton = None
+    _largeFileLineLengthButton = None
 
     # Configuration client:
     _BASE_KEY = "apps.gedit-3.plugins.intelligent_text_completion"
@@ -576,6 +922,17 @@ class IntelligentTextCompletionOptions(object):
         self.completeXML = self._load_setting("completeXML")
         self.detectLists = self._load_setting("detectLists")
         self.autoindentAfterFunctionOrList = self._load_setting("autoindentAfterFunctionOrList")
+        self.projectScope = self._load_setting("projectScope", False)
+        self.completeAbbreviations = self._load_setting("completeAbbreviations")
+        self.completionPopup = self._load_setting("completionPopup", False)
+        self.nearestWordsFirst = self._load_setting("nearestWordsFirst", False)
+        self.dictionaryPacks = self._load_setting("dictionaryPacks")
+        self.predictNextWords = self._load_setting("predictNextWords")
+        self.traceLatency = self._load_setting("traceLatency", False)
+        self.indexMemoryLimit = self._load_setting("indexMemoryLimit", CompletionOptions.indexMemoryLimit)
+        self.largeFileMode = self._load_setting("largeFileMode")
+        self.largeFileSize = self._load_setting("largeFileSize", CompletionOptions.largeFileSize)
+        self.largeFileLineLength = self._load_setting("largeFileLineLength", CompletionOptions.largeFileLineLength)
 
     @classmethod
     def get_instance(cls):
@@ -621,6 +978,118 @@ class IntelligentTextCompletionOptions(object):
             current_value=self.autoindentAfterFunctionOrList,
             helptext="Auto-indent after function or list",
         )
+        self._projectScopeButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.projectScope,
+            helptext="Complete words from all files of the project",
+        )
+        self._completeAbbreviationsButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.completeAbbreviations,
+            helptext="Complete words by initials of their parts (gcxt for get_closing_xml_tag)",
+        )
+        self._completionPopupButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.completionPopup,
+            helptext="Show words in completion popup instead of cycling them",
+        )
+        self._nearestWordsFirstButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.nearestWordsFirst,
+            helptext="Complete words nearest to cursor first (faster in many or large documents)",
+        )
+        self._dictionaryPacksButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.dictionaryPacks,
+            helptext="Complete words from dictionary of the language (Python, C, JavaScript, HTML)",
+        )
+        self._predictNextWordsButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.predictNextWords,
+            helptext="Predict words following the previous word when there's no prefix",
+        )
+        self._traceLatencyButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.traceLatency,
+            helptext="Trace latency of key handlers",
+        )
+
+        # Add memory limit of words index and its current memory.
+        self._indexMemoryLimitButton = self._add_setting_spin_button(
+            vbox=vbox,
+            current_value=self.indexMemoryLimit,
+            helptext="Memory limit of words index in MB (0 for none)",
+            upper=65536,
+            step=64,
+            callback=self._on_memory_limit_changed,
+        )
+        box = Gtk.HBox()
+        self._memoryLabel = Gtk.Label()
+        box.pack_start(self._memoryLabel, False, False, 6)
+        button = Gtk.Button("Refresh memory")
+        button.connect('clicked', self._on_refresh_memory_clicked)
+        box.pack_start(button, False, False, 6)
+        vbox.pack_start(box, False, True, 0)
+        self._on_refresh_memory_clicked()
+
+        # Add large file mode and its thresholds.
+        self._largeFileModeButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.largeFileMode,
+            helptext="Index only lines around cursor and samples of large files",
+        )
+        self._largeFileSizeButton = self._add_setting_spin_button(
+            vbox=vbox,
+            current_value=self.largeFileSize,
+            helptext="Large files have more MB than",
+            upper=65536,
+            step=1,
+            callback=self._on_check_button_toggled,
+        )
+        self._largeFileLineLengthButton = self._add_setting_spin_button(
+            vbox=vbox,
+            current_value=self.largeFileLineLength,
+            helptext="Large files have a line with more characters than",
+            upper=1 << 30,
+            step=1000,
+            callback=self._on_check_button_toggled,
+        )
+
+        # Add latencies report with buttons to refresh and save it.
+        self._latencyLabel = Gtk.Label()
+        self._latencyLabel.set_selectable(True)
+        self._latencyLabel.set_xalign(0)
+        vbox.pack_start(self._latencyLabel, False, True, 6)
+        box = Gtk.HBox()
+        button = Gtk.Button("Refresh latencies")
+        button.connect('clicked', self._on_refresh_latencies_clicked)
+        box.pack_start(button, False, False, 6)
+        button = Gtk.Button("Save latencies")
+        button.connect('clicked', self._on_save_latencies_clicked)
+        box.pack_start(button, False, False, 6)
+        button = Gtk.Button("Reset latencies")
+        button.connect('clicked', self._on_reset_latencies_clicked)
+        box.pack_start(button, False, False, 6)
+        vbox.pack_start(box, False, True, 0)
+        self._on_refresh_latencies_clicked()
+
+        # Add completion metrics with buttons to refresh, export and reset them.
+        self._metricsLabel = Gtk.Label()
+        self._metricsLabel.set_selectable(True)
+        self._metricsLabel.set_xalign(0)
+        vbox.pack_start(self._metricsLabel, False, True, 6)
+        box = Gtk.HBox()
+        button = Gtk.Button("Refresh metrics")
+        button.connect('clicked', self._on_refresh_metrics_clicked)
+        box.pack_start(button, False, False, 6)
+        button = Gtk.Button("Export metrics")
+        button.connect('clicked', self._on_export_metrics_clicked)
+        box.pack_start(button, False, False, 6)
+        button = Gtk.Button("Reset metrics")
+        button.connect('clicked', self._on_reset_metrics_clicked)
+        box.pack_start(button, False, False, 6)
+        vbox.pack_start(box, False, True, 0)
+        self._on_refresh_metrics_clicked()
         return vbox
 
     def _add_setting_checkbox(self, vbox, current_value, helptext):
@@ -632,24 +1101,100 @@ class IntelligentTextCompletionOptions(object):
         vbox.pack_start(box, False, True, 0)
         return check_button
 
+    def _add_setting_spin_button(self, vbox, current_value, helptext, upper, step, callback):
+        box = Gtk.HBox()
+        label = Gtk.Label(helptext)
+        box.pack_start(label, False, False, 6)
+        spin_button = Gtk.SpinButton.new_with_range(0, upper, step)
+        spin_button.set_value(current_value)
+        box.pack_start(spin_button, False, False, 6)
+        spin_button.connect('value-changed', callback)
+        vbox.pack_start(box, False, True, 0)
+        return spin_button
+
     def _on_check_button_toggled(self, *args):
         # Set class attributes.
         self.closeBracketsAndQuotes = self._closeBracketsAndQuotesButton.get_active()
         self.completeXML = self._completeXMLButton.get_active()
         self.detectLists = self._detectListsButton.get_active()
         self.autoindentAfterFunctionOrList = self._autoindentAfterFunctionOrListButton.get_active()
+        self.projectScope = self._projectScopeButton.get_active()
+        self.completeAbbreviations = self._completeAbbreviationsButton.get_active()
+        self.completionPopup = self._completionPopupButton.get_active()
+        self.nearestWordsFirst = self._nearestWordsFirstButton.get_active()
+        self.dictionaryPacks = self._dictionaryPacksButton.get_active()
+        self.predictNextWords = self._predictNextWordsButton.get_active()
+        self.traceLatency = self._traceLatencyButton.get_active()
+        TRACER.enabled = self.traceLatency
+        self.largeFileMode = self._largeFileModeButton.get_active()
+        self.largeFileSize = self._largeFileSizeButton.get_value_as_int()
+        self.largeFileLineLength = self._largeFileLineLengthButton.get_value_as_int()
 
         # Write changes to gconf.
         self._save_setting("closeBracketsAndQuotes", self.closeBracketsAndQuotes)
         self._save_setting("completeXML", self.completeXML)
         self._save_setting("detectLists", self.detectLists)
         self._save_setting("autoindentAfterFunctionOrList", self.autoindentAfterFunctionOrList)
+        self._save_setting("projectScope", self.projectScope)
+        self._save_setting("completeAbbreviations", self.completeAbbreviations)
+        self._save_setting("completionPopup", self.completionPopup)
+        self._save_setting("nearestWordsFirst", self.nearestWordsFirst)
+        self._save_setting("dictionaryPacks", self.dictionaryPacks)
+        self._save_setting("predictNextWords", self.predictNextWords)
+        self._save_setting("traceLatency", self.traceLatency)
+        self._save_setting("largeFileMode", self.largeFileMode)
+        self._save_setting("largeFileSize", self.largeFileSize)
+        self._save_setting("largeFileLineLength", self.largeFileLineLength)
+
+    def _on_memory_limit_changed(self, *args):
+        self.indexMemoryLimit = self._indexMemoryLimitButton.get_value_as_int()
+        VOCABULARY.limit = self.indexMemoryLimit << 20
+        if IndexService.singleton is not None:
+            IndexService.singleton.schedule_eviction()
+        self._save_setting("indexMemoryLimit", self.indexMemoryLimit)
+        self._on_refresh_memory_clicked()
+
+    def _on_refresh_memory_clicked(self, *args):
+        words, size = VOCABULARY.get_stats()
+        text = "Words index: %d words, %.1f MB" % (words, size / float(1 << 20))
+        # ...lines of open documents alone may take more than the limit, no word is evicted then.
+        if VOCABULARY.is_limit_unreachable():
+            text += " (lines of documents alone exceed the limit)"
+        self._memoryLabel.set_text(text)
+
+    def _on_refresh_latencies_clicked(self, *args):
+        self._latencyLabel.set_markup("<tt>%s</tt>" % GLib.markup_escape_text(TRACER.get_report()))
+
+    def _on_save_latencies_clicked(self, *args):
+        path = os.path.join(GLib.get_user_cache_dir(), "gedit", "intelligent_words_completion", "latencies.txt")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        TRACER.dump(path)
+        self._latencyLabel.set_markup("<tt>%s</tt>\nSaved to %s" % (
+            GLib.markup_escape_text(TRACER.get_report()), GLib.markup_escape_text(path)))
+
+    def _on_reset_latencies_clicked(self, *args):
+        TRACER.reset()
+        self._on_refresh_latencies_clicked()
+
+    def _on_refresh_metrics_clicked(self, *args):
+        self._metricsLabel.set_markup("<tt>%s</tt>" % GLib.markup_escape_text(METRICS.get_report()))
+
+    def _on_export_metrics_clicked(self, *args):
+        path = os.path.join(GLib.get_user_cache_dir(), "gedit", "intelligent_words_completion", "metrics.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        METRICS.dump(path)
+        self._metricsLabel.set_markup("<tt>%s</tt>\nSaved to %s" % (
+            GLib.markup_escape_text(METRICS.get_report()), GLib.markup_escape_text(path)))
+
+    def _on_reset_metrics_clicked(self, *args):
+        METRICS.reset()
+        self._on_refresh_metrics_clicked()
 
     def _save_setting(self, setting_name, value):
         pass
         # self._gconf_client.set_bool("{}/{}".format(self._GCONF_SETTINGS_DIR, setting_name), value)
 
-    def _load_setting(self, setting_name):
-        return True
+    def _load_setting(self, setting_name, default=True):
+        return default
         # return self._gconf_client.get_bool("{}/{}".format(self._GCONF_SETTINGS_DIR, setting_name))
 
@@ -0,0 +1,2865 @@
+###
+# Copyright (C) 2010, Jens Nyman (nymanjens.nj@gmail.com).
+#--
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#--
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#--
+# Words completion via [CTRL]+[SPACE] shortcut by Chrosta (rosta.zdenek@gmail.com).
+#--
+# Text logic of the plugin, independent of Gedit and GTK.
+###
+import re, sys, bisect, heapq, math, os, mmap, struct, array, json, time, itertools, collections, weakref, functools, operator
+
+# Hardware key codes and key values handled.
+KEYCODE_BACKSPACE = 22
+KEYCODE_CONTROL = 37
+KEYCODE_SPACE = 65
+KEYVAL_BACKSPACE = 65288
+KEYVAL_RETURN = 65293
+# Line separators as understood by GtkTextBuffer, str.splitlines() splits also by others.
+_LINE_SEPARATOR = re.compile('\r\n|[\r\n\u2029]')
+_OTHER_LINE_SEPARATOR = re.compile('[\x0b\x0c\x1c\x1d\x1e\x85\u2028]')
+# Words of at least two characters.
+_WORD = re.compile(r'\w\w+')
+# Word before cursor separated by non-word characters, next words are predicted by it.
+_PREVIOUS_WORD = re.compile(r'(\w\w+)\W*\Z')
+_PREVIOUS_WORD_CHARS = 256
+# Lines starting in a skipped block are marked by private use character plus number of the block while tokenized.
+_STATE_MARK = 0xe000
+# Parts of camelCase words, like XML, Parser, get, 64.
+_WORD_PART = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+|[^\W\d_A-Za-z]+')
+_MAX_CHAR = '\U0010ffff'
+# More changed words than this are merged into sorted words list in linear passes, not by bisection.
+_SORTED_MERGE_LIMIT = 64
+# Edits touching more lines than this are tokenized later.
+_SYNC_LINES_LIMIT = 64
+# Lines following a line whose lexer state changed are tokenized again by windows of this size.
+_STATE_LINES = 256
+# Count of best ranked words to cycle through.
+_CYCLE_SIZE = 50
+# Words of completion popup added at once and at most.
+_PAGE_SIZE = 20
+_POPUP_SIZE = 500
+# Words scored or ranked in one step of ranking for completion popup, between idle callbacks.
+_RANK_STEP_WORDS = 2048
+# Count of words scored by recent prefixes kept in candidate cache.
+_CANDIDATE_CACHE_WORDS = 100000
+# Estimated bytes of a word entry in vocabulary and in a words index, besides the word itself.
+_VOCABULARY_WORD_BYTES = 72
+_INDEX_WORD_BYTES = 64
+# Words counted and lines stripped of evicted words in one step of eviction, between idle callbacks,
+# when words take more memory than the limit, and evicted words released in one step: every step
+# updates sorted words of an index by a linear pass.
+_EVICTION_STEP = 2048
+_EVICTION_STEP_WORDS = 512
+# Estimated bytes of a line in a words index besides its words, evicting words doesn't free them.
+_LINE_BYTES = 8 + sys.getsizeof(())
+# Estimated bytes freed by evicting a word besides the word, its initials key and its occurrences in lines.
+_EVICTED_WORD_BYTES = _VOCABULARY_WORD_BYTES + _INDEX_WORD_BYTES + 16
+# Pairs of words following each other counted at most, counted successors of every word
+# and estimated bytes of a pair.
+_BIGRAM_LIMIT = 1 << 17
+_BIGRAM_SUCCESSORS = 64
+_BIGRAM_BYTES = 120
+# Ranking weights of occurrences in current and other documents and of nearby lines.
+_CURRENT_WEIGHT = 2.0
+_OTHER_WEIGHT = 1.0
+_PROXIMITY_WEIGHT = 3.0
+_PROXIMITY_LINES = 50
+# Lines around cursor line scanned first for nearest words, scanned windows grow by factor
+# up to lines at most this far from cursor line, their pending lines are tokenized at once.
+_NEAREST_WINDOW = 16
+_NEAREST_GROWTH = 4
+_NEAREST_LINES = 1000
+# Brackets and quotes balanced by auto-closing, characters counted on each side of cursor.
+_BALANCE_CHARS = '"\'(){}[]'
+_BALANCE_WINDOW = 4096
+# Auto-closed chars by opening ones and chars around them allowing auto-closing.
+_OPEN_CLOSE = {
+    '"': '"',
+    "'": "'",
+    '(': ')',
+    '{': '}',
+    '[': ']',
+}
+_NON_TEXT_LEFT = ' \t\n\r,=+*:;.?!$&@%~<(){}[]-"\''
+_NON_TEXT_RIGHT = ' \t\n\r,=+*:;.?&@%~>)}]'
+# Bullets of continued lists, java-like comments and chars followed by indented line with their ending chars.
+_LIST_BULLETS = ['* ', '- ', '$ ', '> ', '+ ', '~ ']
+_COMMENTS = {
+    '/**' : (' * ', ' */'),
+    '/*'  : (' * ', ' */'),
+}
+_INDENT_TRIGGERS = {
+    '(': ')',
+    '{': '}',
+    '[': ']',
+    ':': '',
+}
+# Large file mode: lines around cursor and sampled lines tokenized, characters of long lines
+# tokenized around cursor, read on each side of cursor and lines scanned back for opened XML tags.
+_LARGE_WINDOW_LINES = 2000
+_LARGE_SAMPLES = 64
+_LARGE_SAMPLE_LINES = 64
+_LARGE_TOKENIZED_CHARS = 2048
+_LARGE_LINE_WINDOW = 4096
+_LARGE_XML_LINES = 1000
+# XML tags patterns and lines between checkpoints of opened tags.
+_XML_TAG = re.compile(r'<.*?>')
+_XML_CLOSING_TAG = re.compile(r'</ *([^ ]*).*?>')
+_XML_OPENING_TAG = re.compile(r'< *([^/][^ ]*).*?>')
+_XML_BLOCK_LINES = 256
+# Limits of project files crawling.
+_PROJECT_MARKERS = ('.git', '.hg', '.svn', '.bzr')
+_PROJECT_SKIPPED_DIRS = ('node_modules', '__pycache__')
+_PROJECT_MAX_FILES = 10000
+_PROJECT_MAX_FILE_SIZE = 1 << 20
+# Project vocabulary cache: magic and header of every file record.
+_CACHE_MAGIC = b'IWC2'
+_CACHE_RECORD = struct.Struct('<IdII')
+# Dictionary pack: magic and header with counts of words and initials keys and lengths of their texts.
+_PACK_MAGIC = b'IWP1'
+_PACK_HEADER = struct.Struct('<IIII')
+# Dictionary packs by GtkSourceLanguage id.
+_LANGUAGE_PACKS = {
+    'c': 'c', 'chdr': 'c', 'cpp': 'c', 'cpphdr': 'c', 'objc': 'c',
+    'python': 'python', 'python3': 'python',
+    'js': 'js', 'typescript': 'js',
+    'html': 'html',
+}
+# Characters of text tokenized by one task of bulk indexing.
+_SHARD_CHARS = 1 << 20
+# Latency histograms have buckets by powers of two microseconds.
+_HISTOGRAM_BUCKETS = 32
+# Completion metrics count presses and ranks up to this, the last bucket counts greater ones too.
+_METRICS_BUCKETS = 16
+
+
+#--
+# Regular functions.
+#--
+def count_chars(text, chars):
+    return dict((char, text.count(char)) for char in chars)
+
+def check_prefix(prefix):
+    flag = True
+    if len(prefix) > 0:
+        prefix = prefix.split("_")
+        for part in prefix:
+            if len(part) > 0:
+                if flag:
+                    flag = part.isalnum()
+    return flag
+
+def get_prefix(preceding_line):
+    """
+    Get part of word before cursor the word is completed from.
+    """
+    offset = len(preceding_line)
+    prefix = ""
+    index = 0
+    while check_prefix(prefix) and (offset - index) > 0:
+        index += 1
+        prefix = preceding_line[offset - index:]
+    if prefix[0:1].isalnum() or prefix[0:1] == "_":
+        return prefix
+    return prefix[1:]
+
+def get_previous_word(preceding_line):
+    """
+    Get word before cursor followed by non-word characters only, like `self` in `self.`.
+    """
+    match = _PREVIOUS_WORD.search(preceding_line[-_PREVIOUS_WORD_CHARS:])
+    return match.group(1) if match else ""
+
+def format_trace_entry(kind, key):
+    """
+    Get line of keystrokes trace for key "press" or "release".
+    """
+    return json.dumps([kind, key.keyval, key.keycode, key.string, key.control])
+
+def parse_trace_entry(line):
+    """
+    Get kind and keystroke from line of keystrokes trace.
+    """
+    kind, keyval, keycode, string, control = json.loads(line)
+    return kind, Keystroke(keyval, keycode, string, control)
+
+def get_end_position(position, text):
+    """
+    Get position behind text inserted at position.
+    """
+    lines = split_lines(text)
+    if len(lines) == 1:
+        return (position[0], position[1] + len(text))
+    return (position[0] + len(lines) - 1, len(lines[-1]))
+
+def split_lines(text):
+    if _OTHER_LINE_SEPARATOR.search(text):
+        return _LINE_SEPARATOR.split(text)
+    lines = text.splitlines()
+    if not text or text[-1] in '\r\n\u2029':
+        lines.append('')
+    return lines
+
+def split_shards(text, size=_SHARD_CHARS):
+    """
+    Split text at line ends into shards of about `size` characters, lines of all shards are lines of text.
+    """
+    shards = []
+    start = 0
+    while len(text) - start > size:
+        end = text.find('\n', start + size)
+        if end < 0:
+            break
+        shards.append(text[start:end - 1] if text[end - 1] == '\r' else text[start:end])
+        start = end + 1
+    shards.append(text[start:])
+    return shards
+
+def get_sampled_ranges(line, line_count):
+    """
+    Get sorted ranges (first, last) of lines tokenized in large file mode:
+    window around the line and samples of lines spread evenly over the file.
+    """
+    step = line_count // _LARGE_SAMPLES
+    if step <= _LARGE_SAMPLE_LINES:
+        return [(0, line_count - 1)]
+    ranges = [(first, first + _LARGE_SAMPLE_LINES - 1) for first in range(0, line_count, step)]
+    ranges.append((max(0, line - _LARGE_WINDOW_LINES), min(line_count - 1, line + _LARGE_WINDOW_LINES)))
+    ranges.sort()
+    merged = [ranges[0]]
+    for first, last in ranges[1:]:
+        if first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+def get_text_window(text, offset, size):
+    """
+    Get at most `size` characters of text around offset.
+    """
+    if len(text) <= size:
+        return text
+    start = max(0, min(offset, len(text)) - size // 2)
+    return text[start:start + size]
+
+def tokenize_shard(text, language=None):
+    """
+    Get words of every line of text, counts of the words and lexer states at ends of the lines,
+    runs in worker processes. Equal words are the same objects, so they are pickled only once.
+    """
+    words = {}
+    counts = {}
+    lines = []
+    tokenized, ends = get_tokenizer(language).lex_text(text)
+    for line_tokens in tokenized:
+        tokens = tuple([words.setdefault(w, w) for w in line_tokens])
+        for word in tokens:
+            counts[word] = counts.get(word, 0) + 1
+        lines.append(tokens)
+    return lines, counts, ends
+
+def get_prefix_range(words, prefix):
+    """
+    Get words of the sorted list starting with prefix.
+    """
+    start = bisect.bisect_left(words, prefix)
+    end = bisect.bisect_left(words, prefix + _MAX_CHAR, start)
+    return words[start:end]
+
+def update_sorted(words, added, removed):
+    """
+    Get sorted list of words without removed words and with added ones. Few words are deleted and
+    inserted by bisection, more of them are cut out and merged in linear passes.
+    """
+    if len(added) + len(removed) <= _SORTED_MERGE_LIMIT:
+        for word in removed:
+            del words[bisect.bisect_left(words, word)]
+        for word in added:
+            bisect.insort(words, word)
+        return words
+    if removed:
+        kept = []
+        start = 0
+        for i in sorted([bisect.bisect_left(words, word) for word in removed]):
+            kept += words[start:i]
+            start = i + 1
+        kept += words[start:]
+        words = kept
+    if added:
+        added = sorted(added)
+        merged = []
+        start = 0
+        for word in added:
+            i = bisect.bisect_left(words, word, start)
+            merged += words[start:i]
+            merged.append(word)
+            start = i
+        merged += words[start:]
+        words = merged
+    return words
+
+def get_initials(word):
+    """
+    Get lowercase initials of snake_case and camelCase parts of word, like gcxt for get_closing_xml_tag.
+    """
+    return "".join([part[0] for part in _WORD_PART.findall(word)]).lower()
+
+def get_initials_keys(words):
+    """
+    Get sorted keys "initials word" of words made of more parts, for abbreviation queries.
+    """
+    keys = []
+    for word in words:
+        initials = get_initials(word)
+        if len(initials) > 1:
+            keys.append(initials + " " + word)
+    keys.sort()
+    return keys
+
+def get_abbreviation_range(keys, abbreviation):
+    """
+    Get words of sorted initials keys whose initials start with abbreviation.
+    """
+    return [key.split(" ", 1)[1] for key in get_prefix_range(keys, abbreviation)]
+
+def count_tokens(lines):
+    """
+    Get count of words in tokenized lines, pending lines are None.
+    """
+    return sum([len(tokens) for tokens in lines if tokens])
+
+def get_threshold(freed, excess):
+    """
+    Get the least key of dict of bytes `freed` by keys, for which bytes of lesser keys and of the key
+    cover the `excess`, and the excess left to cover by the key. Key is None when all bytes don't cover it.
+    """
+    for key in sorted(freed):
+        if freed[key] >= excess:
+            return key, excess
+        excess -= freed[key]
+    return None, excess
+
+def get_slices(iterable, size):
+    """
+    Yield lists of at most `size` items of iterable, all items in one list when size is None.
+    """
+    items = iter(iterable)
+    while True:
+        part = list(itertools.islice(items, size))
+        if not part:
+            return
+        yield part
+
+def run_steps(steps):
+    """
+    Run all steps of a generator at once, get the value it returns.
+    """
+    try:
+        while True:
+            next(steps)
+    except StopIteration as stop:
+        return stop.value
+
+def score_other_words(prefix, other_indexes, abbreviation=False):
+    """
+    Get scores of words of other documents and project by their occurrences.
+    """
+    return run_steps(iter_score_other_words(prefix, other_indexes, abbreviation))
+
+def iter_score_other_words(prefix, other_indexes, abbreviation=False, step_words=None):
+    """
+    Score words of other sources like `score_other_words`, stepwise: yield after every source
+    and every `step_words` words, return the scores.
+    """
+    query = "abbreviation_words" if abbreviation else "prefix_words"
+    counts = {}
+    for other in other_indexes:
+        for part in get_slices(getattr(other, query)(prefix), step_words):
+            for word in part:
+                counts[word] = counts.get(word, 0) + other.count(word)
+            yield
+        yield
+    scores = {}
+    for part in get_slices(counts.items(), step_words):
+        scores.update([(word, _OTHER_WEIGHT * math.log1p(count)) for word, count in part])
+        yield
+    return scores
+
+def rank_words(prefix, index, line, other_scores, limit, abbreviation=False):
+    """
+    Get at most `limit` words starting with prefix (but prefix itself), best ranked first.
+    Words are ranked by occurrences, occurrences in current document count more,
+    words found near cursor line get a bonus by distance. Equal ranks keep shorter words first.
+    With `abbreviation` words are matched by their initials starting with lowercase prefix instead.
+    Scores of words of other documents are got by `score_other_words`.
+    """
+    return run_steps(iter_rank_words(prefix, index, line, other_scores, limit, abbreviation))
+
+def iter_rank_words(prefix, index, line, other_scores, limit, abbreviation=False, step_words=None):
+    """
+    Rank words like `rank_words`, stepwise: yield after every `step_words` words, return the best ones.
+    """
+    query = "abbreviation_words" if abbreviation else "prefix_words"
+    scores = {}
+    for part in get_slices(other_scores.items(), step_words):
+        scores.update(part)
+        yield
+    words = getattr(index, query)(prefix)
+    for part in get_slices(words, step_words):
+        for word in part:
+            scores[word] = scores.get(word, 0.0) + _CURRENT_WEIGHT * math.log1p(index.count(word))
+        yield
+    for word, distance in index.nearby_words(prefix, line, _PROXIMITY_LINES, set(words) if abbreviation else None).items():
+        scores[word] = scores.get(word, 0.0) + _PROXIMITY_WEIGHT * (1.0 - distance / (_PROXIMITY_LINES + 1.0))
+    scores.pop(prefix, None)
+    key = lambda w: (-scores[w], len(w), w)
+    best = []
+    for part in get_slices(scores, step_words):
+        best = heapq.nsmallest(limit, itertools.chain(best, part), key=key)
+        yield
+    return best
+
+def nearest_words(prefix, index, line, other_indexes, limit, read_lines=None, abbreviation=False):
+    """
+    Get at most `limit` words starting with prefix (but prefix itself), nearest first.
+    Lines of the document are scanned in windows growing from the line, see DocumentWordIndex.nearest_words,
+    words of other documents follow by their occurrences. Other documents are queried in order
+    only while there are not enough words, so the search ends as soon as the cycle is filled.
+    With `abbreviation` words are matched by their initials starting with lowercase prefix instead.
+    """
+    query = "abbreviation_words" if abbreviation else "prefix_words"
+    words = index.nearest_words(prefix, line, limit, read_lines, set(index.abbreviation_words(prefix)) if abbreviation else None)
+    found = set(words)
+    found.add(prefix)
+    for other in other_indexes:
+        if len(words) >= limit:
+            break
+        more = [word for word in getattr(other, query)(prefix) if word not in found]
+        more = heapq.nsmallest(limit - len(words), more, key=lambda w: (-other.count(w), len(w), w))
+        words.extend(more)
+        found.update(more)
+    return words
+
+def get_project_root(directory):
+    """
+    Get closest parent directory under version control, directory itself otherwise.
+    """
+    path = directory
+    while True:
+        for marker in _PROJECT_MARKERS:
+            if os.path.exists(os.path.join(path, marker)):
+                return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return directory
+        path = parent
+
+def walk_project_files(root):
+    """
+    Yield path and modification time of project files, hidden and vendored directories are skipped.
+    """
+    found = 0
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d[:1] != '.' and d not in _PROJECT_SKIPPED_DIRS]
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            if info.st_size > _PROJECT_MAX_FILE_SIZE:
+                continue
+            yield path, info.st_mtime
+            found += 1
+            if found >= _PROJECT_MAX_FILES:
+                return
+
+def tokenize_file(path):
+    """
+    Get words of the file with their counts, None for binary or unreadable file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if b'\0' in data[:8192]:
+        return None
+    counts = {}
+    tokenizer = get_tokenizer(get_file_language(path))
+    for tokens in tokenizer.tokenize_text(data.decode('utf-8', 'replace')):
+        for word in tokens:
+            counts[word] = counts.get(word, 0) + 1
+    return counts
+
+def load_vocabulary_cache(path):
+    """
+    Get cached words of files as {path: (mtime, {word: count})}, cache file is read via mmap.
+    """
+    files = {}
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= len(_CACHE_MAGIC):
+                return files
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(_CACHE_MAGIC)] != _CACHE_MAGIC:
+                    return files
+                offset = len(_CACHE_MAGIC)
+                while offset < len(data):
+                    path_len, mtime, word_count, words_len = _CACHE_RECORD.unpack_from(data, offset)
+                    offset += _CACHE_RECORD.size
+                    file_path = data[offset:offset + path_len].decode('utf-8', 'surrogateescape')
+                    offset += path_len
+                    counts = array.array('I', data[offset:offset + 4 * word_count])
+                    offset += 4 * word_count
+                    words = data[offset:offset + words_len].decode('utf-8').split('\n') if word_count else []
+                    offset += words_len
+                    files[file_path] = (mtime, dict(zip(words, counts)))
+    except (OSError, ValueError, struct.error, UnicodeDecodeError):
+        pass
+    return files
+
+def save_vocabulary_cache(path, files):
+    """
+    Write words of files given as {path: (mtime, {word: count})} to cache file.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(_CACHE_MAGIC)
+            for file_path, (mtime, counts) in files.items():
+                encoded_path = file_path.encode('utf-8', 'surrogateescape')
+                words = '\n'.join(counts).encode('utf-8')
+                f.write(_CACHE_RECORD.pack(len(encoded_path), mtime, len(counts), len(words)))
+                f.write(encoded_path)
+                f.write(array.array('I', counts.values()).tobytes())
+                f.write(words)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
+
+def read_word_list(path):
+    """
+    Get words of a word list file as {word: count}, a line has a word optionally followed by its count,
+    lines starting with '#' are comments.
+    """
+    counts = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith('#') or not _WORD.fullmatch(fields[0]):
+                continue
+            count = int(fields[1]) if len(fields) > 1 else 1
+            counts[fields[0]] = counts.get(fields[0], 0) + count
+    return counts
+
+def write_dictionary_pack(path, counts):
+    """
+    Write words given as {word: count} to dictionary pack file: header, offsets and texts of sorted words,
+    offsets and texts of sorted initials keys, then counts of words. Texts end by newline,
+    so texts of a range are decoded at once. UTF-8 keeps order of words.
+    """
+    words = sorted(counts)
+    keys = get_initials_keys(words)
+    sections = []
+    for items in (words, keys):
+        encoded = [item.encode('utf-8') + b'\n' for item in items]
+        offsets = array.array('I', [0])
+        offsets.extend(itertools.accumulate(map(len, encoded)))
+        text = b''.join(encoded)
+        sections.append((offsets, text + b'\0' * (-len(text) % 4)))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(_PACK_MAGIC)
+        f.write(_PACK_HEADER.pack(len(words), len(sections[0][1]), len(keys), len(sections[1][1])))
+        for offsets, text in sections:
+            f.write(offsets.tobytes())
+            f.write(text)
+        f.write(array.array('I', [counts[word] for word in words]).tobytes())
+    os.replace(path + '.tmp', path)
+
+def get_closing_xml_tag(document):
+    stack = update_xml_tag_stack(None, document)
+    return stack[0] if stack else None
+
+def update_xml_tag_stack(stack, text):
+    """
+    Get stack of opened XML tags updated by tags in text.
+    Stack is a linked list of (tag, stack) tuples, so that it is shared by checkpoints.
+    A closing tag closes the top tag if names match, a not matching closing tag is ignored.
+    """
+    for tag in _XML_TAG.findall(text):
+        # Ignore special tags like [<!-- --> and <!doctype ...>].
+        if tag.startswith('<!'):
+            continue
+        # Ignore special tags like [<?, <?=, <?php].
+        if tag.startswith('<?'):
+            continue
+        # Neutral tag.
+        if tag.endswith('/>'):
+            continue
+        # Closing tag.
+        m = _XML_CLOSING_TAG.match(tag)
+        if m:
+            if stack is not None and stack[0].lower() == m.group(1).lower():
+                stack = stack[1]
+            continue
+        # Opening tag.
+        m = _XML_OPENING_TAG.match(tag)
+        if m:
+            stack = (m.group(1), stack)
+    return stack
+
+
+#--
+# TOKENIZERS.
+#--
+class Tokenizer(object):
+    """
+    Words of lines got by one pass of precompiled patterns over their text,
+    matches of `skipped` patterns like comments and string literals are left out.
+    Skipped blocks spanning more lines are given as (opening, closing) pairs. Lexer state
+    at end of a line is number of the block open there or 0, tokenizing resumes by the state.
+    """
+
+    def __init__(self, *skipped):
+        self._blocks = [item for item in skipped if isinstance(item, tuple)]
+        patterns = []
+        for item in skipped:
+            if isinstance(item, tuple):
+                # ...block is the only group of the pattern, unclosed block ends with the text. Group follows
+                # the opening, so every alternative starts by a literal and the regex engine finds them fast.
+                patterns.append(r'%s([\s\S]*?)(?:%s|\Z)' % tuple(map(re.escape, item)))
+            else:
+                patterns.append('(?:%s)' % item)
+        self._skipped = re.compile('|'.join(patterns)) if patterns else None
+        self._marks = dict((chr(_STATE_MARK + i), i) for i in range(1, len(self._blocks) + 1))
+
+    def tokenize_text(self, text):
+        """
+        Get tuple of words of every line of text.
+        """
+        return self.lex_text(text)[0]
+
+    def lex_lines(self, lines, state=0):
+        return self.lex_text('\n'.join(lines), state)
+
+    def lex_text(self, text, state=0):
+        """
+        Get tuple of words of every line of text and array of lexer states at ends of the lines,
+        text starts in lexer `state`.
+        """
+        find_words = _WORD.findall
+        if self._skipped is None:
+            lines = split_lines(text)
+            return [tuple(find_words(line)) for line in lines], array.array('b', bytes(len(lines)))
+        if state:
+            # ...text starting in a block gets its opening, so it's skipped up to closing.
+            text = self._blocks[state - 1][0] + text
+        blocks = self._blocks
+        # ...state at end of text and whether any block spans more lines.
+        last_state = [0, False]
+
+        def blank(match):
+            """
+            Get blank replacement of skipped text keeping its line separators, so lines keep their numbers.
+            Lines starting in a block start by mark of the block.
+            """
+            block = match.lastindex
+            if block is None:
+                return ' '
+            text = match.group()
+            opening, closing = blocks[block - 1]
+            closed = len(text) >= len(opening) + len(closing) and text.endswith(closing)
+            last_state[0] = 0 if closed else block
+            if '\n' in text or '\r' in text or '\u2029' in text:
+                last_state[1] = True
+                return ' ' + ('\n' + chr(_STATE_MARK + block)) * (len(split_lines(text)) - 1)
+            return ' '
+
+        lines = split_lines(self._skipped.sub(blank, text))
+        if last_state[1]:
+            marks = self._marks
+            ends = array.array('b', [marks.get(line[:1], 0) for line in lines[1:]])
+        else:
+            ends = array.array('b', bytes(len(lines) - 1))
+        # ...only block at end of text is left open.
+        ends.append(last_state[0])
+        return [tuple(find_words(line)) for line in lines], ends
+
+# Patterns of comments and string literals, only blocks given by their opening and closing span more lines.
+_HASH_COMMENT = r'#[^\r\n\u2029]*'
+_LINE_HASH_COMMENT = r'(?<![^\r\n\u2029])[ \t]*#[^\r\n\u2029]*'
+_SLASH_COMMENT = r'//[^\r\n\u2029]*'
+_BLOCK_COMMENT = ('/*', '*/')
+_DASH_COMMENT = r'--[^\r\n\u2029]*'
+_PERCENT_COMMENT = r'(?<!\\)%[^\r\n\u2029]*'
+_XML_COMMENT = ('<!--', '-->')
+_DOUBLE_QUOTED = r'"(?:\\.|[^"\\\r\n\u2029])*"'
+_SINGLE_QUOTED = r"'(?:\\.|[^'\\\r\n\u2029])*'"
+_TRIPLE_DOUBLE_QUOTED = ('"""', '"""')
+_TRIPLE_SINGLE_QUOTED = ("'''", "'''")
+_BACK_QUOTED = ('`', '`')
+
+# Plain text and unknown languages skip only lines commented by '#'.
+_DEFAULT_TOKENIZER = Tokenizer(_LINE_HASH_COMMENT)
+_C_TOKENIZER = Tokenizer(_SLASH_COMMENT, _BLOCK_COMMENT, _DOUBLE_QUOTED, _SINGLE_QUOTED)
+_JS_TOKENIZER = Tokenizer(_SLASH_COMMENT, _BLOCK_COMMENT, _DOUBLE_QUOTED, _SINGLE_QUOTED, _BACK_QUOTED)
+_RUST_TOKENIZER = Tokenizer(_SLASH_COMMENT, _BLOCK_COMMENT, _DOUBLE_QUOTED)
+_CSS_TOKENIZER = Tokenizer(_BLOCK_COMMENT, _DOUBLE_QUOTED, _SINGLE_QUOTED)
+_PYTHON_TOKENIZER = Tokenizer(_HASH_COMMENT, _TRIPLE_DOUBLE_QUOTED, _TRIPLE_SINGLE_QUOTED, _DOUBLE_QUOTED, _SINGLE_QUOTED)
+_SHELL_TOKENIZER = Tokenizer(_HASH_COMMENT, _DOUBLE_QUOTED, _SINGLE_QUOTED)
+_HASH_TOKENIZER = Tokenizer(_HASH_COMMENT)
+_DASH_TOKENIZER = Tokenizer(_DASH_COMMENT, _DOUBLE_QUOTED, _SINGLE_QUOTED)
+_TEX_TOKENIZER = Tokenizer(_PERCENT_COMMENT)
+_XML_TOKENIZER = Tokenizer(_XML_COMMENT)
+
+# Tokenizers by GtkSourceLanguage id.
+_LANGUAGE_TOKENIZERS = {
+    'c': _C_TOKENIZER, 'chdr': _C_TOKENIZER, 'cpp': _C_TOKENIZER, 'cpphdr': _C_TOKENIZER,
+    'objc': _C_TOKENIZER, 'c-sharp': _C_TOKENIZER, 'java': _C_TOKENIZER, 'vala': _C_TOKENIZER,
+    'kotlin': _C_TOKENIZER, 'scala': _C_TOKENIZER, 'swift': _C_TOKENIZER, 'dart': _C_TOKENIZER,
+    'groovy': _C_TOKENIZER, 'php': _C_TOKENIZER,
+    'js': _JS_TOKENIZER, 'typescript': _JS_TOKENIZER, 'go': _JS_TOKENIZER,
+    'rust': _RUST_TOKENIZER,
+    'css': _CSS_TOKENIZER, 'scss': _CSS_TOKENIZER, 'less': _CSS_TOKENIZER,
+    'python': _PYTHON_TOKENIZER, 'python3': _PYTHON_TOKENIZER,
+    'sh': _SHELL_TOKENIZER, 'ruby': _SHELL_TOKENIZER, 'perl': _SHELL_TOKENIZER,
+    'makefile': _HASH_TOKENIZER, 'cmake': _HASH_TOKENIZER, 'yaml': _HASH_TOKENIZER,
+    'toml': _HASH_TOKENIZER, 'r': _HASH_TOKENIZER, 'dockerfile': _HASH_TOKENIZER,
+    'sql': _DASH_TOKENIZER, 'lua': _DASH_TOKENIZER, 'haskell': _DASH_TOKENIZER,
+    'latex': _TEX_TOKENIZER, 'bibtex': _TEX_TOKENIZER,
+    'xml': _XML_TOKENIZER, 'html': _XML_TOKENIZER, 'xslt': _XML_TOKENIZER, 'dtd': _XML_TOKENIZER,
+    'docbook': _XML_TOKENIZER, 'svg': _XML_TOKENIZER,
+}
+
+# GtkSourceLanguage ids of project files by their extensions.
+_EXTENSION_LANGUAGES = {
+    '.c': 'c', '.h': 'chdr', '.cc': 'cpp', '.cpp': 'cpp', '.cxx': 'cpp', '.hh': 'cpphdr', '.hpp': 'cpphdr',
+    '.m': 'objc', '.cs': 'c-sharp', '.java': 'java', '.vala': 'vala', '.kt': 'kotlin', '.scala': 'scala',
+    '.swift': 'swift', '.dart': 'dart', '.groovy': 'groovy', '.php': 'php',
+    '.js': 'js', '.mjs': 'js', '.jsx': 'js', '.ts': 'typescript', '.tsx': 'typescript', '.go': 'go',
+    '.rs': 'rust', '.css': 'css', '.scss': 'scss', '.less': 'less', '.py': 'python3', '.pyw': 'python3',
+    '.sh': 'sh', '.bash': 'sh', '.rb': 'ruby', '.pl': 'perl', '.pm': 'perl', '.mk': 'makefile',
+    '.cmake': 'cmake', '.yml': 'yaml', '.yaml': 'yaml', '.toml': 'toml', '.r': 'r', '.sql': 'sql',
+    '.lua': 'lua', '.hs': 'haskell', '.tex': 'latex', '.bib': 'bibtex', '.xml': 'xml', '.html': 'html',
+    '.htm': 'html', '.xsl': 'xslt', '.xslt': 'xslt', '.dtd': 'dtd', '.svg': 'svg', '.ui': 'xml',
+}
+
+
+def get_tokenizer(language):
+    """
+    Get tokenizer for GtkSourceLanguage id, None or unknown id gets the default one.
+    """
+    return _LANGUAGE_TOKENIZERS.get(language, _DEFAULT_TOKENIZER)
+
+def get_file_language(path):
+    """
+    Get GtkSourceLanguage id of the file by its name, None when it is not known.
+    """
+    name = os.path.basename(path)
+    if name in ('Makefile', 'makefile', 'GNUmakefile'):
+        return 'makefile'
+    if name == 'CMakeLists.txt':
+        return 'cmake'
+    if name == 'Dockerfile':
+        return 'dockerfile'
+    return _EXTENSION_LANGUAGES.get(os.path.splitext(name)[1].lower())
+
+
+#--
+# WORDS INDEX.
+#--
+# Generations of words sources, unique across all of them.
+_GENERATIONS = itertools.count(1)
+
+def next_generation():
+    return next(_GENERATIONS)
+
+
+class BigramTable(object):
+    """
+    Counts of pairs of words following each other in lines, by integer ids of the words.
+    Every word keeps its `_BIGRAM_SUCCESSORS` most frequent successors, rarest pairs are pruned
+    when there are more than `limit` pairs. Counts never exceed occurrences of the pairs,
+    so pairs of a forgotten word are gone before its id is used again.
+    """
+
+    def __init__(self, limit=_BIGRAM_LIMIT):
+        self.limit = limit
+        self._successors = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, pairs):
+        table = self._successors
+        for (first, second), count in collections.Counter(pairs).items():
+            if first is None or second is None:
+                continue
+            successors = table.get(first)
+            if successors is None:
+                successors = table[first] = {}
+            n = successors.get(second)
+            if n is not None:
+                successors[second] = n + count
+                continue
+            if len(successors) >= _BIGRAM_SUCCESSORS:
+                # ...the rarer half of successors makes room for new ones at once.
+                kept = heapq.nlargest(_BIGRAM_SUCCESSORS // 2, successors.items(), key=operator.itemgetter(1))
+                self._size -= len(successors) - len(kept)
+                successors = table[first] = dict(kept)
+            successors[second] = count
+            self._size += 1
+        if self._size > self.limit:
+            self.prune(self.limit * 3 // 4)
+
+    def remove(self, pairs):
+        table = self._successors
+        for (first, second), count in collections.Counter(pairs).items():
+            successors = table.get(first)
+            n = successors and successors.get(second)
+            if not n:
+                # ...pair was pruned already.
+                continue
+            if n > count:
+                successors[second] = n - count
+                continue
+            del successors[second]
+            self._size -= 1
+            if not successors:
+                del table[first]
+
+    def prune(self, target):
+        """
+        Drop pairs of the least counts until there are at most `target` pairs.
+        """
+        run_steps(self.iter_prune(target))
+
+    def iter_prune(self, target, step_words=None):
+        """
+        Drop pairs like `prune`, stepwise: yield after successors of every `step_words` words.
+        """
+        table = self._successors
+        threshold = 1
+        while self._size > target:
+            for part in get_slices(list(table.items()), step_words):
+                for first, successors in part:
+                    # ...successors replaced meanwhile are pruned by the next pass.
+                    if table.get(first) is not successors:
+                        continue
+                    for second in [second for second, n in successors.items() if n <= threshold]:
+                        del successors[second]
+                        self._size -= 1
+                    if not successors:
+                        del table[first]
+                yield
+            threshold *= 2
+
+    def get_next(self, first, limit):
+        """
+        Get ids of at most `limit` words following the word most often.
+        """
+        successors = self._successors.get(first)
+        if not successors:
+            return []
+        return heapq.nlargest(limit, successors, key=successors.get)
+
+
+class WordsVocabulary(object):
+    """
+    Words of all indexes interned once, with counts of their occurrences and ticks of their last use
+    in arrays by integer ids. Word not occurring anywhere is forgotten and its id is used again.
+    When words take more than `limit` bytes, rare and old words are evicted from all indexes.
+    Pairs of words following each other in lines of all indexes are counted by `bigrams`.
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.index_bytes = 0
+        self.fixed_bytes = 0
+        self._ids = {}
+        self._words = []
+        self._counts = array.array('I')
+        self._ticks = array.array('I')
+        self._free = []
+        self._tick = 0
+        self._bytes = 0
+        self._indexes = weakref.WeakSet()
+        self._eviction = None
+        self.bigrams = BigramTable()
+
+    def add_index(self, index):
+        self._indexes.add(index)
+
+    def intern_words(self, counts):
+        """
+        Add occurrences of words counted by `counts`, get dict of the words to interned ones.
+        """
+        ids = self._ids
+        words = self._words
+        occurrences = self._counts
+        ticks = self._ticks
+        self._tick += 1
+        tick = self._tick
+        interned = {}
+        for word, n in counts.items():
+            i = ids.get(word)
+            if i is None:
+                i = self._add_word(word)
+            occurrences[i] += n
+            ticks[i] = tick
+            interned[word] = words[i]
+        return interned
+
+    def release_words(self, counts):
+        """
+        Remove occurrences of interned words counted by `counts`, words not occurring anymore are forgotten.
+        """
+        ids = self._ids
+        occurrences = self._counts
+        for word, n in counts.items():
+            i = ids[word]
+            occurrences[i] -= n
+            if not occurrences[i]:
+                self._remove_word(i)
+
+    def update_pairs(self, old_lines, new_lines):
+        """
+        Count pairs of interned words following each other in new lines instead of old lines.
+        Words of old lines are not released yet, so they still have their ids.
+        """
+        self.bigrams.remove(self._get_pairs(old_lines))
+        self.bigrams.add(self._get_pairs(new_lines))
+
+    def _get_pairs(self, lines):
+        # ...lines are joined by empty word without id, pairs of it are skipped by the table.
+        words = itertools.chain.from_iterable(map(operator.add, filter(None, lines), itertools.repeat(("",))))
+        ids = list(map(self._ids.get, words))
+        return zip(ids, ids[1:])
+
+    def next_words(self, word, limit):
+        """
+        Get at most `limit` words following the word most often, most frequent first.
+        """
+        i = self._ids.get(word)
+        if i is None:
+            return []
+        words = self._words
+        return [words[j] for j in self.bigrams.get_next(i, limit)]
+
+    def _add_word(self, word):
+        if self._free:
+            i = self._free.pop()
+            self._words[i] = word
+        else:
+            i = len(self._words)
+            self._words.append(word)
+            self._counts.append(0)
+            self._ticks.append(0)
+        self._ids[word] = i
+        self._bytes += sys.getsizeof(word) + _VOCABULARY_WORD_BYTES
+        return i
+
+    def _remove_word(self, i):
+        word = self._words[i]
+        del self._ids[word]
+        self._words[i] = None
+        self._counts[i] = 0
+        self._free.append(i)
+        self._bytes -= sys.getsizeof(word) + _VOCABULARY_WORD_BYTES
+
+    def get_size(self):
+        """
+        Get estimated bytes taken by words of the vocabulary, of all indexes and by pairs of words.
+        """
+        return self._bytes + self.index_bytes + len(self.bigrams) * _BIGRAM_BYTES
+
+    def get_stats(self):
+        """
+        Get count of unique words and estimated bytes taken by them.
+        """
+        return len(self._ids), self.get_size()
+
+    def is_over_limit(self):
+        """
+        Tell words take more memory than the limit and evicting some of them gets it under the limit.
+        """
+        return 0 < self.limit < self.get_size() and not self.is_limit_unreachable()
+
+    def is_limit_unreachable(self):
+        """
+        Tell lines of all indexes alone take more than words may take after eviction, so no word is evicted.
+        """
+        return 0 < self.limit and self.fixed_bytes >= self.limit * 3 // 4
+
+    def index_next_lines(self, read_lines, max_lines):
+        """
+        Evict rare words like pending lines of indexes are tokenized by idle scheduler, every step
+        of eviction counts or strips about _EVICTION_STEP words or lines, so it is taken for as many
+        lines of `max_lines`, one step is done at least. Return False when words fit into the limit.
+        """
+        if self._eviction is None:
+            if not self.is_over_limit():
+                return False
+            self._eviction = self._iter_evict()
+        for i in range(max(1, max_lines // _EVICTION_STEP)):
+            if next(self._eviction, None) is None:
+                self._eviction = None
+                return False
+        return True
+
+    def evict(self):
+        """
+        Evict rarest words at once, until words take at most 3/4 of the limit.
+        """
+        while self.index_next_lines(None, _EVICTION_STEP):
+            pass
+
+    def _iter_evict(self):
+        """
+        Evict rarest words, of them the least recently used, until words take at most 3/4 of the limit.
+        Words freeing about the excess are chosen by counts of their occurrences and by their age,
+        every pass over words or lines is done by steps. Yield True after every step.
+        """
+        target = self.limit * 3 // 4
+        # ...pairs of words are cheaper to lose than words, they are left a quarter of the target at most.
+        for step in self.bigrams.iter_prune(target // 4 // _BIGRAM_BYTES, _EVICTION_STEP):
+            yield True
+        words = self._words
+        occurrences = self._counts
+        ticks = self._ticks
+        # ...every evicted word frees itself, its initials key, its entries and its occurrences in lines.
+        get_freed = lambda i: 2 * sys.getsizeof(words[i]) + _EVICTED_WORD_BYTES + 8 * occurrences[i]
+        while self.get_size() > target and not self.is_limit_unreachable():
+            freed = collections.Counter()
+            for part in get_slices(range(len(words)), _EVICTION_STEP):
+                for i in part:
+                    if words[i] is not None:
+                        freed[occurrences[i]] += get_freed(i)
+                yield True
+            count, excess = get_threshold(freed, self.get_size() - target)
+            # ...all words rarer than the count are evicted, words of the count by their age.
+            victims = set()
+            ties = []
+            ages = collections.Counter()
+            for part in get_slices(range(len(words)), _EVICTION_STEP):
+                for i in part:
+                    if words[i] is not None:
+                        if count is None or occurrences[i] < count:
+                            victims.add(words[i])
+                        elif occurrences[i] == count:
+                            ties.append(i)
+                            ages[ticks[i]] += get_freed(i)
+                yield True
+            tick, excess = get_threshold(ages, excess)
+            for part in get_slices(ties, _EVICTION_STEP):
+                for i in part:
+                    # ...words used meanwhile may be newer than all ages counted.
+                    if words[i] is not None and occurrences[i] == count and (tick is None or ticks[i] <= tick):
+                        if ticks[i] == tick:
+                            if excess <= 0:
+                                continue
+                            excess -= get_freed(i)
+                        victims.add(words[i])
+                yield True
+            if not victims:
+                return
+            for index in list(self._indexes):
+                line = 0
+                while line is not None:
+                    line = index.evict_words(victims, line, _EVICTION_STEP)
+                    yield True
+                while index.release_evicted(_EVICTION_STEP_WORDS):
+                    yield True
+
+
+class DocumentWordIndex(object):
+    """
+    Words of one document kept per line, so editing re-tokenizes only touched lines.
+    Lines not tokenized yet are pending and get indexed chunk by chunk later.
+    Lines are tokenized by `tokenizer` of the document's language, their words are interned by `vocabulary`.
+    Lexer states every line was tokenized in and ended in are kept, so a line resumes by state of previous line
+    and lines following a changed state, like after opening of a block comment, are tokenized again.
+    Ranges of lines set by `set_ranges` limit pending lines tokenized, like in large file mode.
+    """
+
+    def __init__(self, vocabulary=None):
+        self.tokenizer = _DEFAULT_TOKENIZER
+        self.vocabulary = VOCABULARY if vocabulary is None else vocabulary
+        self.vocabulary.add_index(self)
+        self.generation = next_generation()
+        self._lines = []
+        self._starts = array.array('b')
+        self._ends = array.array('b')
+        self._counts = {}
+        self._sorted = []
+        self._initials = []
+        self._initials_bytes = 0
+        self._pending = 0
+        self._next = 0
+        self._ranges = None
+        self._lines_bytes = 0
+        self._fixed_bytes = 0
+        self._evicted = {}
+        self._bytes = 0
+
+    def is_pending(self):
+        if self._ranges is None or not self._pending:
+            return self._pending > 0
+        return self._find_pending() is not None
+
+    def count_pending(self):
+        return self._pending
+
+    def replace_lines(self, first, count, texts):
+        """
+        Replace `count` indexed lines starting by line `first` with new line texts.
+        """
+        state = max(0, self._ends[first - 1]) if first else 0
+        lines, ends = self.tokenizer.lex_lines(texts, state)
+        self._splice(first, count, lines, array.array('b', [state]) + ends[:-1], ends)
+        self._follow_state(first + len(lines))
+
+    def _follow_state(self, line):
+        """
+        Mark lines from the line on pending when they were tokenized in other lexer state than
+        the state previous line ends in, window by window until the state stops changing.
+        """
+        lines = self._lines
+        if not 0 < line < len(lines) or lines[line] is None or self._ends[line - 1] < 0:
+            return
+        if self._starts[line] == self._ends[line - 1]:
+            return
+        end = line + 1
+        last = min(len(lines), line + _STATE_LINES)
+        while end < last and lines[end] is not None:
+            end += 1
+        self.mark_lines(line, end - line, end - line)
+
+    def mark_lines(self, first, count, new_count):
+        """
+        Replace `count` indexed lines starting by line `first` with `new_count` pending lines.
+        """
+        self._splice(first, count, [None] * new_count)
+        self._pending += new_count
+        self._next = min(self._next, first)
+
+    def clear(self):
+        """
+        Remove all lines, so their words are released from vocabulary.
+        """
+        self._splice(0, len(self._lines), [])
+
+    def set_ranges(self, ranges):
+        """
+        Limit tokenized pending lines to sorted ranges (first, last) of lines, None for all lines.
+        """
+        self._ranges = ranges
+        self._next = 0
+
+    def _find_pending(self):
+        """
+        Get first pending line within ranges starting by next line, None without such.
+        """
+        lines = self._lines
+        for first, last in self._ranges:
+            if last >= self._next:
+                try:
+                    return lines.index(None, max(first, self._next), last + 1)
+                except ValueError:
+                    pass
+        return None
+
+    def index_next_lines(self, read_lines, max_lines):
+        """
+        Tokenize next run of at most `max_lines` pending lines, texts are got by `read_lines(first, last)`.
+        Return False when no lines are pending anymore.
+        """
+        if not self._pending:
+            return False
+        lines = self._lines
+        if self._ranges is None:
+            first = lines.index(None, self._next)
+            end = min(len(lines), first + max_lines)
+        else:
+            first = self._find_pending()
+            if first is None:
+                return False
+            end = min(len(lines), first + max_lines, next(last for f, last in self._ranges if last >= first) + 1)
+        last = first
+        while last + 1 < end and lines[last + 1] is None:
+            last += 1
+        self._next = first
+        self.replace_lines(first, last - first + 1, read_lines(first, last))
+        return self.is_pending()
+
+    def load_lines(self, first, lines, counts, starts=None, ends=None):
+        """
+        Fill pending lines starting by line `first` with words tokenized elsewhere, `counts` count words of all lines,
+        `starts` and `ends` are arrays of lexer states the lines were tokenized in and ended in, if known.
+        Lines tokenized meanwhile are kept.
+        """
+        end = first + len(lines)
+        if starts is None:
+            starts = ends = array.array('b', [-1]) * len(lines)
+        if self._lines[first:end].count(None) != len(lines):
+            for i, tokens in enumerate(lines, first):
+                if self._lines[i] is None:
+                    self._splice(i, 1, [tokens], starts[i - first:i - first + 1], ends[i - first:i - first + 1])
+        else:
+            self._load_lines(first, lines, counts)
+            self._starts[first:end] = starts
+            self._ends[first:end] = ends
+        # ...lines tokenized elsewhere might start in other state than the lines before them end in.
+        self._follow_state(first)
+        self._follow_state(end)
+
+    def _load_lines(self, first, lines, counts):
+        end = first + len(lines)
+        interned = self.vocabulary.intern_words(counts)
+        lines = [tuple(map(interned.__getitem__, tokens)) for tokens in lines]
+        self.vocabulary.update_pairs((), lines)
+        self._lines[first:end] = lines
+        self._pending -= len(lines)
+        self._lines_bytes += 8 * count_tokens(lines)
+        self.generation = next_generation()
+        own_counts = self._counts
+        added = []
+        for word, n in counts.items():
+            word = interned[word]
+            m = own_counts.get(word, 0)
+            if m == 0: added.append(word)
+            own_counts[word] = m + n
+        self._update_sorted(added, [])
+        self._update_size()
+
+    def _splice(self, first, count, lines, starts=None, ends=None):
+        counts = self._counts
+        old_lines = self._lines[first:first + count]
+        released = {}
+        for tokens in old_lines:
+            if tokens is None:
+                self._pending -= 1
+                continue
+            for word in tokens:
+                released[word] = released.get(word, 0) + 1
+        new_counts = {}
+        for tokens in lines:
+            if tokens is None:
+                continue
+            for word in tokens:
+                new_counts[word] = new_counts.get(word, 0) + 1
+        interned = self.vocabulary.intern_words(new_counts)
+        lines = [tokens if tokens is None else tuple(map(interned.__getitem__, tokens)) for tokens in lines]
+        removed = []
+        for word, n in released.items():
+            m = counts[word] - n
+            if m: counts[word] = m
+            else:
+                del counts[word]
+                removed.append(word)
+        added = []
+        for word, n in new_counts.items():
+            word = interned[word]
+            m = counts.get(word, 0)
+            if m == 0: added.append(word)
+            counts[word] = m + n
+        self.vocabulary.update_pairs(old_lines, lines)
+        self.vocabulary.release_words(released)
+        self._lines[first:first + count] = lines
+        if starts is None:
+            # ...lexer states of pending lines are not known.
+            starts = ends = array.array('b', [-1]) * len(lines)
+        self._starts[first:first + count] = starts
+        self._ends[first:first + count] = ends
+        self._lines_bytes += 8 * (count_tokens(lines) - count_tokens(old_lines))
+        self.generation = next_generation()
+        if first < self._next:
+            self._next = first
+        #--
+        # Words removed and added back again stay in sorted list.
+        #--
+        if removed and added:
+            kept = set(removed).intersection(added)
+            removed = [w for w in removed if w not in kept]
+            added = [w for w in added if w not in kept]
+        self._update_sorted(added, removed)
+        self._update_size()
+
+    def _update_sorted(self, added, removed):
+        """
+        Keep sorted list of unique words and of their initials keys for prefix and abbreviation queries,
+        both are updated by changed words only, so no query builds them.
+        """
+        self._sorted = update_sorted(self._sorted, added, removed)
+        added_keys = get_initials_keys(added)
+        removed_keys = get_initials_keys(removed)
+        self._initials = update_sorted(self._initials, added_keys, removed_keys)
+        self._initials_bytes += sum(map(sys.getsizeof, added_keys)) - sum(map(sys.getsizeof, removed_keys))
+
+    def _update_size(self):
+        """
+        Account estimated bytes of lines and unique words to vocabulary, bytes of lines besides their words
+        are accounted as fixed too.
+        """
+        fixed = len(self._lines) * _LINE_BYTES
+        size = fixed + self._lines_bytes + self._initials_bytes + (len(self._sorted) + len(self._initials)) * 8
+        size += len(self._counts) * _INDEX_WORD_BYTES
+        self.vocabulary.index_bytes += size - self._bytes
+        self.vocabulary.fixed_bytes += fixed - self._fixed_bytes
+        self._bytes = size
+        self._fixed_bytes = fixed
+
+    def evict_words(self, words, first=0, max_lines=None):
+        """
+        Remove occurrences of the set of words from at most `max_lines` lines starting by line `first`,
+        get the line to continue by, None after the last line. Removed occurrences are still counted
+        until they are released by `release_evicted`.
+        """
+        lines = self._lines
+        end = len(lines) if max_lines is None else min(len(lines), first + max_lines)
+        evicted = self._evicted
+        old_lines = []
+        new_lines = []
+        for i in range(first, end):
+            tokens = lines[i]
+            if tokens and not words.isdisjoint(tokens):
+                for word in tokens:
+                    if word in words:
+                        evicted[word] = evicted.get(word, 0) + 1
+                lines[i] = tuple([word for word in tokens if word not in words])
+                old_lines.append(tokens)
+                new_lines.append(lines[i])
+        if old_lines:
+            self._lines_bytes += 8 * (count_tokens(new_lines) - count_tokens(old_lines))
+            self.vocabulary.update_pairs(old_lines, new_lines)
+            self._update_size()
+        return end if end < len(lines) else None
+
+    def release_evicted(self, max_words=None):
+        """
+        Release at most `max_words` words of occurrences removed by `evict_words`, vocabulary forgets words
+        not occurring anymore. Tell whether more words are left to release.
+        """
+        evicted = self._evicted
+        if max_words is None or max_words >= len(evicted):
+            released = evicted
+            self._evicted = {}
+        else:
+            released = dict([evicted.popitem() for i in range(max_words)])
+        if released:
+            counts = self._counts
+            removed = []
+            for word, n in released.items():
+                m = counts[word] - n
+                if m: counts[word] = m
+                else:
+                    del counts[word]
+                    removed.append(word)
+            self.vocabulary.release_words(released)
+            self._update_sorted([], removed)
+            self.generation = next_generation()
+            self._update_size()
+        return bool(self._evicted)
+
+    def prefix_words(self, prefix):
+        """
+        Get unique words of the document starting with prefix.
+        """
+        return get_prefix_range(self._sorted, prefix)
+
+    def abbreviation_words(self, abbreviation):
+        """
+        Get unique words of the document whose initials start with lowercase abbreviation.
+        """
+        return get_abbreviation_range(self._initials, abbreviation)
+
+    def count(self, word):
+        """
+        Get count of word occurrences in the document.
+        """
+        return self._counts.get(word, 0)
+
+    def nearby_words(self, prefix, line, radius, words=None):
+        """
+        Get words starting with prefix found at most `radius` lines from the line, with their distance.
+        Given set of `words` is matched instead of prefix.
+        """
+        match = str.startswith if words is None else lambda word, prefix: word in words
+        distances = {}
+        first = max(0, line - radius)
+        for i, tokens in enumerate(self._lines[first:line + radius + 1], first):
+            if tokens is None:
+                continue
+            distance = abs(i - line)
+            for word in tokens:
+                if match(word, prefix) and distance < distances.get(word, radius + 1):
+                    distances[word] = distance
+        return distances
+
+    def index_range(self, first, last, read_lines):
+        """
+        Tokenize pending lines from line `first` to line `last`, texts are got by `read_lines(first, last)`.
+        """
+        lines = self._lines
+        last = min(last, len(lines) - 1)
+        while self._pending and first <= last:
+            try:
+                first = lines.index(None, first, last + 1)
+            except ValueError:
+                return
+            end = first
+            while end < last and lines[end + 1] is None:
+                end += 1
+            self.replace_lines(first, end - first + 1, read_lines(first, end))
+            first = end + 1
+
+    def nearest_words(self, prefix, line, limit, read_lines=None, words=None):
+        """
+        Get at most `limit` words starting with prefix (but prefix itself), nearest to the line first.
+        Lines at most _NEAREST_LINES lines from the line are scanned in windows growing from the line
+        until enough words are found, their pending lines are tokenized first by `read_lines(first, last)`.
+        Other words of the document follow by occurrences. Given set of `words` is matched instead of prefix.
+        """
+        found = []
+        inner = 0
+        radius = _NEAREST_WINDOW
+        farthest = min(_NEAREST_LINES, max(line, len(self._lines) - 1 - line))
+        while inner <= farthest:
+            if read_lines is not None and self._pending:
+                self.index_range(max(0, line - radius), line + radius, read_lines)
+            remaining = set(self.prefix_words(prefix)) if words is None else set(words)
+            remaining.discard(prefix)
+            remaining.difference_update(found)
+            if remaining:
+                # ...lines of the window not scanned yet by their distance, line above first.
+                lines = self._lines
+                start = max(inner, 1)
+                above = lines[max(0, line - radius):max(0, line - start + 1)][::-1]
+                below = lines[line + start:line + radius + 1]
+                ordered = [None] * (2 * (radius - start + 1))
+                ordered[0:2 * len(above):2] = above
+                ordered[1:2 * len(below):2] = below
+                if inner == 0 and line < len(lines):
+                    ordered.insert(0, lines[line])
+                tokens = itertools.chain.from_iterable(filter(None, ordered))
+                found.extend(dict.fromkeys(filter(remaining.__contains__, tokens)))
+                remaining.difference_update(found)
+            if len(found) >= limit:
+                return found[:limit]
+            # ...words of pending lines are not known until they are tokenized.
+            if not remaining and (read_lines is None or not self._pending):
+                return found
+            inner = radius + 1
+            radius = min(radius * _NEAREST_GROWTH, _NEAREST_LINES)
+        found.extend(heapq.nsmallest(limit - len(found), remaining, key=lambda w: (-self.count(w), len(w), w)))
+        return found
+
+# Vocabulary shared by indexes of all documents.
+VOCABULARY = WordsVocabulary()
+
+
+class CandidateCache(object):
+    """
+    Scores of words of other sources by recent prefixes, valid while generations of all sources
+    stay the same. Prefix extending a cached one filters its scores instead of querying sources.
+    Least recently used prefixes are evicted when more than `max_words` words are cached,
+    all of them once generations of sources change, like when a source is closed.
+    """
+
+    def __init__(self, max_words=_CANDIDATE_CACHE_WORDS):
+        self._entries = collections.OrderedDict()
+        self._words = 0
+        self._max_words = max_words
+        self._generations = None
+
+    def get_other_scores(self, prefix, other_indexes, abbreviation=False):
+        """
+        Get scores of words of other sources like `score_other_words` does.
+        """
+        return run_steps(self.iter_other_scores(prefix, other_indexes, abbreviation))
+
+    def iter_other_scores(self, prefix, other_indexes, abbreviation=False, step_words=None):
+        """
+        Get scores of words of other sources stepwise like `iter_score_other_words` does.
+        Scores are cached only when no source changed meanwhile.
+        """
+        generations = tuple([other.generation for other in other_indexes])
+        if generations != self._generations:
+            # ...generations never come back, so entries of other ones are stale for good.
+            self.clear()
+            self._generations = generations
+        key = (prefix, abbreviation)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == generations:
+            self._entries.move_to_end(key)
+            return entry[1]
+        scores = None
+        # ...the longest cached shorter prefix has all the words.
+        for length in range(len(prefix) - 1, -1, -1):
+            parent = self._entries.get((prefix[:length], abbreviation))
+            if parent is not None and parent[0] == generations:
+                scores = {}
+                for part in get_slices(parent[1].items(), step_words):
+                    if abbreviation:
+                        scores.update([(w, s) for w, s in part if get_initials(w).startswith(prefix)])
+                    else:
+                        scores.update([(w, s) for w, s in part if w.startswith(prefix)])
+                    yield
+                break
+        if scores is None:
+            scores = yield from iter_score_other_words(prefix, other_indexes, abbreviation, step_words)
+        if tuple([other.generation for other in other_indexes]) == generations:
+            self._put(key, generations, scores)
+        return scores
+
+    def clear(self):
+        self._entries.clear()
+        self._words = 0
+
+    def _put(self, key, generations, scores):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._words -= len(old[1])
+        if len(scores) > self._max_words:
+            return
+        self._entries[key] = (generations, scores)
+        self._words += len(scores)
+        while self._words > self._max_words:
+            key, (generations, scores) = self._entries.popitem(last=False)
+            self._words -= len(scores)
+
+
+#--
+# DICTIONARY PACKS.
+#--
+class PackSection(object):
+    """
+    Sorted UTF-8 texts of a dictionary pack, a sequence of bytes bisected in place in the mapped file.
+    Every text ends by newline.
+    """
+
+    def __init__(self, data, offset, count, size):
+        self._data = data
+        self._offsets = memoryview(data)[offset:offset + 4 * (count + 1)].cast('I')
+        self._start = offset + 4 * (count + 1)
+        self.end = self._start + size
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._data[self._start + self._offsets[i]:self._start + self._offsets[i + 1] - 1]
+
+    def get_prefix_range(self, prefix):
+        """
+        Get first and end index of texts starting with prefix.
+        """
+        key = prefix.encode('utf-8')
+        first = bisect.bisect_left(self, key)
+        return first, bisect.bisect_left(self, key + b'\xff', first)
+
+    def get_texts(self, first, end):
+        """
+        Get decoded texts from index first to end.
+        """
+        if first == end:
+            return []
+        return self._data[self._start + self._offsets[first]:self._start + self._offsets[end] - 1].decode('utf-8').split('\n')
+
+
+class DictionaryPack(object):
+    """
+    Static words of a language in a dictionary pack file written by `write_dictionary_pack`.
+    The file is mapped on the first query and words are bisected in the mapped file,
+    only words of query results are decoded. Broken file has no words.
+    Counts of words of the last prefix query are kept, as their counts are asked next.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.generation = next_generation()
+        self._words = None
+        self._counts = None
+        self._keys = None
+        self._recent_counts = {}
+
+    def _load(self):
+        self._words = self._keys = ()
+        try:
+            with open(self.path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:len(_PACK_MAGIC)] != _PACK_MAGIC:
+                return
+            word_count, words_size, key_count, keys_size = _PACK_HEADER.unpack_from(data, len(_PACK_MAGIC))
+            offset = len(_PACK_MAGIC) + _PACK_HEADER.size
+            words = PackSection(data, offset, word_count, words_size)
+            keys = PackSection(data, words.end, key_count, keys_size)
+            if keys.end + 4 * word_count != len(data):
+                return
+            self._counts = memoryview(data)[keys.end:keys.end + 4 * word_count].cast('I')
+            self._words, self._keys = words, keys
+        except (OSError, ValueError, TypeError, struct.error):
+            pass
+
+    def prefix_words(self, prefix):
+        """
+        Get words of the pack starting with prefix.
+        """
+        if self._words is None:
+            self._load()
+        if not self._words:
+            return []
+        first, end = self._words.get_prefix_range(prefix)
+        words = self._words.get_texts(first, end)
+        self._recent_counts = dict(zip(words, self._counts[first:end]))
+        return words
+
+    def abbreviation_words(self, abbreviation):
+        """
+        Get words of the pack whose initials start with lowercase abbreviation.
+        """
+        if self._keys is None:
+            self._load()
+        if not self._keys:
+            return []
+        return [key.split(" ", 1)[1] for key in self._keys.get_texts(*self._keys.get_prefix_range(abbreviation))]
+
+    def count(self, word):
+        """
+        Get count of the word in the pack.
+        """
+        count = self._recent_counts.get(word)
+        if count is not None:
+            return count
+        if self._words is None:
+            self._load()
+        key = word.encode('utf-8')
+        i = bisect.bisect_left(self._words, key)
+        return self._counts[i] if i < len(self._words) and self._words[i] == key else 0
+
+
+class DictionaryPacks(object):
+    """
+    Dictionary packs by language. Word lists `<name>.txt` of `source_dir` are written into packs
+    `<name>.pack` of `cache_dir`, when the pack is missing or older than its list, on the first
+    query of a language of the list.
+    """
+
+    def __init__(self, source_dir, cache_dir):
+        self._source_dir = source_dir
+        self._cache_dir = cache_dir
+        self._packs = {}
+
+    def get_pack(self, language):
+        """
+        Get dictionary pack for GtkSourceLanguage id, None without a word list for the language.
+        """
+        name = _LANGUAGE_PACKS.get(language)
+        if name is None:
+            return None
+        if name not in self._packs:
+            self._packs[name] = self._open_pack(name)
+        return self._packs[name]
+
+    def _open_pack(self, name):
+        source = os.path.join(self._source_dir, name + '.txt')
+        path = os.path.join(self._cache_dir, name + '.pack')
+        try:
+            if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+                write_dictionary_pack(path, read_word_list(source))
+        except (OSError, ValueError):
+            return None
+        return DictionaryPack(path)
+
+
+#--
+# BRACKETS AND QUOTES.
+#--
+class BracketBalance(object):
+    """
+    Counts of all brackets and quotes on both sides of cursor, counted once when first needed.
+    Very long lines are counted only within a window around cursor.
+    """
+
+    def __init__(self, preceding_line, line_after):
+        self._preceding_line = preceding_line[-_BALANCE_WINDOW:]
+        self._line_after = line_after[:_BALANCE_WINDOW]
+        self._preceding = None
+        self._following = None
+
+    def preceding(self, char):
+        if self._preceding is None:
+            self._preceding = count_chars(self._preceding_line, _BALANCE_CHARS)
+        return self._preceding[char]
+
+    def following(self, char):
+        if self._following is None:
+            self._following = count_chars(self._line_after, _BALANCE_CHARS)
+        return self._following[char]
+
+
+#--
+# XML TAGS.
+#--
+class XmlTagStackCache(object):
+    """
+    Stacks of opened XML tags checkpointed at start of every block of lines,
+    editing a line invalidates only checkpoints after it.
+    """
+
+    def __init__(self):
+        self._checkpoints = [None]
+
+    def invalidate(self, line):
+        """
+        Drop checkpoints depending on the edited line.
+        """
+        del self._checkpoints[line // _XML_BLOCK_LINES + 1:]
+
+    def get_closing_tag(self, line, preceding_line, read_lines, max_lines=None):
+        """
+        Get tag to close at the line, scanning from the closest checkpoint.
+        Texts of lines are got by `read_lines(first, last)`.
+        With `max_lines` only so many lines before the line are scanned, without checkpoints.
+        """
+        if max_lines is not None:
+            stack = None
+            if line > 0:
+                for text in read_lines(max(0, line - max_lines), line - 1):
+                    stack = update_xml_tag_stack(stack, text)
+            stack = update_xml_tag_stack(stack, preceding_line)
+            return stack[0] if stack else None
+        block = line // _XML_BLOCK_LINES
+        while len(self._checkpoints) <= block:
+            first = (len(self._checkpoints) - 1) * _XML_BLOCK_LINES
+            stack = self._checkpoints[-1]
+            for text in read_lines(first, first + _XML_BLOCK_LINES - 1):
+                stack = update_xml_tag_stack(stack, text)
+            self._checkpoints.append(stack)
+        stack = self._checkpoints[block]
+        first = block * _XML_BLOCK_LINES
+        if line > first:
+            for text in read_lines(first, line - 1):
+                stack = update_xml_tag_stack(stack, text)
+        stack = update_xml_tag_stack(stack, preceding_line)
+        return stack[0] if stack else None
+
+
+#--
+# LATENCY TRACING.
+#--
+class LatencyTracer(object):
+    """
+    Wall time of handler phases in bounded histograms, buckets are powers of two microseconds.
+    Disabled tracer only checks `start` is None, so instrumented code costs next to nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._histograms = {}
+
+    def start(self):
+        """
+        Get start time of a phase or None when tracing is disabled.
+        """
+        if self.enabled:
+            return time.perf_counter()
+        return None
+
+    def stop(self, phase, start):
+        """
+        Record wall time of phase begun at `start`.
+        """
+        if start is not None:
+            self.record(phase, time.perf_counter() - start)
+
+    def record(self, phase, seconds):
+        """
+        Record wall time of phase in seconds, also when tracing is disabled.
+        """
+        microseconds = int(seconds * 1e6)
+        histogram = self._histograms.get(phase)
+        if histogram is None:
+            # ...count, total and maximum microseconds followed by buckets.
+            histogram = [0, 0, 0] + [0] * _HISTOGRAM_BUCKETS
+            self._histograms[phase] = histogram
+        histogram[0] += 1
+        histogram[1] += microseconds
+        if microseconds > histogram[2]:
+            histogram[2] = microseconds
+        histogram[3 + min(microseconds.bit_length(), _HISTOGRAM_BUCKETS - 1)] += 1
+
+    def reset(self):
+        self._histograms = {}
+
+    def get_report(self):
+        """
+        Get table of phases with count, mean, percentiles and maximum in microseconds.
+        Percentiles are upper bounds of their buckets.
+        """
+        lines = ["%-12s %8s %10s %10s %10s %10s %10s" % ("phase", "count", "mean us", "p50 us", "p90 us", "p99 us", "max us")]
+        for phase, histogram in sorted(self._histograms.items()):
+            count, total, maximum = histogram[:3]
+            percentiles = []
+            for p in (50, 90, 99):
+                seen = 0
+                for bucket, n in enumerate(histogram[3:]):
+                    seen += n
+                    if seen * 100 >= count * p:
+                        break
+                percentiles.append(min((1 << bucket) - 1, maximum))
+            lines.append("%-12s %8d %10.1f %10d %10d %10d %10d" % ((phase, count, total / count) + tuple(percentiles) + (maximum,)))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """
+        Write report to the file.
+        """
+        with open(path, "w") as f:
+            f.write(self.get_report())
+
+
+# Tracer shared by buffers, engines and the plugin.
+TRACER = LatencyTracer()
+
+
+#--
+# COMPLETION METRICS.
+#--
+class CompletionMetrics(object):
+    """
+    Effectiveness of words completion aggregated in bounded memory: counts of cycles, accepted
+    and undone words, keystrokes saved by accepted words and histograms of CTRL+SPACE presses
+    and ranks of accepted words and of counts of candidate words, buckets of the last one
+    are powers of two.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.cycles = 0
+        self.accepted = 0
+        self.undone = 0
+        self.keystrokes_saved = 0
+        self._presses = [0] * (_METRICS_BUCKETS + 1)
+        self._ranks = [0] * (_METRICS_BUCKETS + 1)
+        self._candidates = [0] * _HISTOGRAM_BUCKETS
+        self._last = None
+
+    def record_cycle(self, candidates, presses, rank, saved):
+        """
+        Record finished cycle with count of candidate words and of CTRL+SPACE presses, rank of accepted
+        word counted from one and keystrokes it saved, rank is None when no word was accepted.
+        """
+        self.cycles += 1
+        self._candidates[min(candidates.bit_length(), _HISTOGRAM_BUCKETS - 1)] += 1
+        self._last = None
+        if rank is None:
+            return
+        self.accepted += 1
+        self.keystrokes_saved += saved
+        self._last = (min(presses, _METRICS_BUCKETS), min(rank, _METRICS_BUCKETS), saved)
+        self._presses[self._last[0]] += 1
+        self._ranks[self._last[1]] += 1
+
+    def record_undo(self):
+        """
+        Record the word accepted last was deleted or replaced back by BACKSPACE, so it's not counted
+        by histograms of accepted words and keystrokes saved anymore.
+        """
+        if self._last is not None:
+            presses, rank, saved = self._last
+            self.undone += 1
+            self.keystrokes_saved -= saved
+            self._presses[presses] -= 1
+            self._ranks[rank] -= 1
+            self._last = None
+
+    def get_stats(self):
+        """
+        Get metrics as a dictionary, histograms by labels of their buckets. Undone words are not accepted
+        but rejected.
+        """
+        def get_labels(histogram):
+            labels = [str(i) for i in range(_METRICS_BUCKETS)] + ["%d+" % _METRICS_BUCKETS]
+            return dict([(labels[i], n) for i, n in enumerate(histogram) if n])
+
+        kept = self.accepted - self.undone
+        return {
+            "cycles": self.cycles,
+            "accepted": kept,
+            "undone": self.undone,
+            "rejected": self.cycles - kept,
+            "rejection_rate": (self.cycles - kept) / self.cycles if self.cycles else 0.0,
+            "keystrokes_saved": self.keystrokes_saved,
+            "keystrokes_saved_per_word": self.keystrokes_saved / kept if kept else 0.0,
+            "presses_to_accept": get_labels(self._presses),
+            "accepted_rank": get_labels(self._ranks),
+            "candidates": dict([("%d-%d" % ((1 << b) >> 1, (1 << b) - 1), n) for b, n in enumerate(self._candidates) if n]),
+        }
+
+    def get_report(self):
+        return json.dumps(self.get_stats(), indent=2)
+
+    def dump(self, path):
+        """
+        Write metrics to the file as JSON.
+        """
+        with open(path, "w") as f:
+            f.write(self.get_report() + "\n")
+
+
+# Metrics shared by engines of all windows.
+METRICS = CompletionMetrics()
+
+
+#--
+# TEXT BUFFERS.
+#--
+class TextBuffer(object):
+    """
+    Text buffer the completion works on, positions are (line, line offset) tuples.
+    Subclasses call `edit_started` and `edit_finished` around every change of text,
+    so that words index and XML checkpoints of the buffer follow the text.
+    Language is GtkSourceLanguage id of the text choosing its tokenizer.
+    Text over size or line length thresholds of `options` is in large file mode: only lines around
+    cursor and samples of lines are tokenized, long lines only by their part around cursor.
+    """
+
+    def __init__(self, language=None, options=None):
+        self.language = language
+        self.options = CompletionOptions() if options is None else options
+        self.large = False
+        self.index = DocumentWordIndex()
+        self.index.tokenizer = get_tokenizer(language)
+        self.xml_stack = XmlTagStackCache()
+        self.edit_count = 0
+        self._edits = []
+
+    def release(self):
+        """
+        Forget words index and XML checkpoints of the buffer, its words are released from vocabulary.
+        """
+        self.index.clear()
+        self.xml_stack = XmlTagStackCache()
+        self._edits = []
+
+    def start_indexing(self):
+        """
+        Mark all lines for tokenization.
+        """
+        self.index.mark_lines(0, 0, self.get_line_count())
+        self.check_large()
+        self.schedule_indexing()
+
+    def check_large(self, line_length=None):
+        """
+        Switch large file mode on when text is over size threshold, or when `line_length` is given,
+        when it is over line length threshold.
+        """
+        options = self.options
+        if self.large or not options.largeFileMode:
+            return
+        if line_length is None:
+            large = self.get_char_count() > options.largeFileSize << 20
+        else:
+            large = line_length > options.largeFileLineLength
+        if large:
+            self.set_large(True)
+
+    def set_large(self, large):
+        """
+        Switch large file mode, lines around cursor get tokenized first.
+        """
+        self.large = large
+        if large:
+            self.focus_line(self.get_cursor()[0])
+        else:
+            self.index.set_ranges(None)
+            self.schedule_indexing()
+
+    def focus_line(self, line):
+        """
+        Move window of tokenized lines of large file around the line.
+        """
+        self.index.set_ranges(get_sampled_ranges(line, self.get_line_count()))
+        if self.index.is_pending():
+            self.schedule_indexing(urgent=True)
+
+    def schedule_indexing(self, urgent=False):
+        """
+        Tokenize pending lines of words index later, urgent buffer is served first.
+        """
+        pass
+
+    def schedule_eviction(self):
+        """
+        Evict rare words of vocabulary later, when words take more memory than the limit.
+        """
+        pass
+
+    def set_language(self, language):
+        """
+        Tokenize all lines again by tokenizer of another language.
+        """
+        self.language = language
+        self.index.tokenizer = get_tokenizer(language)
+        # ...text tokenized elsewhere meanwhile is not valid anymore.
+        self.edit_count += 1
+        line_count = self.get_line_count()
+        self.index.mark_lines(0, line_count, line_count)
+        self.schedule_indexing()
+
+    def edit_started(self, line):
+        """
+        Remember first touched line before text is inserted or deleted.
+        """
+        self.edit_count += 1
+        self._edits.append((line, self.get_line_count()))
+        self.xml_stack.invalidate(line)
+
+    def edit_finished(self, line):
+        """
+        Re-tokenize only lines touched by inserted or deleted text, line is the last touched line.
+        """
+        first, line_count = self._edits.pop()
+        removed = (line - first + 1) - (self.get_line_count() - line_count)
+        # ...large insertions like loading or pasting are left for later.
+        if line - first + 1 > _SYNC_LINES_LIMIT:
+            self.index.mark_lines(first, removed, line - first + 1)
+            self.check_large()
+            self.schedule_indexing()
+        else:
+            start = TRACER.start()
+            self.index.replace_lines(first, removed, self.get_indexed_lines(first, line))
+            TRACER.stop("tokenize", start)
+            # ...lines following changed lexer state are left for later too.
+            if self.index.is_pending():
+                self.schedule_indexing()
+        if self.index.vocabulary.is_over_limit():
+            self.schedule_eviction()
+
+    def get_indexed_lines(self, first, last):
+        """
+        Get texts of lines for tokenization, in large file mode long lines only by their part around cursor.
+        A line over length threshold switches large file mode on.
+        """
+        texts = self.get_lines_text(first, last)
+        if not self.large:
+            self.check_large(max(map(len, texts), default=0))
+            if not self.large:
+                return texts
+        cursor_line, offset = self.get_cursor()
+        return [get_text_window(text, offset if line == cursor_line else 0, _LARGE_TOKENIZED_CHARS)
+                for line, text in enumerate(texts, first)]
+
+    def get_line_around(self, position, size):
+        """
+        Get texts of the line before and after position, at most `size` characters of each.
+        """
+        line, offset = position
+        end = (line, min(self.get_line_length(line), offset + size))
+        return self.get_text((line, max(0, offset - size)), position), self.get_text(position, end)
+
+    def get_line_text(self, line):
+        return self.get_text((line, 0), (line, self.get_line_length(line)))
+
+    def get_lines_text(self, first, last):
+        return [self.get_line_text(line) for line in range(first, last + 1)]
+
+    def get_line_count(self):
+        raise NotImplementedError
+
+    def get_char_count(self):
+        raise NotImplementedError
+
+    def get_line_length(self, line):
+        """
+        Get count of characters of the line without line separator.
+        """
+        raise NotImplementedError
+
+    def get_cursor(self):
+        raise NotImplementedError
+
+    def place_cursor(self, position):
+        raise NotImplementedError
+
+    def get_selection_bounds(self):
+        """
+        Get start and end position of selected text, empty tuple without selection.
+        """
+        raise NotImplementedError
+
+    def get_text(self, start, end):
+        raise NotImplementedError
+
+    def insert(self, position, text):
+        raise NotImplementedError
+
+    def insert_at_cursor(self, text):
+        raise NotImplementedError
+
+    def delete(self, start, end, interactive=False):
+        raise NotImplementedError
+
+    def replace(self, start, end, text, cursor=None):
+        """
+        Replace text between positions with text by one delete and one insert in one user action,
+        so listeners of the buffer get one round of signals and undo gets one step.
+        Cursor is placed to `cursor` or behind inserted text.
+        """
+        self.begin_user_action()
+        try:
+            if start != end:
+                self.delete(start, end)
+            if text:
+                self.insert(start, text)
+            self.place_cursor(get_end_position(start, text) if cursor is None else cursor)
+        finally:
+            self.end_user_action()
+
+    def begin_user_action(self):
+        pass
+
+    def end_user_action(self):
+        pass
+
+    def get_tab_string(self):
+        raise NotImplementedError
+
+
+class MemoryBuffer(TextBuffer):
+    """
+    Text buffer kept in memory, it behaves like GtkTextBuffer: cursor and selection bound
+    move with text inserted at them. Pending lines are tokenized by `index_pending`.
+    Finished user actions, that is undo steps, are counted by `user_actions`.
+    """
+
+    def __init__(self, text="", tab_string="    ", language=None, options=None):
+        TextBuffer.__init__(self, language, options)
+        self._lines = split_lines(text)
+        self._cursor = (0, 0)
+        self._selection_bound = (0, 0)
+        self._tab_string = tab_string
+        self._user_action = 0
+        self.user_actions = 0
+        self.start_indexing()
+
+    def index_pending(self):
+        """
+        Tokenize all pending lines and evict rare words over the limit, like finished indexing in idle time.
+        """
+        while self.index.index_next_lines(self.get_indexed_lines, self.get_line_count()):
+            pass
+        self.index.vocabulary.evict()
+
+    def get_all_text(self):
+        return "\n".join(self._lines)
+
+    def select(self, start, end):
+        self._selection_bound = start
+        self._cursor = end
+
+    def key_press_default(self, key):
+        """
+        Do default action of the key pressed in text view.
+        """
+        if key.control:
+            return
+        bounds = self.get_selection_bounds()
+        if key.keyval == KEYVAL_BACKSPACE:
+            if bounds:
+                self.delete(bounds[0], bounds[1], interactive=True)
+            elif self._cursor != (0, 0):
+                line, offset = self._cursor
+                start = (line, offset - 1) if offset else (line - 1, self.get_line_length(line - 1))
+                self.delete(start, self._cursor, interactive=True)
+        elif key.keyval == KEYVAL_RETURN or key.string:
+            if bounds:
+                self.delete(bounds[0], bounds[1], interactive=True)
+            self.insert_at_cursor("\n" if key.keyval == KEYVAL_RETURN else key.string)
+
+    def get_line_count(self):
+        return len(self._lines)
+
+    def get_char_count(self):
+        return sum(map(len, self._lines)) + len(self._lines) - 1
+
+    def get_line_length(self, line):
+        return len(self._lines[line])
+
+    def get_line_text(self, line):
+        return self._lines[line]
+
+    def get_lines_text(self, first, last):
+        return self._lines[first:last + 1]
+
+    def get_cursor(self):
+        return self._cursor
+
+    def place_cursor(self, position):
+        self._cursor = position
+        self._selection_bound = position
+
+    def get_selection_bounds(self):
+        if self._cursor == self._selection_bound:
+            return ()
+        return tuple(sorted((self._cursor, self._selection_bound)))
+
+    def get_text(self, start, end):
+        start, end = sorted((start, end))
+        if start[0] == end[0]:
+            return self._lines[start[0]][start[1]:end[1]]
+        lines = [self._lines[start[0]][start[1]:]]
+        lines.extend(self._lines[start[0] + 1:end[0]])
+        lines.append(self._lines[end[0]][:end[1]])
+        return "\n".join(lines)
+
+    def insert(self, position, text):
+        line, offset = position
+        self.edit_started(line)
+        current = self._lines[line]
+        lines = split_lines(text)
+        lines[0] = current[:offset] + lines[0]
+        end = (line + len(lines) - 1, len(lines[-1]))
+        lines[-1] += current[offset:]
+        self._lines[line:line + 1] = lines
+        # ...marks at insert position move behind inserted text.
+        self._cursor = self._shift_inserted(self._cursor, position, end)
+        self._selection_bound = self._shift_inserted(self._selection_bound, position, end)
+        self.edit_finished(end[0])
+
+    def insert_at_cursor(self, text):
+        self.insert(self._cursor, text)
+
+    def delete(self, start, end, interactive=False):
+        start, end = sorted((start, end))
+        self.edit_started(start[0])
+        head = self._lines[start[0]][:start[1]]
+        tail = self._lines[end[0]][end[1]:]
+        self._lines[start[0]:end[0] + 1] = [head + tail]
+        self._cursor = self._shift_deleted(self._cursor, start, end)
+        self._selection_bound = self._shift_deleted(self._selection_bound, start, end)
+        self.edit_finished(start[0])
+
+    def begin_user_action(self):
+        self._user_action += 1
+
+    def end_user_action(self):
+        self._user_action -= 1
+        if not self._user_action:
+            self.user_actions += 1
+
+    def get_tab_string(self):
+        return self._tab_string
+
+    def _shift_inserted(self, mark, position, end):
+        if mark < position:
+            return mark
+        if mark[0] == position[0]:
+            return (end[0], end[1] + mark[1] - position[1])
+        return (mark[0] + end[0] - position[0], mark[1])
+
+    def _shift_deleted(self, mark, start, end):
+        if mark <= start:
+            return mark
+        if mark <= end:
+            return start
+        if mark[0] == end[0]:
+            return (start[0], start[1] + mark[1] - end[1])
+        return (mark[0] - end[0] + start[0], mark[1])
+
+
+#--
+# COMPLETION.
+#--
+class Keystroke(object):
+    """
+    Key press or release as seen by the completion.
+    """
+
+    def __init__(self, keyval, keycode, string="", control=False):
+        self.keyval = keyval
+        self.keycode = keycode
+        self.string = string
+        self.control = control
+
+
+class KeyContext(object):
+    """
+    Context of key press at cursor, every field is read from buffer once, when a handler needs it.
+    """
+
+    def __init__(self, buffer, key):
+        self.buffer = buffer
+        self.key = key
+        self.typed_char = key.string
+
+    @functools.cached_property
+    def cursor(self):
+        return self.buffer.get_cursor()
+
+    @functools.cached_property
+    def bounds(self):
+        return self.buffer.get_selection_bounds()
+
+    @functools.cached_property
+    def _line_parts(self):
+        """
+        Line before and after cursor, only their part around cursor in large file.
+        """
+        start = TRACER.start()
+        buffer = self.buffer
+        if buffer.large:
+            parts = buffer.get_line_around(self.cursor, _LARGE_LINE_WINDOW)
+        else:
+            line, offset = self.cursor
+            line_text = buffer.get_line_text(line)
+            parts = line_text[:offset], line_text[offset:]
+        TRACER.stop("context", start)
+        return parts
+
+    @property
+    def preceding_line(self):
+        return self._line_parts[0]
+
+    @property
+    def line_after(self):
+        return self._line_parts[1]
+
+    @property
+    def prev_char(self):
+        return self._line_parts[0][-1:] or None
+
+    @property
+    def next_char(self):
+        return self._line_parts[1][:1] or None
+
+    @property
+    def next_char_pos(self):
+        return (self.cursor[0], self.cursor[1] + 1)
+
+    @functools.cached_property
+    def whitespace(self):
+        """
+        Whitespace in front of line.
+        """
+        preceding_line = self.preceding_line
+        return preceding_line[:len(preceding_line) - len(preceding_line.lstrip('\t '))]
+
+    @functools.cached_property
+    def balance(self):
+        return BracketBalance(self.preceding_line, self.line_after)
+
+
+class CompletionOptions(object):
+    """
+    Settings of the completion with their default values.
+    """
+
+    closeBracketsAndQuotes = True
+    completeXML = True
+    detectLists = True
+    autoindentAfterFunctionOrList = True
+    projectScope = False
+    completeAbbreviations = True
+    completionPopup = False
+    traceLatency = False
+    # Megabytes taken by words index at most, zero for no limit.
+    indexMemoryLimit = 256
+    # Large file mode of documents over megabytes of characters or with a line over length.
+    largeFileMode = True
+    largeFileSize = 20
+    largeFileLineLength = 20000
+    # Words nearest to cursor first, search of words ends as soon as the cycle is filled.
+    nearestWordsFirst = False
+    # Words of dictionary pack of the language complete too.
+    dictionaryPacks = True
+    # Words following the word before cursor most often are predicted when there's no prefix.
+    predictNextWords = True
+
+
+class CompletionEngine(object):
+    """
+    Words completion cycled by CTRL+SPACE and auto-closing decisions made on key presses.
+    Words indexes of other documents are got by `get_other_indexes(buffer)`.
+    """
+
+    def __init__(self, options, get_other_indexes):
+        self.options = options
+        self._get_other_indexes = get_other_indexes
+        self._candidates = CandidateCache()
+        self._index = 0
+        self._words = []
+        self._prefix = ""
+        self._postfix = ""
+        self._backspace = 0
+        self._replaced = None
+        self._presses = 0
+        # Key press handlers by key value and by typed char.
+        self._keyval_handlers = {
+            KEYVAL_RETURN: self._handle_return,
+            KEYVAL_BACKSPACE: self._handle_backspace,
+        }
+        self._char_handlers = dict.fromkeys(_BALANCE_CHARS, self._handle_bracket)
+        self._char_handlers['/'] = self._handle_slash
+
+    def key_press(self, buffer, key):
+        """
+        Handle key press, return True when default action of the key should not be done.
+        """
+        #--
+        # Backspace for quick deletion when word was completed!
+        #--
+        if key.keycode == KEYCODE_BACKSPACE:
+            if self._replaced is not None:
+                # ...word completed by abbreviation is replaced by typed abbreviation back.
+                return self._restore_prefix(buffer)
+            if self._backspace > 0:
+                # ...completed part of word is deleted at once instead of the default action,
+                # it follows cursor while CTRL is still held.
+                line, offset = buffer.get_cursor()
+                if self._presses:
+                    buffer.replace((line, offset), (line, offset + len(self._postfix)), "")
+                    self._postfix = ""
+                else:
+                    buffer.replace((line, offset - self._backspace), (line, offset), "")
+                self._backspace = 0
+                self._record_undo()
+                return True
+        else:
+            self._backspace = 0
+            if key.keycode != KEYCODE_CONTROL and not (key.control and key.keycode == KEYCODE_SPACE):
+                self._replaced = None
+        #--
+        # Starting word completion after CTRL+SPACE pressed!
+        #--
+        if key.control and key.keycode == KEYCODE_SPACE and not self.options.completionPopup:
+            self._cycle_words(buffer)
+        return self._handle_event(buffer, key)
+
+    def key_release(self, buffer, key):
+        """
+        Complete cycling between words after issuing CTRL.
+        """
+        if key.keycode == KEYCODE_CONTROL:
+            if len(self._postfix):
+                line, offset = buffer.get_cursor()
+                buffer.place_cursor((line, offset + len(self._postfix)))
+            if self._presses:
+                self._record_cycle()
+            #==
+            self._postfix = ""
+            self._words = []
+            #==
+
+    def _cycle_words(self, buffer):
+        if len(self._words) == 0:
+            start = TRACER.start()
+            self._index = 0
+            self._presses = 0
+            self._replaced = None
+            line, offset = buffer.get_cursor()
+            preceding_line = buffer.get_text((line, max(0, offset - _LARGE_LINE_WINDOW)), (line, offset))
+            self._prefix = get_prefix(preceding_line)
+            TRACER.stop("context", start)
+            #--
+            # Query best ranked words starting with prefix from words index of all documents,
+            # without prefix words following the previous word are predicted.
+            #--
+            start = TRACER.start()
+            if self._prefix or not self.options.predictNextWords:
+                self._words = self._rank_words(buffer, self._prefix, line, _CYCLE_SIZE)
+            else:
+                self._words = buffer.index.vocabulary.next_words(get_previous_word(preceding_line), _CYCLE_SIZE)
+            self._words.append("")
+            TRACER.stop("candidates", start)
+        #--
+        # So if words are available for completion...
+        #--
+        if len(self._words) > 0:
+            #--
+            # ...the indeterminate postfix and word completed by initials are found...
+            #--
+            start = TRACER.start()
+            line, offset = buffer.get_cursor()
+            if buffer.large:
+                preceding_line, line_after = buffer.get_line_around((line, offset), _LARGE_LINE_WINDOW)
+            else:
+                line_text = buffer.get_line_text(line)
+                preceding_line = line_text[:offset]
+                line_after = line_text[offset:]
+            end = 0
+            while end < len(line_after) and (line_after[end].isalnum() or line_after[end] == "_"):
+                end += 1
+            prefix_start = (line, offset - len(self._prefix))
+            if self._replaced is not None:
+                replaced_start, replaced = self._replaced
+                self._replaced = None
+                if replaced_start == (line, offset - len(replaced)) and preceding_line.endswith(replaced):
+                    prefix_start = replaced_start
+            #--
+            # ...and cycle through the appropriate words.
+            #--
+            try:
+                word = self._words[self._index]
+            except IndexError:
+                self._index = 0
+                word = self._words[self._index]
+            self._index += 1
+            self._presses += 1
+            #--
+            # ...empty word ending the cycle leaves just the prefix.
+            if not word or word.startswith(self._prefix):
+                self._postfix = word[len(self._prefix):]
+                self._backspace = len(self._postfix)
+                text = self._prefix + self._postfix
+                cursor = (line, prefix_start[1] + len(self._prefix))
+            else:
+                # ...word matching by initials replaces the abbreviation.
+                self._postfix = ""
+                text = word
+                cursor = (line, prefix_start[1] + len(word))
+                self._replaced = (prefix_start, word)
+            old = preceding_line[len(preceding_line) - (offset - prefix_start[1]):] + line_after[:end]
+            self._replace_text(buffer, prefix_start, old, text, cursor)
+            TRACER.stop("edits", start)
+
+    def _record_cycle(self, rejected=False):
+        """
+        Record finished cycle to completion metrics, the word cycled last is accepted unless it's empty
+        or `rejected`. Accepted word saves its typed characters but CTRL+SPACE presses.
+        """
+        word = self._words[self._index - 1]
+        rank = self._index if word and not rejected else None
+        METRICS.record_cycle(len(self._words) - 1, self._presses, rank, len(word) - len(self._prefix) - self._presses)
+        self._presses = 0
+
+    def _record_undo(self):
+        """
+        Record completed word deleted by BACKSPACE. Word of cycle still open, while CTRL is held,
+        was never accepted, so the cycle ends as rejected, the word of the last finished cycle is undone otherwise.
+        """
+        if self._presses:
+            self._record_cycle(rejected=True)
+            self._words = []
+        else:
+            METRICS.record_undo()
+
+    def get_word_pages(self, buffer, prefix, line, page_size=_PAGE_SIZE, limit=_POPUP_SIZE, previous_word=""):
+        """
+        Yield pages of words completing prefix for completion popup. The first page is ranked by
+        words of the buffer only, so it comes without querying other documents. Next pages follow
+        ranking of all documents, without words already yielded. The ranking runs in steps
+        of a bounded count of words, None is yielded after every step. Without prefix there's
+        one page of words following `previous_word` most often.
+        """
+        if not prefix and self.options.predictNextWords:
+            yield buffer.index.vocabulary.next_words(previous_word, page_size)
+            return
+        page = rank_words(prefix, buffer.index, line, {}, page_size)
+        yield page
+        shown = set(page)
+        words = yield from self._iter_rank_words(buffer, prefix, line, limit, _RANK_STEP_WORDS)
+        words = [word for word in words if word not in shown]
+        for i in range(0, len(words), page_size):
+            yield words[i:i + page_size]
+
+    def _rank_words(self, buffer, prefix, line, limit):
+        """
+        Get best ranked words starting with prefix from words index of all documents,
+        words with matching initials follow, like get_closing_xml_tag for gcxt.
+        """
+        return run_steps(self._iter_rank_words(buffer, prefix, line, limit))
+
+    def _iter_rank_words(self, buffer, prefix, line, limit, step_words=None):
+        """
+        Rank words like `_rank_words`, stepwise: yield after every `step_words` words scored
+        or ranked, return the best ones.
+        """
+        if buffer.large:
+            buffer.focus_line(line)
+        elif buffer.index.is_pending():
+            buffer.schedule_indexing(urgent=True)
+        other_indexes = self._get_other_indexes(buffer)
+        if self.options.nearestWordsFirst:
+            return self._nearest_words(buffer, prefix, line, other_indexes, limit)
+        other_scores = yield from self._candidates.iter_other_scores(prefix, other_indexes, False, step_words)
+        words = yield from iter_rank_words(prefix, buffer.index, line, other_scores, limit, False, step_words)
+        if self.options.completeAbbreviations and len(prefix) > 1:
+            abbreviation = prefix.lower()
+            found = set(words)
+            other_scores = yield from self._candidates.iter_other_scores(abbreviation, other_indexes, True, step_words)
+            abbreviated = yield from iter_rank_words(abbreviation, buffer.index, line, other_scores, limit, True, step_words)
+            for word in abbreviated:
+                if word not in found and word != prefix:
+                    words.append(word)
+        return words
+
+    def _nearest_words(self, buffer, prefix, line, other_indexes, limit):
+        """
+        Get words starting with prefix nearest to the line first, then words of other documents,
+        words with matching initials follow while there are less than `limit` words.
+        Pending lines near the line are tokenized at once.
+        """
+        words = nearest_words(prefix, buffer.index, line, other_indexes, limit, buffer.get_indexed_lines)
+        if self.options.completeAbbreviations and len(prefix) > 1 and len(words) < limit:
+            found = set(words)
+            for word in nearest_words(prefix.lower(), buffer.index, line, other_indexes, limit - len(words), abbreviation=True):
+                if word not in found and word != prefix:
+                    words.append(word)
+        return words
+
+    def _restore_prefix(self, buffer):
+        """
+        Replace word completed by abbreviation with typed abbreviation, when the word is still before cursor.
+        """
+        if self._replaced is None:
+            return False
+        start, word = self._replaced
+        self._replaced = None
+        end = (start[0], start[1] + len(word))
+        if buffer.get_cursor() != end or buffer.get_text(start, end) != word:
+            return False
+        self._replace_text(buffer, start, word, self._prefix, (start[0], start[1] + len(self._prefix)))
+        self._record_undo()
+        return True
+
+    def _replace_text(self, buffer, start, old, text, cursor):
+        """
+        Replace old text at start position with text in one user action, their common beginning stays.
+        """
+        common = len(os.path.commonprefix((old, text)))
+        start = get_end_position(start, old[:common])
+        buffer.replace(start, get_end_position(start, old[common:]), text[common:], cursor)
+
+    def _handle_event(self, buffer, key):
+        """
+        Key press event, dispatched by key value or typed char to its handler.
+        Other keys, like letters, are not handled, so they read nothing from buffer.
+        """
+        #--
+        # Do not complete text after pasting text.
+        #--
+        if len(key.string) > 1:
+            return False
+        handler = self._keyval_handlers.get(key.keyval) or self._char_handlers.get(key.string)
+        if handler is None:
+            return False
+        return handler(KeyContext(buffer, key))
+
+    def _handle_bracket(self, context):
+        """
+        Auto-close brackets and quotes.
+        """
+        options = self.options
+        buffer = context.buffer
+        typed_char = context.typed_char
+        #--
+        # Selected text...
+        #--
+        bounds = context.bounds
+        if len(bounds) > 0:
+            # ...auto-close brackets and quotes,
+            if options.closeBracketsAndQuotes:
+                for open, close in _OPEN_CLOSE.items():
+                    if typed_char == open:
+                        # ...get bounds data,
+                        start, end = bounds
+                        # ...surround selected text by open and close char, cursor goes behind.
+                        buffer.replace(start, end, open + buffer.get_text(start, end) + close)
+                        return True
+            return False
+
+        if not options.closeBracketsAndQuotes or context.prev_char == '\\':
+            return False
+        prev_char = context.prev_char
+        next_char = context.next_char
+        balance = context.balance
+        """
+        Detect python comments.
+        """
+        if typed_char == '"' and context.preceding_line.endswith('""') and balance.preceding('"') == 2 and not context.line_after:
+            return self._insert_at_cursor(buffer, typed_char + ' ', ' """')
+
+        for check_char, add_char in _OPEN_CLOSE.items():
+            #--
+            # If character user is adding is the same as the one that
+            # is auto-generated, remove the auto generated char...
+            #--
+            if typed_char == add_char:
+                if context.line_after:
+                    if next_char == add_char:
+                        if check_char != add_char:
+                            # ...don't remove ) when it's probably not auto-generated.
+                            preceding_check_chars = balance.preceding(check_char)
+                            preceding_add_chars = balance.preceding(add_char)
+                            following_check_chars = balance.following(check_char)
+                            following_add_chars = balance.following(add_char)
+                            if preceding_check_chars - preceding_add_chars > following_add_chars:
+                                continue
+                            #--
+                            # Don't remove ) when the line becomes complex.
+                            #--
+                            if following_check_chars > 0:
+                                continue
+                        # ...typed char overwrites the same one by moving cursor over it.
+                        buffer.place_cursor(context.next_char_pos)
+                        return True
+            #--
+            # Typed_char equals char we're looking for...
+            #--
+            if typed_char == check_char:
+                # ...check for unlogical adding,
+                if check_char == add_char:
+                    # ...uneven number of check_char's in front,
+                    if balance.preceding(check_char) % 2 == 1:
+                        continue
+                    # ...uneven number of check_char's in back.
+                    if balance.following(check_char) % 2 == 1:
+                        continue
+                # ...don't add add_char if it is used around text,
+                if not next_char and not check_char == "'":
+                    #--
+                    # If we're just typing with nothing on the right,
+                    # adding is OK as long as it isn't a "'"...
+                    #--
+                    pass
+                elif (not prev_char or prev_char in _NON_TEXT_LEFT) and (not next_char or next_char in _NON_TEXT_RIGHT):
+                    # ...this char is surrounded by nothing or non-text, therefore, we can add autotext.
+                    pass
+                elif check_char != add_char and (not next_char or next_char in _NON_TEXT_RIGHT):
+                    # ...this opening char has non-text on the right, therefore, we can add autotext.
+                    pass
+                else:
+                    continue
+                # ...insert add_char.
+                return self._insert_at_cursor(buffer, typed_char, add_char)
+        return False
+
+    def _handle_backspace(self, context):
+        """
+        Delete auto-closed bracket or quote together with the opening one.
+        """
+        if not self.options.closeBracketsAndQuotes or context.bounds or context.prev_char == '\\':
+            return False
+        if context.next_char is not None and _OPEN_CLOSE.get(context.prev_char) == context.next_char:
+            # ...both chars are deleted at once instead of the default action.
+            line, offset = context.cursor
+            context.buffer.replace((line, offset - 1), context.next_char_pos, "")
+            return True
+        return False
+
+    def _handle_slash(self, context):
+        """
+        Auto-complete XML tags.
+        """
+        if not self.options.completeXML or context.bounds or context.prev_char != "<":
+            return False
+        buffer = context.buffer
+        line = context.cursor[0]
+        # ...analyse previous XML code from closest checkpoint,
+        start = TRACER.start()
+        if buffer.large:
+            # ...only lines close to cursor of large file.
+            closing_tag = buffer.xml_stack.get_closing_tag(
+                line, context.preceding_line, buffer.get_indexed_lines, _LARGE_XML_LINES)
+        else:
+            closing_tag = buffer.xml_stack.get_closing_tag(line, context.preceding_line, buffer.get_lines_text)
+        TRACER.stop("xml", start)
+        if closing_tag:
+            # ...insert code,
+            return self._insert_at_cursor(buffer, context.typed_char + closing_tag + ">")
+        # ...do nothing.
+        return False
+
+    def _handle_return(self, context):
+        """
+        Continue lists and comments, auto-indent after function or list.
+        """
+        if context.bounds:
+            return False
+        options = self.options
+        buffer = context.buffer
+        typed_char = context.typed_char
+        preceding_line = context.preceding_line
+        whitespace = context.whitespace
+        whitespace_pos = len(whitespace)
+        #--
+        # Detect lists...
+        #--
+        if options.detectLists:
+            # ...cycle through all bullets,
+            for bullet in _LIST_BULLETS:
+                if len(preceding_line) >= whitespace_pos + len(bullet):
+                    if preceding_line[whitespace_pos:whitespace_pos + len(bullet)] == bullet:
+                        # ...endlist function by double enter.
+                        if preceding_line == whitespace + bullet and bullet != '* ':
+                            buffer.replace((context.cursor[0], len(whitespace)), context.cursor, "")
+                            return True
+                        return self._insert_at_cursor(buffer, typed_char + whitespace + bullet)
+
+        #--
+        # Detect java-like comment...
+        #--
+        # ...cycle through all types of comment.
+        for comment_start, (comment_middle, comment_end) in _COMMENTS.items():
+            if preceding_line[whitespace_pos:] == comment_start:
+                add_middle = typed_char + whitespace + comment_middle
+                add_end = typed_char + whitespace + comment_end
+                return self._insert_at_cursor(buffer, add_middle, add_end)
+
+        #--
+        # Auto-indent after function/list...
+        #--
+        if options.autoindentAfterFunctionOrList:
+            ending_char = _INDENT_TRIGGERS.get(context.prev_char)
+            if ending_char is not None:
+                start = TRACER.start()
+                line_after = context.line_after
+                if line_after:
+                    # ...text between begin and ending brackets should come in the middle row.
+                    if ending_char != '' and ending_char in line_after:
+                        ending_pos = line_after.find(ending_char)
+                    else:
+                        ending_pos = len(line_after)
+                    ending_text = line_after[:ending_pos].strip()
+
+                    add_middle = typed_char + whitespace + buffer.get_tab_string()
+                    add_end = ending_text + typed_char + whitespace
+                else:
+                    ending_pos = 0
+                    add_middle = typed_char + whitespace + buffer.get_tab_string()
+                    add_end = ""
+                TRACER.stop("indent", start)
+                # ...text before ending char is replaced by the middle row.
+                return self._insert_at_cursor(buffer, add_middle, add_end, ending_pos)
+        return False
+
+    def _insert_at_cursor(self, buffer, middle, end = "", replaced = 0):
+        """
+        Insert text at cursor instead of `replaced` chars after cursor in one user action.
+        """
+        start = TRACER.start()
+        cursor = buffer.get_cursor()
+        #--
+        # Insert text and move cursor to the middle.
+        #--
+        buffer.replace(cursor, (cursor[0], cursor[1] + replaced), middle + end, get_end_position(cursor, middle))
+        TRACER.stop("edits", start)
+        return True
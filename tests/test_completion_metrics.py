@@ -0,0 +1,70 @@
+###
+# Tests of completion metrics of Intelligent Words Completion.
+#--
+# Keystrokes are replayed on memory buffers, words deleted by BACKSPACE
+# right after completion are counted as undone or rejected.
+#--
+#   python3 -m unittest discover tests
+###
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import (
+    KEYCODE_BACKSPACE, KEYCODE_CONTROL, KEYCODE_SPACE, KEYVAL_BACKSPACE, METRICS,
+    CompletionEngine, CompletionOptions, Keystroke, MemoryBuffer)
+
+CTRL_SPACE = ("press", Keystroke(32, KEYCODE_SPACE, " ", True))
+CTRL_RELEASE = ("release", Keystroke(0, KEYCODE_CONTROL))
+BACKSPACE = ("press", Keystroke(KEYVAL_BACKSPACE, KEYCODE_BACKSPACE))
+CTRL_BACKSPACE = ("press", Keystroke(KEYVAL_BACKSPACE, KEYCODE_BACKSPACE, "", True))
+
+
+def type_text(text):
+    return [("press", Keystroke(ord(char), 0, char)) for char in text]
+
+
+class CompletionMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        METRICS.reset()
+
+    def tearDown(self):
+        METRICS.reset()
+
+    def replay(self, text, keys):
+        """
+        Replay keys typed on a new line after text, get the line and metrics.
+        """
+        buffer = MemoryBuffer(text + "\n")
+        buffer.index_pending()
+        buffer.place_cursor((1, 0))
+        engine = CompletionEngine(CompletionOptions(), lambda current: [])
+        for kind, key in keys:
+            if kind == "release":
+                engine.key_release(buffer, key)
+            elif not engine.key_press(buffer, key):
+                buffer.key_press_default(key)
+        stats = METRICS.get_stats()
+        buffer.release()
+        return buffer.get_line_text(1), dict([(name, stats[name]) for name in ("cycles", "accepted", "undone", "rejected")])
+
+    def test_backspace_after_cycle_undoes_word(self):
+        line, stats = self.replay("alpha_word alpha_wide alpha_wide", type_text("al") + [CTRL_SPACE, CTRL_RELEASE, BACKSPACE])
+        self.assertEqual(line, "al")
+        self.assertEqual(stats, {"cycles": 1, "accepted": 0, "undone": 1, "rejected": 1})
+
+    def test_backspace_in_open_cycle_rejects_it(self):
+        keys = type_text("al") + [CTRL_SPACE, CTRL_RELEASE] + type_text(" al") + [CTRL_SPACE, CTRL_BACKSPACE, CTRL_RELEASE]
+        line, stats = self.replay("alpha_word alpha_wide alpha_wide", keys)
+        self.assertEqual(line, "alpha_wide al")
+        self.assertEqual(stats, {"cycles": 2, "accepted": 1, "undone": 0, "rejected": 1})
+
+    def test_backspace_in_open_cycle_restores_abbreviation(self):
+        keys = type_text("gcxt") + [CTRL_SPACE, CTRL_BACKSPACE, CTRL_RELEASE]
+        line, stats = self.replay("get_closing_xml_tag", keys)
+        self.assertEqual(line, "gcxt")
+        self.assertEqual(stats, {"cycles": 1, "accepted": 0, "undone": 0, "rejected": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
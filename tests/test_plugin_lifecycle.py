@@ -0,0 +1,356 @@
+###
+# Tests of document lifecycle of Intelligent Words Completion plugin.
+#--
+# The plugin runs against fake Gedit windows, tabs, views and documents
+# which count their connected signal handlers. Tabs are opened and closed
+# repeatedly, then no handler, completion provider, idle callback nor words
+# index of a closed document may be left behind. Project files are crawled
+# again with binary files among them, only modified files are read.
+#--
+#   python3 -m unittest discover tests
+###
+import os, sys, tempfile, types, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+
+
+#--
+# Fake GObject introspection modules.
+#--
+class FakeObject(object):
+    """
+    GObject counting connected signal handlers by handler id.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.handlers = {}
+        self.connects = 0
+        self.disconnects = 0
+        self._next_id = 0
+
+    def connect(self, signal, callback, *args):
+        self._next_id += 1
+        self.connects += 1
+        self.handlers[self._next_id] = (signal, callback, args)
+        return self._next_id
+
+    connect_after = connect
+
+    def disconnect(self, handler_id):
+        self.disconnects += 1
+        del self.handlers[handler_id]
+
+    def emit(self, signal, *args):
+        for name, callback, extra in list(self.handlers.values()):
+            if name == signal:
+                callback(self, *(args + extra))
+
+
+class FakeGLib(object):
+    """
+    Main loop whose idle callbacks run only when asked to.
+    """
+    PRIORITY_LOW = 300
+
+    def __init__(self):
+        self.sources = {}
+        self._next_id = 0
+        self.cache_dir = tempfile.mkdtemp()
+
+    def idle_add(self, callback, *args, **kwargs):
+        self._next_id += 1
+        self.sources[self._next_id] = (callback, args)
+        return self._next_id
+
+    def source_remove(self, source_id):
+        del self.sources[source_id]
+
+    def get_user_cache_dir(self):
+        return self.cache_dir
+
+    def run_idle(self):
+        while self.sources:
+            for source_id, (callback, args) in list(self.sources.items()):
+                if source_id in self.sources and not callback(*args):
+                    self.sources.pop(source_id, None)
+
+
+class FakeTabClass(object):
+
+    @staticmethod
+    def get_from_document(doc):
+        return None
+
+
+class FakeApp(object):
+    documents = []
+
+    @classmethod
+    def get_default(cls):
+        return cls
+
+    @classmethod
+    def get_documents(cls):
+        return list(cls.documents)
+
+
+GLIB = FakeGLib()
+GOBJECT = types.SimpleNamespace(Object=FakeObject, property=lambda **kwargs: None)
+GEDIT = types.SimpleNamespace(
+    AppActivatable=type("AppActivatable", (), {}), WindowActivatable=type("WindowActivatable", (), {}),
+    App=FakeApp, Window=FakeObject, Tab=FakeTabClass)
+GTKSOURCE = types.SimpleNamespace(
+    CompletionProvider=type("CompletionProvider", (), {}), CompletionItem=lambda **kwargs: kwargs)
+
+
+def import_plugin():
+    """
+    Import the plugin with fake GObject introspection modules, modules imported before are restored.
+    """
+    repository = types.ModuleType("gi.repository")
+    repository.GObject = GOBJECT
+    repository.Gedit = GEDIT
+    repository.GtkSource = GTKSOURCE
+    repository.GLib = GLIB
+    repository.PeasGtk = types.SimpleNamespace(Configurable=type("Configurable", (), {}))
+    repository.Gtk = repository.Gio = repository.Gdk = types.SimpleNamespace()
+    gi = types.ModuleType("gi")
+    gi.repository = repository
+    saved = dict([(name, sys.modules.get(name)) for name in ("gi", "gi.repository", "intelligent_words_completion")])
+    sys.modules.update({"gi": gi, "gi.repository": repository})
+    sys.modules.pop("intelligent_words_completion", None)
+    try:
+        import intelligent_words_completion
+        return intelligent_words_completion
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+plugin_module = import_plugin()
+from intelligent_words_completion_core import VOCABULARY
+
+
+#--
+# Fake Gedit objects.
+#--
+class FakeIter(object):
+
+    def __init__(self, doc, line):
+        self._doc = doc
+        self._line = line
+        self._at_end = not doc.lines[line]
+
+    def ends_line(self):
+        return self._at_end
+
+    def forward_to_line_end(self):
+        self._at_end = True
+
+    def get_line(self):
+        return self._line
+
+
+class FakeDocument(FakeObject):
+
+    def __init__(self, text):
+        FakeObject.__init__(self)
+        self.lines = text.split("\n")
+
+    def get_language(self):
+        return None
+
+    def get_line_count(self):
+        return len(self.lines)
+
+    def get_char_count(self):
+        return sum(map(len, self.lines)) + len(self.lines) - 1
+
+    def get_iter_at_line(self, line):
+        return FakeIter(self, line)
+
+    def get_text(self, start, end, include_hidden):
+        return "\n".join(self.lines[start.get_line():end.get_line() + 1])
+
+
+class FakeCompletion(object):
+
+    def __init__(self):
+        self.providers = []
+
+    def add_provider(self, provider):
+        self.providers.append(provider)
+
+    def remove_provider(self, provider):
+        self.providers.remove(provider)
+
+
+class FakeView(FakeObject):
+
+    def __init__(self, doc):
+        FakeObject.__init__(self)
+        self._doc = doc
+        self._completion = FakeCompletion()
+
+    def get_buffer(self):
+        return self._doc
+
+    def get_completion(self):
+        return self._completion
+
+
+class FakeTab(object):
+
+    def __init__(self, doc, view):
+        self._doc = doc
+        self._view = view
+
+    def get_document(self):
+        return self._doc
+
+    def get_view(self):
+        return self._view
+
+
+class FakeWindow(FakeObject):
+
+    def __init__(self):
+        FakeObject.__init__(self)
+        self.tabs = []
+
+    def get_active_view(self):
+        return self.tabs[-1].get_view() if self.tabs else None
+
+    def get_documents(self):
+        return [tab.get_document() for tab in self.tabs]
+
+    def get_views(self):
+        return [tab.get_view() for tab in self.tabs]
+
+    def open_tab(self, text):
+        doc = FakeDocument(text)
+        tab = FakeTab(doc, FakeView(doc))
+        self.tabs.append(tab)
+        FakeApp.documents.append(doc)
+        self.emit("active-tab-changed", tab)
+        return tab
+
+    def close_tab(self, tab):
+        self.tabs.remove(tab)
+        FakeApp.documents.remove(tab.get_document())
+        self.emit("tab-removed", tab)
+
+
+class PluginLifecycleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.window = FakeWindow()
+        self.plugin = plugin_module.IntelligentWordsCompletionPlugin()
+        self.plugin.window = self.window
+        self.plugin.do_activate()
+        self.service = plugin_module.IndexService.get_instance()
+
+    def tearDown(self):
+        self.plugin.do_deactivate()
+        plugin_module.IndexService.shutdown()
+        GLIB.sources.clear()
+        FakeApp.documents = []
+
+    def test_closed_tabs_leave_nothing_behind(self):
+        self.assertEqual(self.window.connects, 2)
+        words = VOCABULARY.get_stats()[0]
+        for cycle in range(30):
+            tabs = [self.window.open_tab("alpha_%d beta\ngamma_%d = delta(%d)\n" % (cycle, i, i)) for i in range(3)]
+            for tab in tabs:
+                doc = tab.get_document()
+                view = tab.get_view()
+                # ...document follows its five editing signals, view its key presses and releases.
+                self.assertEqual(len(doc.handlers), 5)
+                self.assertEqual(len(doc.intelligent_text_completion_id), 5)
+                self.assertEqual(len(view.handlers), 2)
+                self.assertEqual(tuple(view.handlers), view.intelligent_text_completion_id)
+                self.assertEqual(view.get_completion().providers, [self.plugin._provider])
+            # ...the active tab changed back to an open tab connects nothing more.
+            self.window.emit("active-tab-changed", tabs[0])
+            self.assertEqual(len(tabs[0].get_view().handlers), 2)
+            self.assertEqual(len(self.service._buffers), 3)
+            GLIB.run_idle()
+            self.assertFalse(self.service.get_buffer(tabs[0].get_document()).index.is_pending())
+            for tab in tabs:
+                self.window.close_tab(tab)
+                doc = tab.get_document()
+                view = tab.get_view()
+                self.assertEqual(doc.handlers, {})
+                self.assertEqual(doc.connects, doc.disconnects)
+                self.assertIsNone(doc.intelligent_text_completion_id)
+                self.assertEqual(view.handlers, {})
+                self.assertEqual(view.connects, view.disconnects)
+                self.assertIsNone(view.intelligent_text_completion_id)
+                self.assertEqual(view.get_completion().providers, [])
+            self.assertEqual(self.service._buffers, {})
+            self.assertEqual(GLIB.sources, {})
+            self.assertEqual(VOCABULARY.get_stats()[0], words)
+        self.assertEqual(len(self.window.handlers), 2)
+
+    def test_closed_tabs_cancel_pending_indexing(self):
+        for cycle in range(10):
+            tab = self.window.open_tab("\n".join("word_%d_%d" % (cycle, i) for i in range(100)))
+            self.assertTrue(GLIB.sources)
+            self.window.close_tab(tab)
+            self.assertEqual(tab.get_document().handlers, {})
+            self.assertEqual(self.service._buffers, {})
+            self.assertEqual(GLIB.sources, {})
+
+    def test_deactivate_disconnects_all(self):
+        tabs = [self.window.open_tab("alpha beta %d" % i) for i in range(4)]
+        self.plugin.do_deactivate()
+        self.assertEqual(self.window.handlers, {})
+        self.assertEqual(self.service._buffers, {})
+        for tab in tabs:
+            self.assertEqual(tab.get_document().handlers, {})
+            self.assertEqual(tab.get_view().handlers, {})
+            self.assertEqual(tab.get_view().get_completion().providers, [])
+        self.window.tabs = []
+
+
+class ProjectVocabularyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.read = []
+        self.tokenize_file = plugin_module.tokenize_file
+        plugin_module.tokenize_file = lambda path: self.read.append(os.path.basename(path)) or self.tokenize_file(path)
+
+    def tearDown(self):
+        plugin_module.tokenize_file = self.tokenize_file
+        GLIB.sources.clear()
+
+    def crawl(self):
+        del self.read[:]
+        project = plugin_module.ProjectVocabulary(self.root, os.path.join(self.root, ".cache", "project.cache"))
+        project._crawl()
+        GLIB.run_idle()
+        return project
+
+    def test_binary_files_are_not_read_again(self):
+        with open(os.path.join(self.root, "code.py"), "w") as f:
+            f.write("alpha_word = beta_word\n")
+        with open(os.path.join(self.root, "image.bin"), "wb") as f:
+            f.write(b"alpha\0binary_word")
+        project = self.crawl()
+        self.assertEqual(sorted(self.read), ["code.py", "image.bin"])
+        self.assertEqual(project.count("alpha_word"), 1)
+        self.assertEqual(project.count("binary_word"), 0)
+        # ...both files are cached, the binary one without words.
+        project = self.crawl()
+        self.assertEqual(self.read, [])
+        self.assertEqual(project.count("alpha_word"), 1)
+        os.utime(os.path.join(self.root, "image.bin"), (0, 0))
+        self.crawl()
+        self.assertEqual(self.read, ["image.bin"])
+
+
+if __name__ == "__main__":
+    unittest.main()
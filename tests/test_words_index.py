@@ -0,0 +1,187 @@
+###
+# Tests of words index of Intelligent Words Completion.
+#--
+# Words indexes tokenized in chunks and edited incrementally are compared to
+# a full reindex of the final text, cached scores of other documents to
+# scores queried directly, over seeded random documents. Rare words are
+# evicted by steps under the memory limit, frequent ones are kept.
+#--
+#   python3 -m unittest discover tests
+###
+import collections, os, random, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import (
+    CandidateCache, CompletionEngine, CompletionOptions, MemoryBuffer, VOCABULARY, get_initials_keys, get_tokenizer,
+    iter_rank_words, iter_score_other_words, rank_words, run_steps, score_other_words)
+
+WORDS = ["get_value", "set_value", "getValue", "alpha", "beta", "gamma_ray", "delta", "epsilon", "zeta_x"]
+SYNTAX = {
+    "python3": ['"""', "'''", "# note", '"str word"', "'x'"],
+    "c": ["/*", "*/", "// note", '"str word"'],
+    "xml": ["<!--", "-->", "<tag>", "</tag>"],
+}
+
+
+def make_line(rng, language):
+    """
+    Get line of words mixed with comments and strings, some of them spanning more lines.
+    """
+    return " ".join(rng.choice(WORDS + SYNTAX[language]) for i in range(rng.randint(0, 6)))
+
+def make_text(rng, language, lines):
+    return "\n".join(make_line(rng, language) for i in range(lines))
+
+def edit(rng, buffer, language):
+    """
+    Insert text at random position or delete random lines.
+    """
+    line = rng.randrange(buffer.get_line_count())
+    if rng.random() < 0.6:
+        position = (line, rng.randint(0, buffer.get_line_length(line)))
+        if rng.random() < 0.5:
+            buffer.insert(position, rng.choice(SYNTAX[language] + ["x\n", "beta\ngamma_ray"]))
+        else:
+            buffer.insert(position, make_text(rng, language, rng.randint(1, 80)) + "\n")
+    else:
+        last = min(buffer.get_line_count() - 1, line + rng.randint(0, 40))
+        buffer.delete((line, 0), (last, 0))
+
+def index_in_chunks(rng, buffer):
+    index = buffer.index
+    while index.is_pending():
+        index.index_next_lines(buffer.get_indexed_lines, rng.choice([1, 2, 7, 64, 300]))
+
+
+class DocumentWordIndexTest(unittest.TestCase):
+
+    def assert_reindexed(self, buffer, language):
+        """
+        Check index of buffer against tokens of its whole text and against a fresh index of it.
+        """
+        index = buffer.index
+        text = buffer.get_all_text()
+        lines = get_tokenizer(language).tokenize_text(text)
+        self.assertEqual(index._lines, lines)
+        counts = collections.Counter(word for tokens in lines for word in tokens)
+        self.assertEqual(index._counts, counts)
+        self.assertEqual(index._sorted, sorted(counts))
+        self.assertEqual(index._initials, get_initials_keys(sorted(counts)))
+        fresh = MemoryBuffer(text, language=language)
+        fresh.index_pending()
+        self.assertEqual(index._lines, fresh.index._lines)
+        for prefix in ["", "g", "get", "ga", "z"]:
+            self.assertEqual(index.prefix_words(prefix), fresh.index.prefix_words(prefix))
+        for abbreviation in ["gv", "sv", "gr"]:
+            self.assertEqual(index.abbreviation_words(abbreviation), fresh.index.abbreviation_words(abbreviation))
+        fresh.release()
+
+    def test_incremental_index_matches_full_reindex(self):
+        rng = random.Random(15)
+        for trial in range(150):
+            language = rng.choice(sorted(SYNTAX))
+            buffer = MemoryBuffer(make_text(rng, language, rng.randint(1, 400)), language=language)
+            index_in_chunks(rng, buffer)
+            for i in range(rng.randint(0, 12)):
+                edit(rng, buffer, language)
+                if rng.random() < 0.7:
+                    index_in_chunks(rng, buffer)
+            index_in_chunks(rng, buffer)
+            self.assert_reindexed(buffer, language)
+            buffer.release()
+
+
+class CandidateCacheTest(unittest.TestCase):
+
+    def test_cached_scores_match_direct_scores(self):
+        rng = random.Random(16)
+        buffers = [MemoryBuffer(make_text(rng, "c", rng.randint(1, 300)), language="c") for i in range(4)]
+        for buffer in buffers:
+            buffer.index_pending()
+        indexes = [buffer.index for buffer in buffers]
+        cache = CandidateCache(max_words=40)
+        for query in range(2000):
+            if rng.random() < 0.05:
+                buffer = rng.choice(buffers)
+                edit(rng, buffer, "c")
+                index_in_chunks(rng, buffer)
+            abbreviation = rng.random() < 0.3
+            word = rng.choice(WORDS)
+            prefix = word[:rng.randint(0, 3)] if not abbreviation else rng.choice(["g", "gv", "s", "sv", "gr"])
+            self.assertEqual(cache.get_other_scores(prefix, indexes, abbreviation),
+                score_other_words(prefix, indexes, abbreviation))
+        for buffer in buffers:
+            buffer.release()
+
+
+class StepwiseRankingTest(unittest.TestCase):
+
+    def test_steps_match_ranking_at_once(self):
+        rng = random.Random(17)
+        buffers = [MemoryBuffer(make_text(rng, "c", rng.randint(1, 300)), language="c") for i in range(4)]
+        for buffer in buffers:
+            buffer.index_pending()
+        indexes = [buffer.index for buffer in buffers[1:]]
+        engine = CompletionEngine(CompletionOptions(), lambda current: [b.index for b in buffers if b is not current])
+        for query in range(200):
+            abbreviation = rng.random() < 0.3
+            prefix = rng.choice(["g", "gv", "s", "sv", "gr"]) if abbreviation else rng.choice(WORDS)[:rng.randint(1, 3)]
+            line = rng.randrange(buffers[0].get_line_count())
+            step_words = rng.choice([1, 3, 50])
+            scores = run_steps(iter_score_other_words(prefix, indexes, abbreviation, step_words))
+            self.assertEqual(scores, score_other_words(prefix, indexes, abbreviation))
+            self.assertEqual(run_steps(iter_rank_words(prefix, buffers[0].index, line, scores, 10, abbreviation, step_words)),
+                rank_words(prefix, buffers[0].index, line, scores, 10, abbreviation))
+            pages = [page for page in engine.get_word_pages(buffers[0], prefix, line, 5, 40) if page is not None]
+            words = engine._rank_words(buffers[0], prefix, line, 40)
+            self.assertEqual(sum(pages[1:], []), [word for word in words if word not in pages[0]])
+        for buffer in buffers:
+            buffer.release()
+
+
+class MemoryLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(18)
+        self.buffer = MemoryBuffer("\n".join("common_word %s id_%08x" % (rng.choice(WORDS), rng.getrandbits(32))
+            for i in range(20000)))
+        self.buffer.index_pending()
+
+    def tearDown(self):
+        VOCABULARY.limit = 0
+        self.buffer.release()
+
+    def test_limit_over_lines_keeps_frequent_words(self):
+        index = self.buffer.index
+        size = VOCABULARY.get_size()
+        # ...lines alone take less than words may take after eviction, but all words take more than the limit.
+        VOCABULARY.limit = (VOCABULARY.fixed_bytes * 4 // 3 + size) // 2
+        self.assertTrue(VOCABULARY.is_over_limit())
+        steps = 0
+        while VOCABULARY.index_next_lines(None, 1):
+            steps += 1
+        self.assertGreater(steps, 10)
+        self.assertLessEqual(VOCABULARY.get_size(), VOCABULARY.limit * 3 // 4)
+        self.assertEqual(index.count("common_word"), 20000)
+        for word in WORDS:
+            self.assertGreater(index.count(word), 1000)
+        self.assertLess(len(index._counts), 20000)
+        counts = collections.Counter(word for tokens in index._lines for word in tokens)
+        self.assertEqual(index._counts, counts)
+        self.assertEqual(index._sorted, sorted(counts))
+        self.assertEqual(index._initials, get_initials_keys(sorted(counts)))
+        self.buffer.insert((19999, self.buffer.get_line_length(19999)), "\nbrand_new_word")
+        self.buffer.index_pending()
+        self.assertEqual(index.prefix_words("brand"), ["brand_new_word"])
+
+    def test_limit_under_lines_is_reported(self):
+        words = len(self.buffer.index._counts)
+        VOCABULARY.limit = VOCABULARY.fixed_bytes
+        self.assertTrue(VOCABULARY.is_limit_unreachable())
+        self.assertFalse(VOCABULARY.is_over_limit())
+        self.buffer.index_pending()
+        self.assertEqual(len(self.buffer.index._counts), words)
+
+
+if __name__ == "__main__":
+    unittest.main()
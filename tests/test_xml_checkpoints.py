@@ -0,0 +1,78 @@
+###
+# Tests of checkpointed stacks of opened XML tags of Intelligent Words Completion.
+#--
+# Closing tags found from checkpointed stacks of opened tags are compared to
+# closing tags of the whole text before cursor, over seeded random documents
+# edited between the queries.
+#--
+#   python3 -m unittest discover tests
+###
+import os, random, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import MemoryBuffer, get_closing_xml_tag
+
+TAGS = ["html", "body", "div", "Span", "span", "p", "ul", "li"]
+
+
+def make_line(rng):
+    """
+    Get line of opening, closing, neutral and special tags with text between them.
+    """
+    parts = []
+    for i in range(rng.randint(0, 4)):
+        tag = rng.choice(TAGS)
+        kind = rng.random()
+        if kind < 0.4:
+            parts.append('<%s class="x">' % tag)
+        elif kind < 0.7:
+            parts.append("</%s>" % tag)
+        elif kind < 0.8:
+            parts.append("<%s/>" % tag)
+        elif kind < 0.85:
+            parts.append("<!-- <%s> -->" % tag)
+        elif kind < 0.9:
+            parts.append("<?php echo 1 ?>")
+        else:
+            parts.append("text")
+    return "".join(parts)
+
+def make_document(rng, lines):
+    return "\n".join(make_line(rng) for i in range(lines))
+
+def edit(rng, buffer):
+    """
+    Insert or delete random lines, so checkpoints after them are invalidated.
+    """
+    line = rng.randrange(buffer.get_line_count())
+    if rng.random() < 0.6:
+        buffer.insert((line, 0), make_document(rng, rng.randint(1, 40)) + "\n")
+    else:
+        last = min(buffer.get_line_count() - 1, line + rng.randint(0, 40))
+        buffer.delete((line, 0), (last, 0))
+
+def get_text_before(buffer, position):
+    line, offset = position
+    return "\n".join(buffer.get_lines_text(0, line - 1) + [buffer.get_line_text(line)[:offset]])
+
+
+class XmlTagStackCacheTest(unittest.TestCase):
+
+    def test_closing_tag_matches_whole_text(self):
+        rng = random.Random(20)
+        for trial in range(40):
+            buffer = MemoryBuffer(make_document(rng, rng.randint(1, 600)), language="xml")
+            for query in range(25):
+                if rng.random() < 0.5:
+                    edit(rng, buffer)
+                line = rng.randrange(buffer.get_line_count())
+                offset = rng.randint(0, buffer.get_line_length(line))
+                preceding_line = buffer.get_line_text(line)[:offset]
+                self.assertEqual(
+                    buffer.xml_stack.get_closing_tag(line, preceding_line, buffer.get_lines_text),
+                    get_closing_xml_tag(get_text_before(buffer, (line, offset))))
+            buffer.release()
+
+
+if __name__ == "__main__":
+    unittest.main()
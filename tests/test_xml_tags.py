@@ -0,0 +1,35 @@
+###
+# Tests of XML tags auto-completion of Intelligent Words Completion.
+#--
+# Slash typed after '<' closes the tag opened last in the whole text before
+# cursor, over seeded random documents of tests/test_xml_checkpoints.py.
+#--
+#   python3 -m unittest discover tests
+###
+import os, random, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "gedit4"))
+from intelligent_words_completion_core import CompletionEngine, CompletionOptions, Keystroke, MemoryBuffer, get_closing_xml_tag
+from test_xml_checkpoints import get_text_before, make_document
+
+
+class XmlTagCompletionTest(unittest.TestCase):
+
+    def test_typed_slash_closes_tag(self):
+        rng = random.Random(21)
+        engine = CompletionEngine(CompletionOptions(), lambda current: [])
+        for trial in range(200):
+            buffer = MemoryBuffer(make_document(rng, rng.randint(1, 300)), language="xml")
+            line = rng.randrange(buffer.get_line_count())
+            buffer.place_cursor((line, buffer.get_line_length(line)))
+            buffer.insert_at_cursor("<")
+            closing_tag = get_closing_xml_tag(get_text_before(buffer, buffer.get_cursor()))
+            handled = engine.key_press(buffer, Keystroke(ord("/"), 0, "/"))
+            self.assertEqual(handled, closing_tag is not None)
+            if handled:
+                self.assertTrue(buffer.get_line_text(line).endswith("</%s>" % closing_tag))
+            buffer.release()
+
+
+if __name__ == "__main__":
+    unittest.main()